@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from index_utils import get_index_version
+from embedding_backend import embed_queries
+
+# --- Answer Cache Configuration ---
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048")) # Across all domains
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024))) # Approximate memory cap
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95")) # Cosine similarity for a semantic hit
+ANSWER_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("ANSWER_CACHE_VERSION_CHECK_SECONDS", "5"))
+LLM_CALLS_PER_ANSWER = 2 # Retrieval planning + synthesis; used when the caller does not report a measured count
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases the query and strips punctuation/extra whitespace so trivial variants share a key."""
+    normalized = _PUNCTUATION_RE.sub(" ", (query or "").lower())
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+class _CacheEntry:
+    __slots__ = ("domain", "normalized_query", "answer", "embedding", "created_at", "size_bytes", "llm_calls")
+
+    def __init__(self, domain: str, normalized_query: str, answer: str, embedding: Optional[np.ndarray], llm_calls: int):
+        self.domain = domain
+        self.normalized_query = normalized_query
+        self.answer = answer
+        self.embedding = embedding
+        self.created_at = time.monotonic()
+        self.llm_calls = llm_calls
+        self.size_bytes = (
+            sys.getsizeof(answer) + sys.getsizeof(normalized_query) +
+            (embedding.nbytes if embedding is not None else 0)
+        )
+
+
+class _DomainEmbeddings:
+    """
+    One domain's cached embeddings as rows of a preallocated matrix, kept in step with the cache
+    entries so a semantic lookup is a single matmul instead of a np.stack over every entry.
+    Rows are removed by moving the last row into the hole; the matrix doubles when full.
+    """
+    __slots__ = ("matrix", "keys", "rows")
+
+    def __init__(self):
+        self.matrix: Optional[np.ndarray] = None
+        self.keys: List[Tuple[str, str]] = []
+        self.rows: Dict[Tuple[str, str], int] = {}
+
+    def add(self, key: Tuple[str, str], embedding: np.ndarray):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if self.matrix is None or self.matrix.shape[1] != embedding.shape[0]:
+                self.matrix = np.empty((16, embedding.shape[0]), dtype=np.float32)
+                self.keys, self.rows, row = [], {}, 0
+            elif row == self.matrix.shape[0]:
+                grown = np.empty((2 * row, self.matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown # Snapshots taken before keep reading the old array
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = embedding
+
+    def remove(self, key: Tuple[str, str]):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            moved_key = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved_key
+            self.rows[moved_key] = row
+        self.keys.pop()
+
+    def snapshot(self) -> Optional[np.ndarray]:
+        return self.matrix[:len(self.keys)] if self.keys else None
+
+
+class SemanticAnswerCache:
+    """
+    Per-domain answer cache placed in front of the agent pipeline.
+    Looks up answers by normalized query first, then by query-embedding similarity.
+    Entries are evicted LRU-first under an entry/memory cap, expire after a TTL, and a domain's
+    entries are dropped as soon as its index version (index_metadata.json 'last_updated') changes.
+    """
+    def __init__(self, embed_model=None,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                 version_check_seconds: float = ANSWER_CACHE_VERSION_CHECK_SECONDS):
+        self.embed_model = embed_model
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_check_seconds = version_check_seconds
+
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._embeddings: Dict[str, _DomainEmbeddings] = {}
+        self._lock = threading.Lock()
+        self._domain_persist_dirs: Dict[str, str] = {}
+        self._domain_versions: Dict[str, Optional[str]] = {}
+        self._domain_version_checked_at: Dict[str, float] = {}
+        self._stats = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0, "llm_calls_saved": 0,
+        }
+
+    def register_domain(self, domain: str, persist_dir: str):
+        """Associates a domain with the persist dir whose index version guards its entries."""
+        with self._lock:
+            self._domain_persist_dirs[domain] = persist_dir
+            self._domain_versions[domain] = get_index_version(persist_dir)
+            self._domain_version_checked_at[domain] = time.monotonic()
+
+    def _embed(self, query: str) -> Optional[np.ndarray]:
+        if self.embed_model is None:
+            return None
+        try:
+            embedding = np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Answer cache could not embed query: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _embed_many(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        if self.embed_model is None or not queries:
+            return [None] * len(queries)
+        try:
+            embeddings = np.asarray(embed_queries(self.embed_model, queries), dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Answer cache could not embed queries: {e}")
+            return [None] * len(queries)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return list(embeddings / np.where(norms > 0, norms, 1.0))
+
+    def _check_version_locked(self, domain: str):
+        persist_dir = self._domain_persist_dirs.get(domain)
+        if persist_dir is None:
+            return
+        now = time.monotonic()
+        if now - self._domain_version_checked_at.get(domain, 0.0) < self.version_check_seconds:
+            return
+        self._domain_version_checked_at[domain] = now
+        current_version = get_index_version(persist_dir)
+        if current_version != self._domain_versions.get(domain):
+            print(f"Answer cache: index version for '{domain}' changed ({self._domain_versions.get(domain)} -> {current_version}). Invalidating.")
+            self._domain_versions[domain] = current_version
+            self._invalidate_domain_locked(domain)
+
+    def _invalidate_domain_locked(self, domain: str):
+        stale_keys = [key for key in self._entries if key[0] == domain]
+        for key in stale_keys:
+            self._remove_locked(key)
+        if stale_keys:
+            self._stats["invalidations"] += len(stale_keys)
+
+    def _remove_locked(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.size_bytes
+            if entry.embedding is not None and entry.domain in self._embeddings:
+                self._embeddings[entry.domain].remove(key)
+
+    def _is_expired(self, entry: _CacheEntry) -> bool:
+        return self.ttl_seconds > 0 and (time.monotonic() - entry.created_at) > self.ttl_seconds
+
+    def _record_hit_locked(self, key: Tuple[str, str], entry: _CacheEntry, kind: str) -> str:
+        self._entries.move_to_end(key)
+        self._stats[kind] += 1
+        self._stats["llm_calls_saved"] += entry.llm_calls
+        return entry.answer
+
+    def _lookup_exact(self, domain: str, normalized: str) -> Optional[_CacheEntry]:
+        key = (domain, normalized)
+        with self._lock:
+            self._check_version_locked(domain)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry):
+                    self._remove_locked(key)
+                    self._stats["expirations"] += 1
+                else:
+                    self._record_hit_locked(key, entry, "exact_hits")
+                    return entry
+        return None
+
+    def _lookup_semantic(self, domain: str, query_embedding: Optional[np.ndarray]) -> Optional[str]:
+        matrix = None
+        if query_embedding is not None:
+            with self._lock:
+                embeddings = self._embeddings.get(domain)
+                matrix = embeddings.snapshot() if embeddings is not None else None
+        candidates = np.empty(0, dtype=np.int64)
+        if matrix is not None and matrix.shape[1] == query_embedding.shape[0]:
+            # Outside the lock: stores may move rows meanwhile, so every candidate is re-checked below
+            similarities = matrix @ query_embedding
+            candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+            candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        with self._lock:
+            embeddings = self._embeddings.get(domain)
+            for row in candidates:
+                if embeddings is None or row >= len(embeddings.keys):
+                    continue
+                candidate_key = embeddings.keys[row]
+                candidate = self._entries[candidate_key]
+                if float(candidate.embedding @ query_embedding) < self.similarity_threshold:
+                    continue
+                if self._is_expired(candidate):
+                    self._remove_locked(candidate_key)
+                    self._stats["expirations"] += 1
+                    continue
+                return self._record_hit_locked(candidate_key, candidate, "semantic_hits")
+            self._stats["misses"] += 1
+        return None
+
+    def lookup(self, domain: str, query: str, query_embedding: Optional[np.ndarray] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Returns (cached_answer, query_embedding). The embedding is returned on a miss so the
+        caller can hand it back to store() without embedding the query twice. A normalized
+        query_embedding computed earlier (e.g. by the domain router) is used instead of embedding again.
+        """
+        entry = self._lookup_exact(domain, normalize_query(query))
+        if entry is not None:
+            return entry.answer, entry.embedding
+        if query_embedding is None:
+            query_embedding = self._embed(query) # Outside the lock: embedding is the slow part
+        return self._lookup_semantic(domain, query_embedding), query_embedding
+
+    def lookup_many(self, domain: str, queries: List[str]) -> List[Tuple[Optional[str], Optional[np.ndarray]]]:
+        """lookup() for many queries; the exact-match misses are embedded in one batch."""
+        results: List[Tuple[Optional[str], Optional[np.ndarray]]] = [(None, None)] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            entry = self._lookup_exact(domain, normalize_query(query))
+            if entry is not None:
+                results[i] = (entry.answer, entry.embedding)
+            else:
+                pending.append(i)
+        embeddings = self._embed_many([queries[i] for i in pending])
+        for i, query_embedding in zip(pending, embeddings):
+            results[i] = (self._lookup_semantic(domain, query_embedding), query_embedding)
+        return results
+
+    def store(self, domain: str, query: str, answer: str,
+              query_embedding: Optional[np.ndarray] = None, llm_calls: Optional[int] = None):
+        """Caches an answer for the domain, evicting least recently used entries past the caps."""
+        if not answer:
+            return
+        if llm_calls is None:
+            llm_calls = LLM_CALLS_PER_ANSWER
+        normalized = normalize_query(query)
+        key = (domain, normalized)
+        entry = _CacheEntry(domain, normalized, answer, query_embedding, llm_calls)
+        with self._lock:
+            self._check_version_locked(domain)
+            self._remove_locked(key)
+            self._entries[key] = entry
+            self._total_bytes += entry.size_bytes
+            if query_embedding is not None:
+                self._embeddings.setdefault(domain, _DomainEmbeddings()).add(key, query_embedding)
+            self._stats["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self._stats["evictions"] += 1
+
+    def clear(self, domain: str = None):
+        with self._lock:
+            if domain is None:
+                self._entries.clear()
+                self._embeddings.clear()
+                self._total_bytes = 0
+            else:
+                self._invalidate_domain_locked(domain)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["exact_hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+            hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+            per_domain: Dict[str, int] = {}
+            for domain, _ in self._entries:
+                per_domain[domain] = per_domain.get(domain, 0) + 1
+            return {
+                **self._stats,
+                "hits": hits,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "entries_per_domain": per_domain,
+                "bytes": self._total_bytes,
+                "index_versions": dict(self._domain_versions),
+            }
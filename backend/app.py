@@ -1,8 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from hr_service import HRService, ReActAgentHR
-from finance_service import FinanceService, ReActAgentFinance
+from domain_loader import DomainEmptyError, DomainLoader, DomainNotReadyError, DomainUnavailableError, process_rss_bytes
+from domain_config import get_domains_config
+from domain_router import AUTO_DOMAIN, DomainRouter
+from session_store import SessionStore
+from index_watcher import DataDirWatcher
+from request_context import track_request
+from llm_scheduler import LLMOverloadedError, get_default_scheduler
+from metrics import REGISTRY, span
 import os
+import hmac
+import json
+import time
+import threading
 from dotenv import load_dotenv
 import logging
 
@@ -16,67 +26,496 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Initialize services
-try:
-    logger.info("Initializing HR Service...")
-    hr_service = HRService()
-    logger.info("HR Service initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize HR Service: {str(e)}")
-    hr_service = None
-
-try:
-    logger.info("Initializing Finance Service...")
-    finance_service = FinanceService()
-    logger.info("Finance Service initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Finance Service: {str(e)}")
-    finance_service = None
+APP_STARTED_AT = time.monotonic()
+
+# Shared answer cache in front of both domain pipelines.
+# Created by the first domain to load, since it needs the shared embedding model.
+answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def _get_answer_cache():
+    global answer_cache
+    with _answer_cache_lock:
+        if answer_cache is None:
+            from answer_cache import SemanticAnswerCache
+            from common_settings import EMBED_MODEL
+            answer_cache = SemanticAnswerCache(embed_model=EMBED_MODEL)
+    return answer_cache
+
+# Domains come from the domains config (see domain_config). Services are imported and built inside
+# the loader threads (not at import time), so the HTTP server starts immediately; preloaded domains
+# warm up in parallel and the others are built on their first request.
+domains_config = get_domains_config()
+DEFAULT_DOMAIN = domains_config.default_domain
+
+def _domain_factory(domain_config):
+    def load(progress):
+        progress("loading_models")
+        from domain_service import DomainService
+        return DomainService(domain_config, answer_cache=_get_answer_cache(), progress=progress)
+    return load
+
+def _on_domain_ready(domain, service):
+    # After every load and hot reload: route "auto" queries with the centroids of the index now served
+    domain_router.set_profile(domain, service.routing_profile)
+
+def register_domain(domain_config):
+    """Adds a configured domain to the running app; it loads now if preloaded, else on first use."""
+    if domain_config.name == AUTO_DOMAIN:
+        raise ValueError(f"'{AUTO_DOMAIN}' is reserved for automatic domain routing")
+    domain_loader.register(domain_config.name, _domain_factory(domain_config), preload=domain_config.preload)
+    domains_config.domains.setdefault(domain_config.name, domain_config)
+    # Profiles persisted by an earlier run let "auto" route to a domain before it has loaded
+    domain_router.load_profile(domain_config.name, domain_config.persist_dir)
+
+# Server-side conversations: clients send a session_id instead of the whole history (see session_store)
+session_store = SessionStore()
+
+# domain "auto" picks domains by embedding similarity to each domain's centroids (see domain_router)
+domain_router = DomainRouter()
+domain_loader = DomainLoader(on_ready=_on_domain_ready)
+for _domain_config in domains_config.domains.values():
+    register_domain(_domain_config)
+domain_loader.start()
+
+# Hot reload: changed data directories are re-ingested in the background and the new engine swapped in
+index_watcher = DataDirWatcher(domain_loader)
+index_watcher.start()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "") # When set, admin endpoints require it in the X-Admin-Token header
+MAX_QUERY_CHARS = int(os.getenv("MAX_QUERY_CHARS", "8000")) # Longer queries are rejected with a 400
+
+class RequestError:
+    """
+    An error response independent of the web framework: the Flask routes and the ASGI chat route
+    (asgi.py) share request resolution and render its errors themselves.
+    """
+    def __init__(self, status: int, message: str, retry_after: int = None):
+        self.status = status
+        self.payload = {'error': message}
+        self.headers = {}
+        if retry_after is not None:
+            self.payload['retry_after'] = retry_after
+            self.headers['Retry-After'] = str(retry_after)
+
+def _error_response(error: RequestError):
+    response = jsonify(error.payload)
+    response.headers.update(error.headers)
+    return response, error.status
+
+def _get_domain_service(domain: str):
+    """Returns (service, None), or (None, RequestError) when the domain is unknown, empty, loading or failed."""
+    try:
+        return domain_loader.get(domain.lower()), None
+    except KeyError:
+        logger.warning(f"Invalid domain specified: {domain}")
+        return None, RequestError(400, 'Invalid domain specified')
+    except DomainEmptyError as e:
+        return None, RequestError(404, str(e))
+    except DomainNotReadyError as e:
+        return None, RequestError(503, str(e), retry_after=e.retry_after)
+    except DomainUnavailableError as e:
+        return None, RequestError(503, str(e))
+
+def _get_embed_model():
+    from common_settings import EMBED_MODEL # Imported lazily, like the services: loads the shared models
+    return EMBED_MODEL
+
+def _route_queries(queries):
+    """Routes auto-domain queries with one batched query embedding; returns [(decision, query_embedding)]."""
+    embed_model = _get_embed_model() if domain_router.domains else None
+    return domain_router.route_queries(embed_model, queries, domains=domain_loader.servable_domains(), default_domain=DEFAULT_DOMAIN)
+
+def _resolve_services(domain: str, query: str):
+    """
+    Returns (services, routing, query_embedding, RequestError or None). A named domain resolves to itself;
+    "auto" resolves to the routed domains, best first, skipping any that are loading or failed as long
+    as one of them can answer.
+    """
+    if domain.lower() != AUTO_DOMAIN:
+        service, error = _get_domain_service(domain)
+        return ([service] if service else []), None, None, error
+    decision, query_embedding = _route_queries([query])[0]
+    services, first_error = [], None
+    for routed_domain in decision.domains:
+        service, error = _get_domain_service(routed_domain)
+        if service:
+            services.append(service)
+        else:
+            first_error = first_error or error
+    routing = {**decision.to_dict(), 'searched': [service.CACHE_DOMAIN for service in services]}
+    logger.info(f"Routed auto query to {routing['searched'] or decision.domains} ({decision.method}, confidence {routing['confidence']})")
+    return services, routing, query_embedding, (None if services else first_error)
+
+def _query_error(query, label: str = '"query"'):
+    """RequestError for a query that is not a non-blank string of at most MAX_QUERY_CHARS, else None."""
+    if not isinstance(query, str) or not query.strip():
+        return RequestError(400, f'{label} must be a non-empty string')
+    if len(query) > MAX_QUERY_CHARS:
+        return RequestError(400, f'{label} must be at most {MAX_QUERY_CHARS} characters')
+    return None
+
+def _resolve_request(data: dict):
+    """
+    Returns (session, domain, query, history, RequestError or None) for a chat request body. The domain
+    defaults to the session's, then DEFAULT_DOMAIN; history is the session's (None without one).
+    Session store calls may block on SQLite, so async callers run this in a thread.
+    """
+    if not isinstance(data, dict):
+        return None, 'invalid', None, None, RequestError(400, 'Request body must be a JSON object')
+    session = None
+    query = data.get('query', '')
+    if data.get('session_id'):
+        session = session_store.get(str(data['session_id']))
+        if session is None:
+            return None, str(data.get('domain') or DEFAULT_DOMAIN), query, None, RequestError(404, 'Unknown or expired session')
+    domain = data.get('domain') or (session.domain if session else DEFAULT_DOMAIN)
+    if not isinstance(domain, str):
+        return session, 'invalid', query, None, RequestError(400, 'Invalid domain specified')
+    error = _query_error(query)
+    if error:
+        return session, domain, query, None, error
+    # Summary of older turns plus the latest ones; kept within SESSION_HISTORY_TOKEN_BUDGET by the store
+    history = session_store.history(session.session_id) if session else None
+    return session, domain, query, history, None
+
+def _chat_payload(response: str, domain: str, services, routing, session, stats, wants_timings: bool) -> dict:
+    payload = {
+        'response': response,
+        'domain': services[0].CACHE_DOMAIN if routing else domain,
+        'llm_calls': stats.llm_calls
+    }
+    if routing:
+        payload['routing'] = routing
+    if session:
+        payload['session_id'] = session.session_id
+    if wants_timings:
+        payload['timings'] = stats.timing_breakdown()
+    return payload
+
+def _wants_timings(data: dict) -> bool:
+    """Per-request timing breakdown is opt-in: {"timings": true} in the body or ?timings=1."""
+    return bool(data.get('timings')) or request.args.get('timings', '').lower() in ('1', 'true', 'yes')
+
+def _count_request(endpoint: str, domain: str, status: int):
+    REGISTRY.inc("requests_total", help="HTTP requests by endpoint, domain and status", endpoint=endpoint, domain=domain, status=status)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    logger.debug(f"Received chat request: {request.json}")
-    data = request.json
-    query = data.get('query', '')
-    domain = data.get('domain', 'hr')  # Default to HR if not specified
+    data = request.json or {}
+    session, domain, query, history, error = _resolve_request(data)
+    if error:
+        _count_request('chat', domain, error.status)
+        return _error_response(error)
+    logger.debug(f"Received chat request: domain={domain}, query_chars={len(query)}") # Never log request bodies
     
     try:
-        if domain.lower() == 'hr':
-            if hr_service is None:
-                return jsonify({'error': 'HR Service is not available'}), 503
-            logger.info(f"Processing HR query: {query}")
-            response = hr_service.process_query(query)
-        elif domain.lower() == 'finance':
-            if finance_service is None:
-                return jsonify({'error': 'Finance Service is not available'}), 503
-            logger.info(f"Processing Finance query: {query}")
-            response = finance_service.process_query(query)
-        else:
-            logger.warning(f"Invalid domain specified: {domain}")
-            return jsonify({'error': 'Invalid domain specified'}), 400
+        with track_request() as stats:
+            with span("request", metric="request_duration_seconds", endpoint="chat", domain=domain):
+                services, routing, query_embedding, error = _resolve_services(domain, query)
+                if error:
+                    _count_request('chat', domain, error.status)
+                    return _error_response(error)
+                logger.info(f"Processing {domain} query: {query}")
+                # An ambiguous auto-routed query retrieves from every routed domain and is answered once
+                response = services[0].process_query(query, history=history, query_embedding=query_embedding, peers=services[1:])
+        if session:
+            session_store.append_turn(session.session_id, query, response)
             
-        logger.info(f"Generated response for {domain}: {response[:100]}...")
-        return jsonify({
-            'response': response,
-            'domain': domain
-        })
+        logger.info(f"Generated response for {domain} ({stats.llm_calls} LLM calls): {response[:100]}...")
+        _count_request('chat', domain, 200)
+        return jsonify(_chat_payload(response, domain, services, routing, session, stats, _wants_timings(data)))
+    except LLMOverloadedError as e:
+        logger.warning(f"Shedding {domain} query: {e}")
+        _count_request('chat', domain, 503)
+        return _error_response(RequestError(503, str(e), retry_after=e.retry_after))
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        _count_request('chat', domain, 500)
         return jsonify({'error': str(e)}), 500
 
+def _parse_batch_items(data: dict):
+    """
+    Batch items as (domain, query) pairs from {"items": [{"domain", "query"}]} or {"queries": [...], "domain"}.
+    Returns (items, None), or (None, RequestError) naming the first malformed item.
+    """
+    def invalid(message):
+        return None, RequestError(400, message)
+    if 'items' in data:
+        if not isinstance(data['items'], list):
+            return invalid('"items" must be a list of {"domain", "query"} objects')
+        items = []
+        for index, item in enumerate(data['items']):
+            if not isinstance(item, dict):
+                return invalid(f'Item {index} must be an object with a "query" and an optional "domain"')
+            items.append((item.get('domain') or DEFAULT_DOMAIN, item.get('query', '')))
+    else:
+        if not isinstance(data.get('queries', []), list):
+            return invalid('"queries" must be a list of strings')
+        items = [(data.get('domain') or DEFAULT_DOMAIN, query) for query in data.get('queries', [])]
+    for index, (domain, query) in enumerate(items):
+        if not isinstance(domain, str):
+            return invalid(f'Item {index}: "domain" must be a string')
+        error = _query_error(query, f'Item {index}: "query"')
+        if error:
+            return None, error
+    return items, None
+
+def _run_chat_batch(items, max_concurrency: int):
+    """
+    Yields one result per item (with its position in `items`), grouping the work by domain.
+    "auto" items are routed together in one embedding batch, each to its best domain (no fan-out in batches).
+    """
+    auto_indices = [index for index, (domain, _) in enumerate(items) if domain.lower() == AUTO_DOMAIN]
+    routings = {}
+    if auto_indices:
+        items = list(items)
+        for index, (decision, _) in zip(auto_indices, _route_queries([items[index][1] for index in auto_indices])):
+            items[index] = (decision.domain, items[index][1])
+            routings[index] = decision.to_dict()
+    by_domain = {}
+    for index, (domain, query) in enumerate(items):
+        by_domain.setdefault(domain.lower(), []).append(index)
+    for domain, indices in by_domain.items():
+        try:
+            service = domain_loader.get(domain)
+        except KeyError:
+            service, error = None, 'Invalid domain specified'
+        except (DomainNotReadyError, DomainUnavailableError) as e:
+            service, error = None, str(e)
+        if service is None:
+            for index in indices:
+                yield _with_routing({'index': index, 'domain': domain, 'query': items[index][1], 'error': error}, routings)
+            continue
+        for result in service.iter_batch([items[index][1] for index in indices], max_concurrency):
+            yield _with_routing({**result, 'index': indices[result['index']], 'domain': domain}, routings)
+
+def _with_routing(result: dict, routings: dict) -> dict:
+    if result['index'] in routings:
+        result['routing'] = routings[result['index']]
+    return result
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    from batch_chat import BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS # Imported lazily: pulls in the model settings
+    data = request.json or {}
+    items, error = _parse_batch_items(data)
+    if error:
+        return _error_response(error)
+    if not items:
+        return jsonify({'error': 'No queries provided'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Too many queries: {len(items)} (max {BATCH_MAX_ITEMS})'}), 400
+    try:
+        max_concurrency = max(1, min(int(data.get('max_concurrency', BATCH_MAX_CONCURRENCY)), BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({'error': '"max_concurrency" must be an integer'}), 400
+    logger.info(f"Processing batch of {len(items)} queries (max_concurrency={max_concurrency}, stream={bool(data.get('stream'))})")
+
+    if data.get('stream'):
+        # JSON lines in completion order; each carries its input index. The last line is a summary.
+        def generate():
+            with track_request() as stats:
+                with span("request", metric="request_duration_seconds", endpoint="chat_batch", domain="batch"):
+                    for result in _run_chat_batch(items, max_concurrency):
+                        yield json.dumps(result) + "\n"
+                summary = {'done': True, 'count': len(items), 'llm_calls': stats.llm_calls}
+                if wants_timings:
+                    summary['timings'] = stats.timing_breakdown()
+                yield json.dumps(summary) + "\n"
+        wants_timings = _wants_timings(data)
+        _count_request('chat_batch', 'batch', 200)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    try:
+        with track_request() as stats:
+            with span("request", metric="request_duration_seconds", endpoint="chat_batch", domain="batch"):
+                results = sorted(_run_chat_batch(items, max_concurrency), key=lambda result: result['index'])
+        payload = {'results': results, 'count': len(results), 'llm_calls': stats.llm_calls}
+        if _wants_timings(data):
+            payload['timings'] = stats.timing_breakdown()
+        _count_request('chat_batch', 'batch', 200)
+        return jsonify(payload)
+    except Exception as e:
+        logger.error(f"Error processing batch request: {str(e)}", exc_info=True)
+        _count_request('chat_batch', 'batch', 500)
+        return jsonify({'error': str(e)}), 500
+
+def _format_sse(event: dict) -> str:
+    """Formats an agent event as a Server-Sent Events message."""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json or {}
+    session, domain, query, history, error = _resolve_request(data)
+    if not error:
+        services, routing, query_embedding, error = _resolve_services(domain, query)
+    if error:
+        _count_request('chat_stream', domain, error.status)
+        return _error_response(error)
+
+    logger.info(f"Streaming {domain} query: {query}")
+    wants_timings = _wants_timings(data)
+    _count_request('chat_stream', domain, 200)
+
+    def generate():
+        if routing:
+            yield _format_sse({'event': 'routing', **routing})
+        with track_request() as stats:
+            with span("request", metric="request_duration_seconds", endpoint="chat_stream", domain=domain):
+                for event in services[0].stream_query(query, history=history, query_embedding=query_embedding, peers=services[1:]):
+                    if event['event'] == 'done':
+                        event = {**event, 'llm_calls': stats.llm_calls}
+                        if session:
+                            session_store.append_turn(session.session_id, query, event['response'])
+                            event['session_id'] = session.session_id
+                        if wants_timings:
+                            event['timings'] = stats.timing_breakdown()
+                    yield _format_sse(event)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    # Liveness only: the process is up and serving. Domain readiness is reported by /api/ready.
+    return jsonify({
+        'status': 'alive',
+        'uptime_seconds': round(time.monotonic() - APP_STARTED_AT, 3)
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    overall_state = domain_loader.overall_state()
     status = {
-        'status': 'healthy',
-        'services': {
-            'hr': hr_service is not None,
-            'finance': finance_service is not None
-        }
+        'status': overall_state,
+        'domains': domain_loader.status()
     }
-    logger.info(f"Health check: {status}")
-    return jsonify(status)
+    logger.info(f"Readiness check: {status}")
+    return jsonify(status), (200 if overall_state == 'ready' else 503)
+
+@app.route('/api/domains', methods=['GET'])
+def list_domains():
+    # Configured domains with their load state; lazily loaded domains build on their first request
+    rss = process_rss_bytes()
+    routable = set(domain_router.domains) & set(domain_loader.servable_domains()) # Domains "auto" can route to: profiled and not empty
+    return jsonify({
+        'default_domain': DEFAULT_DOMAIN,
+        'auto_domain': AUTO_DOMAIN,
+        'memory_budget_mb': round(domain_loader.memory_budget_bytes / 1024 / 1024) or None,
+        'rss_mb': round(rss / 1024 / 1024, 1) if rss is not None else None,
+        'domains': {
+            name: {'label': domains_config.domains[name].label, 'tool_description': domains_config.domains[name].tool_description,
+                   'routable': name in routable, **status}
+            for name, status in domain_loader.status().items()
+        },
+    })
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    data = request.get_json(silent=True) or {}
+    domain = str(data.get('domain', DEFAULT_DOMAIN)).lower()
+    if domain != AUTO_DOMAIN and domain not in domain_loader.domains:
+        return jsonify({'error': 'Invalid domain specified'}), 400
+    return jsonify(session_store.create(domain).to_dict()), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    session = session_store.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if not session_store.delete(session_id):
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    return '', 204
+
+@app.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    return jsonify(session_store.stats())
+
+def _admin_denied():
+    if ADMIN_TOKEN and not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    # Ingests data directory changes and swaps in the new engine in the background; poll /api/domains for the outcome
+    denied = _admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    domains = [str(data['domain']).lower()] if data.get('domain') else domain_loader.domains
+    unknown = [domain for domain in domains if domain not in domain_loader.domains]
+    if unknown:
+        return jsonify({'error': f"Invalid domain specified: {', '.join(unknown)}"}), 400
+    results = {domain: domain_loader.reload(domain, force=bool(data.get('force')), reason="admin") for domain in domains}
+    logger.info(f"Admin reload requested: {results}")
+    return jsonify({'reloads': results}), 202
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(answer_cache.stats() if answer_cache is not None else {})
+
+def _collect_service_metrics():
+    """Scrape-time samples from the answer cache, LLM scheduler, domain loader and speculative retrieval."""
+    if answer_cache is not None:
+        cache_stats = answer_cache.stats()
+        for key in ("exact_hits", "semantic_hits", "misses", "stores", "evictions", "expirations", "invalidations", "llm_calls_saved"):
+            yield (f"answer_cache_{key}_total", "counter", f"Answer cache {key.replace('_', ' ')}", {}, cache_stats[key])
+        yield ("answer_cache_entries", "gauge", "Entries in the answer cache", {}, cache_stats["entries"])
+        yield ("answer_cache_bytes", "gauge", "Approximate answer cache size in bytes", {}, cache_stats["bytes"])
+    for key, value in session_store.stats().items():
+        if key == "sessions_in_memory":
+            yield ("sessions_in_memory", "gauge", "Conversation sessions held in memory", {}, value)
+        else:
+            yield (f"sessions_{key}_total", "counter", f"Conversation sessions {key.replace('_', ' ')}", {}, value)
+    scheduler_stats = get_default_scheduler().stats()
+    for key in ("calls", "completed", "failed", "retries", "rate_limited", "queue_wait_seconds"):
+        yield (f"llm_scheduler_{key}_total", "counter", f"LLM scheduler {key.replace('_', ' ')}", {}, scheduler_stats[key])
+    yield ("llm_scheduler_in_flight", "gauge", "LLM calls in flight", {}, scheduler_stats["in_flight"])
+    for lane, queued in scheduler_stats["queued"].items():
+        yield ("llm_scheduler_queued", "gauge", "LLM calls waiting for a slot", {"lane": lane}, queued)
+    for lane, shed in scheduler_stats["shed"].items():
+        yield ("llm_scheduler_shed_total", "counter", "LLM calls shed because the lane's queue was full", {"lane": lane}, shed)
+    for domain, status in domain_loader.status().items():
+        yield ("domain_ready", "gauge", "1 when the domain is ready to serve", {"domain": domain}, 1 if status["state"] == "ready" else 0)
+        speculator = getattr(getattr(domain_loader.get_if_ready(domain), 'agent', None), 'speculator', None)
+        if speculator is not None:
+            speculation_stats = speculator.stats()
+            for outcome in ("reused", "merged", "failed"):
+                yield ("speculative_retrieval_total", "counter", "Speculative retrieval outcomes", {"domain": domain, "outcome": outcome}, speculation_stats[outcome])
+
+REGISTRY.register_collector(_collect_service_metrics)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(get_default_scheduler().stats())
+
+@app.route('/api/retrieval/stats', methods=['GET'])
+def retrieval_stats():
+    # Speculative retrieval outcomes per loaded domain (null when speculation is off)
+    report = {}
+    for domain in domain_loader.domains:
+        service = domain_loader.get_if_ready(domain)
+        speculator = getattr(getattr(service, 'agent', None), 'speculator', None)
+        report[domain] = {'speculation': speculator.stats() if speculator is not None else None}
+    return jsonify(report)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     logger.info(f"Starting Flask server on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    # No reloader: it re-imports this module in a child process, preloading and watching every index twice
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG') == '1', use_reloader=False)
\ No newline at end of file
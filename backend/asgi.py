@@ -0,0 +1,106 @@
+import json
+import asyncio
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as wsgi_app_module # Shares the domain loader and answer cache initialized by app.py
+from request_context import track_request
+from llm_scheduler import LLMOverloadedError
+from metrics import span
+
+# ASGI entry point. /api/chat is served natively on the event loop through the services'
+# aprocess_query() path, so one process can hold many in-flight chats without a thread each.
+# Every other route is delegated to the Flask app.
+#
+# Run with:  uvicorn asgi:application --host 0.0.0.0 --port 5000 --loop asyncio
+# (--loop asyncio is required: the services apply nest_asyncio, which cannot patch uvloop.)
+
+logger = logging.getLogger(__name__)
+
+_flask_application = WsgiToAsgi(wsgi_app_module.app)
+
+_JSON_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"access-control-allow-origin", b"*"), # Mirrors flask_cors' default for the native route
+]
+
+
+async def _read_json_body(receive) -> dict:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return json.loads(body) if body else {}
+
+
+async def _send_json(send, status: int, payload: dict, extra_headers: list = None):
+    body = json.dumps(payload).encode("utf-8")
+    headers = _JSON_HEADERS + [(b"content-length", str(len(body)).encode())] + (extra_headers or [])
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, error):
+    await _send_json(send, error.status, error.payload,
+                     extra_headers=[(name.lower().encode(), value.encode()) for name, value in error.headers.items()])
+
+
+async def _chat(receive, send):
+    # Same resolution as app.chat(): app.py's helpers run in a thread, since session lookups and
+    # "auto" routing (one query embedding) block
+    try:
+        data = await _read_json_body(receive)
+    except ValueError:
+        await _send_json(send, 400, {'error': 'Request body must be valid JSON'})
+        return
+    session, domain, query, history, error = await asyncio.to_thread(wsgi_app_module._resolve_request, data)
+    count_request = lambda status: wsgi_app_module._count_request('chat_async', domain, status)
+    if error:
+        count_request(error.status)
+        await _send_error(send, error)
+        return
+
+    try:
+        with track_request() as stats:
+            with span("request", metric="request_duration_seconds", endpoint="chat_async", domain=domain):
+                services, routing, query_embedding, error = await asyncio.to_thread(wsgi_app_module._resolve_services, domain, query)
+                if error:
+                    count_request(error.status)
+                    await _send_error(send, error)
+                    return
+                logger.info(f"Processing {domain} query (async): {query}")
+                response = await services[0].aprocess_query(query, history=history, query_embedding=query_embedding, peers=services[1:])
+        if session:
+            await asyncio.to_thread(wsgi_app_module.session_store.append_turn, session.session_id, query, response)
+        count_request(200)
+        await _send_json(send, 200, wsgi_app_module._chat_payload(response, domain, services, routing, session, stats, bool(data.get('timings'))))
+    except LLMOverloadedError as e:
+        logger.warning(f"Shedding {domain} query: {e}")
+        count_request(503)
+        await _send_error(send, wsgi_app_module.RequestError(503, str(e), retry_after=e.retry_after))
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        count_request(500)
+        await _send_json(send, 500, {'error': str(e)})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/api/chat":
+        await _chat(receive, send)
+    else:
+        await _flask_application(scope, receive, send)
@@ -0,0 +1,120 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from answer_cache import normalize_query
+from embedding_backend import embed_queries
+from llm_scheduler import PRIORITY_BATCH, llm_priority
+
+# --- Batch Chat Configuration ---
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8")) # Items planned/answered at once per domain
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500")) # Largest batch accepted by /api/chat/batch
+
+
+def dedupe_queries(queries: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Collapses queries that are identical after normalize_query. Returns the unique queries (first
+    spelling wins) and, for every input position, the index of its unique query.
+    """
+    unique: List[str] = []
+    unique_index: Dict[str, int] = {}
+    positions: List[int] = []
+    for query in queries:
+        normalized = normalize_query(query)
+        if normalized not in unique_index:
+            unique_index[normalized] = len(unique)
+            unique.append(query)
+        positions.append(unique_index[normalized])
+    return unique, positions
+
+
+def _run_in_batch_lane(fn, *args, **kwargs):
+    with llm_priority(PRIORITY_BATCH): # Interactive chats get LLM slots first; batch calls are shed first
+        return fn(*args, **kwargs)
+
+
+def _submit(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    # Each task runs in a copy of the caller's context so per-request stats (LLM calls) still add up
+    return executor.submit(contextvars.copy_context().run, _run_in_batch_lane, fn, *args, **kwargs)
+
+
+def _embed_plans(agent, retrieval_plans: list):
+    """Embeds every planned query of the batch in one call and attaches the vectors to the plans."""
+    embed_model = getattr(getattr(agent.query_engine, 'retriever', None), 'embed_model', None)
+    texts = [text for retrieval_plan in retrieval_plans for text in retrieval_plan.queries]
+    if embed_model is None or not texts:
+        return
+    try:
+        embeddings = embed_queries(embed_model, texts)
+    except Exception as e:
+        print(f"Warning: Batch query embedding failed, retrievers will embed per query: {e}")
+        return
+    offset = 0
+    for retrieval_plan in retrieval_plans:
+        count = len(retrieval_plan.queries)
+        retrieval_plan.query_embeddings = [list(embedding) for embedding in embeddings[offset:offset + count]]
+        offset += count
+
+
+def run_batch(service, queries: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> Iterator[Dict]:
+    """
+    Answers many independent (history-free) queries for one domain service. Yields one result per
+    input, {"index", "query", "response" | "error", "cached"}, in completion order:
+      1. duplicates (after normalization) are answered once;
+      2. the answer cache is checked for all of them, embedding the misses in one batch;
+      3. the misses are planned concurrently, then all planned queries are embedded in one batch;
+      4. retrieval and answer synthesis run concurrently, at most `max_concurrency` at a time.
+    """
+    agent, answer_cache, cache_domain = service.agent, service.answer_cache, service.CACHE_DOMAIN
+    unique, positions = dedupe_queries(queries)
+    inputs_for: Dict[int, List[int]] = {}
+    for index, unique_i in enumerate(positions):
+        inputs_for.setdefault(unique_i, []).append(index)
+
+    def results_for(unique_i: int, response: Optional[str] = None, error: Optional[str] = None, cached: bool = False):
+        for index in inputs_for[unique_i]:
+            result = {"index": index, "query": queries[index], "cached": cached}
+            if error is not None:
+                result["error"] = error
+            else:
+                result["response"] = response
+            yield result
+
+    lookups = answer_cache.lookup_many(cache_domain, unique) if answer_cache is not None else [(None, None)] * len(unique)
+    pending = []
+    for unique_i, (cached_answer, _) in enumerate(lookups):
+        if cached_answer is not None:
+            yield from results_for(unique_i, response=cached_answer, cached=True)
+        else:
+            pending.append(unique_i)
+    if not pending:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix=f"batch-{cache_domain}") as executor:
+        plan_futures = {unique_i: _submit(executor, agent.plan_query, unique[unique_i]) for unique_i in pending}
+        retrieval_plans = {}
+        for unique_i, future in plan_futures.items():
+            try:
+                retrieval_plans[unique_i] = future.result()
+            except Exception as e:
+                print(f"Error planning batch query '{unique[unique_i]}': {e}")
+                yield from results_for(unique_i, error=f"Sorry, I encountered an error while processing your query: {str(e)}")
+        _embed_plans(agent, list(retrieval_plans.values()))
+
+        answer_futures = {
+            _submit(executor, agent.chat, unique[unique_i], retrieval_plan=retrieval_plan): unique_i
+            for unique_i, retrieval_plan in retrieval_plans.items()
+        }
+        for future in as_completed(answer_futures):
+            unique_i = answer_futures[future]
+            try:
+                answer = future.result()
+            except Exception as e:
+                print(f"Error answering batch query '{unique[unique_i]}': {e}")
+                yield from results_for(unique_i, error=f"Sorry, I encountered an error while processing your query: {str(e)}")
+                continue
+            if answer_cache is not None:
+                llm_calls = int(retrieval_plans[unique_i].used_llm) + 1 # Planning (if any) + synthesis
+                answer_cache.store(cache_domain, unique[unique_i], answer, query_embedding=lookups[unique_i][1], llm_calls=llm_calls)
+            yield from results_for(unique_i, response=answer)
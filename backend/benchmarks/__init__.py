@@ -0,0 +1 @@
+# Benchmark scripts; run from backend/, e.g. python -m benchmarks.embedding_benchmark
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Recall@k vs. latency of MmapVectorStore's IVF mode against its exact search.
+
+Vectors come from a persisted index (--persist-dir) or a synthetic clustered corpus. Queries are
+perturbed copies of random stored vectors. Exact search provides the ground truth. Each nprobe
+setting reports mean recall@k and p50/p95 query latency.
+
+Run from backend/:
+    python -m benchmarks.ann_benchmark --num-vectors 100000 --nprobe 4 8 16 32
+    python -m benchmarks.ann_benchmark --persist-dir ../storage/financials_index
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("IVF_MIN_VECTORS", "1") # Always train IVF here, whatever the corpus size
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from mmap_vector_store import MmapVectorStore
+
+
+def synthetic_vectors(num_vectors: int, dim: int, num_topics: int, seed: int) -> np.ndarray:
+    """Topic-clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, num_topics, num_vectors)] + 0.6 * rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_store(vectors: np.ndarray, persist_dir: str, **store_options) -> MmapVectorStore:
+    store = MmapVectorStore(**store_options)
+    batch = 10000
+    for start in range(0, len(vectors), batch):
+        store.add([TextNode(id_=str(start + i), text="", embedding=vector.tolist()) for i, vector in enumerate(vectors[start:start + batch])])
+    store.persist(os.path.join(persist_dir, "default__vector_store.json")) # Trains IVF in ivf mode
+    return MmapVectorStore.from_persist_dir(persist_dir, **store_options)
+
+
+def time_queries(store: MmapVectorStore, queries: np.ndarray, top_k: int):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(set(result.ids))
+    return results, {"p50_ms": round(float(np.percentile(latencies, 50)), 3), "p95_ms": round(float(np.percentile(latencies, 95)), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-dir", help="Use the vectors of this persisted index instead of a synthetic corpus")
+    parser.add_argument("--num-vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--num-topics", type=int, default=200)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = about 4 * sqrt(N))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.persist_dir:
+        vectors = np.asarray(MmapVectorStore.from_persist_dir(args.persist_dir)._matrix, dtype=np.float32)
+    else:
+        vectors = synthetic_vectors(args.num_vectors, args.dim, args.num_topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), args.num_queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) * queries.std()
+
+    with tempfile.TemporaryDirectory() as exact_dir, tempfile.TemporaryDirectory() as ivf_dir:
+        exact_store = build_store(vectors, exact_dir)
+        started = time.perf_counter()
+        ivf_store = build_store(vectors, ivf_dir, index_mode="ivf", nlist=args.nlist)
+        build_seconds = time.perf_counter() - started
+        if ivf_store._ivf is None:
+            parser.error("IVF index was not trained; lower IVF_MIN_VECTORS or use a larger corpus")
+
+        truth, exact_latency = time_queries(exact_store, queries, args.top_k)
+        runs = []
+        for nprobe in args.nprobe:
+            ivf_store.nprobe = nprobe
+            found, latency = time_queries(ivf_store, queries, args.top_k)
+            recall = float(np.mean([len(a & b) / len(a) for a, b in zip(truth, found) if a]))
+            runs.append({"nprobe": nprobe, f"recall_at_{args.top_k}": round(recall, 4), **latency})
+
+        report = {
+            "num_vectors": int(len(vectors)),
+            "dim": int(vectors.shape[1]),
+            "nlist": ivf_store._ivf.nlist,
+            "ivf_build_seconds": round(build_seconds, 2),
+            "exact": exact_latency,
+            "ivf": runs,
+        }
+    report = json.dumps(report, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == '__main__':
+    main()
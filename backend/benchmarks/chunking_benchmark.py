@@ -0,0 +1,165 @@
+"""
+Compares chunking strategies (see chunking.py) on the same corpus: node count, chunk sizes, table rows
+cut across chunks, index build time (chunk/embed/build phases), index size on disk, and retrieval
+hit-rate@k of the vector and BM25 retrievers.
+
+By default the corpus is --num-docs synthetic annual reports (headings, lists and financial statement
+tables, as LlamaParse emits them) with questions whose answer is one table cell; a question is a hit
+when a retrieved chunk of the right file holds the whole table row with that value. The fake hash
+embedder is used unless --real, so vector hit-rates only rank strategies against each other; BM25
+hit-rates do not depend on the embedder.
+
+For a real corpus, point --data-dir at it and give --questions, a JSON Lines file of
+{"query", "file_name", "expected"} where "expected" is text the answering chunk must contain:
+    python -m benchmarks.chunking_benchmark --num-docs 100
+    python -m benchmarks.chunking_benchmark --real --data-dir ../data/financials --questions finance_questions.jsonl
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic_corpus import generate_report_corpus
+
+CACHE_NAMES = ("embedding_cache.sqlite", "parse_cache") # Caches kept beside the index, not part of it
+
+
+def index_size_bytes(persist_dir: str) -> int:
+    total = 0
+    for root, dirs, files in os.walk(persist_dir):
+        dirs[:] = [name for name in dirs if name not in CACHE_NAMES]
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files if not name.startswith(CACHE_NAMES))
+    return total
+
+
+def cut_table_rows(text: str) -> int:
+    """Table rows split across chunks: lines that open a row without closing it, or close one they did not open."""
+    return sum(1 for line in text.splitlines() if line.strip() and line.strip().startswith("|") != line.strip().endswith("|"))
+
+
+def answers(node, question: Dict) -> bool:
+    if node.metadata.get("file_name") != question["file_name"]:
+        return False
+    text = node.get_content()
+    if "expected" in question:
+        return question["expected"] in text
+    row = f"| {question['row']} |"
+    return any(line.strip().startswith(row) and line.strip().endswith("|") and f" {question['value']} " in line
+               for line in text.splitlines())
+
+
+def bench_strategy(strategy: Dict, data_dir: str, persist_dir: str, questions: List[Dict], top_k: int) -> Dict:
+    from chunking import build_node_parser, node_parser_signature
+    from index_utils import manage_index
+    from bm25_index import SparseBM25Retriever, load_or_build_bm25_index
+    from request_context import track_request
+    from llama_index.core.retrievers import VectorIndexRetriever
+    from llama_index.core.utils import get_tokenizer
+
+    node_parser = build_node_parser(strategy)
+    with track_request() as stats:
+        started = time.perf_counter()
+        index = manage_index(f"chunking_{strategy['strategy']}", persist_dir, data_dir, doc_parser_instance=None, node_parser_for_build=node_parser)
+        build_seconds = time.perf_counter() - started
+    nodes = list(index.docstore.docs.values())
+    tokenizer = get_tokenizer()
+    node_tokens = [len(tokenizer(node.get_content())) for node in nodes]
+
+    vector_retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k)
+    bm25_retriever = SparseBM25Retriever(load_or_build_bm25_index(persist_dir, index.docstore), docstore=index.docstore, similarity_top_k=top_k)
+    hits = {"vector": 0, "bm25": 0, "either": 0}
+    for question in questions:
+        vector_hit = any(answers(result.node, question) for result in vector_retriever.retrieve(question["query"]))
+        bm25_hit = any(answers(result.node, question) for result in bm25_retriever.retrieve(question["query"]))
+        hits["vector"] += vector_hit
+        hits["bm25"] += bm25_hit
+        hits["either"] += vector_hit or bm25_hit
+    return {
+        "strategy": node_parser_signature(node_parser),
+        "nodes": len(nodes),
+        "node_tokens": {"mean": round(float(np.mean(node_tokens)), 1), "max": int(np.max(node_tokens))} if node_tokens else {},
+        "total_tokens": int(sum(node_tokens)),
+        "cut_table_rows": sum(cut_table_rows(node.get_content()) for node in nodes),
+        "build_seconds": round(build_seconds, 3),
+        "build_phases": {phase: timing["seconds"] for phase, timing in stats.timing_breakdown()["stages"].items()},
+        "index_bytes": index_size_bytes(persist_dir),
+        "hit_rate": {retriever: round(count / len(questions), 4) if questions else None for retriever, count in hits.items()},
+    }
+
+
+def print_table(results: List[Dict], top_k: int):
+    print(f"{'strategy':<26}{'nodes':>7}{'tokens':>9}{'cut rows':>10}{'build s':>9}{'index KB':>10}"
+          f"{f'vec@{top_k}':>9}{f'bm25@{top_k}':>9}{f'any@{top_k}':>9}")
+    for result in results:
+        hit_rate = result["hit_rate"]
+        print(f"{result['strategy']:<26}{result['nodes']:>7}{result['total_tokens']:>9}{result['cut_table_rows']:>10}"
+              f"{result['build_seconds']:>9.2f}{result['index_bytes'] / 1024:>10.0f}"
+              f"{hit_rate['vector'] or 0:>9.3f}{hit_rate['bm25'] or 0:>9.3f}{hit_rate['either'] or 0:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", nargs="+", default=["sentence", "markdown"], help="Chunking strategies to compare")
+    parser.add_argument("--chunk-size", type=int, help="Overrides every strategy's default chunk size")
+    parser.add_argument("--num-docs", type=int, default=100, help="Synthetic reports (without --data-dir)")
+    parser.add_argument("--questions-per-doc", type=int, default=3)
+    parser.add_argument("--data-dir", help="Corpus to chunk instead of synthetic reports; needs --questions for hit-rates")
+    parser.add_argument("--questions", help="JSON Lines of {query, file_name, expected} for --data-dir")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--real", action="store_true", help="Use the configured models instead of the fake ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Corpus and index directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/chunking-<timestamp>.json)")
+    args = parser.parse_args()
+
+    if not args.real:
+        os.environ["USE_FAKE_MODELS"] = "true" # Before any backend import
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-chunking-")
+    try:
+        if args.data_dir:
+            data_dir = args.data_dir
+            questions = []
+            if args.questions:
+                with open(args.questions, 'r', encoding='utf-8') as f:
+                    questions = [json.loads(line) for line in f if line.strip()]
+        else:
+            data_dir = os.path.join(work_dir, "data")
+            questions = generate_report_corpus(data_dir, args.num_docs, args.seed, args.questions_per_doc)
+        print(f"Comparing {args.strategies} on {data_dir} with {len(questions)} question(s)", file=sys.stderr)
+        results = []
+        for strategy in args.strategies:
+            config = {"strategy": strategy, **({"chunk_size": args.chunk_size} if args.chunk_size else {})}
+            persist_dir = os.path.join(work_dir, "storage", strategy)
+            shutil.rmtree(persist_dir, ignore_errors=True) # Every strategy builds from scratch
+            results.append(bench_strategy(config, data_dir, persist_dir, questions, args.top_k))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                        "models": "configured" if args.real else "fake"},
+        "results": results,
+    }
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"chunking-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(results, args.top_k)
+    print(f"Report written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Compares embedding backend configurations on a sample of indexed chunks.
+
+For each configuration it reports ingestion throughput (chunks/sec), single-query embedding
+latency, and how much of the baseline model's top-k retrieval it reproduces (overlap@k).
+The first configuration is the baseline.
+
+Run from backend/:
+    python -m benchmarks.embedding_benchmark --persist-dir ../storage/hr_index
+    python -m benchmarks.embedding_benchmark --configs '[{}, {"backend": "onnx"}, {"num_processes": 4}]'
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import MetadataMode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from embedding_backend import build_embed_model
+
+DEFAULT_CONFIGS = [
+    {}, # Baseline: current production settings (bge-large, PyTorch)
+    {"batch_size": 64},
+    {"backend": "onnx"},
+    {"backend": "onnx", "onnx_file": "onnx/model_qint8_avx512_vnni.onnx"},
+    {"num_processes": max(2, (os.cpu_count() or 2) // 2)},
+]
+
+DEFAULT_QUERIES = [
+    "How many days of earned leave can an employee accumulate?",
+    "What is the travel allowance for officers on tour?",
+    "What are the rules for medical reimbursement?",
+    "What was the total revenue from operations last year?",
+    "How did the net profit change compared to the previous year?",
+    "What is the debt-equity ratio?",
+    "What are the leasing arrangements with the Ministry of Railways?",
+    "Who is eligible for leave travel concession?",
+]
+
+
+def load_sample_chunks(persist_dir: str, limit: int) -> list:
+    docstore = SimpleDocumentStore.from_persist_dir(persist_dir)
+    nodes = sorted(docstore.docs.values(), key=lambda node: node.node_id)[:limit]
+    return [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+
+
+def top_k_ids(query_vectors: np.ndarray, chunk_vectors: np.ndarray, k: int) -> list:
+    scores = query_vectors @ chunk_vectors.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def run_config(config: dict, chunks: list, queries: list, k: int) -> dict:
+    started = time.perf_counter()
+    model = build_embed_model(config)
+    load_seconds = time.perf_counter() - started
+
+    model.get_text_embedding_batch(chunks[:8]) # Warm-up (and pool start-up for multi-process configs)
+    started = time.perf_counter()
+    chunk_vectors = np.asarray(model.get_text_embedding_batch(chunks), dtype=np.float32)
+    ingest_seconds = time.perf_counter() - started
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(model.get_query_embedding(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    if hasattr(model, "close_pool"):
+        model.close_pool()
+
+    return {
+        "config": config,
+        "load_seconds": round(load_seconds, 2),
+        "chunks": len(chunks),
+        "chunks_per_second": round(len(chunks) / ingest_seconds, 2) if ingest_seconds else None,
+        "query_latency_ms_p50": round(statistics.median(latencies), 2),
+        "query_latency_ms_max": round(max(latencies), 2),
+        "_chunk_vectors": chunk_vectors,
+        "_query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-dir", default="../storage/hr_index", help="Index whose docstore supplies the sample chunks")
+    parser.add_argument("--limit", type=int, default=500, help="Number of chunks to embed per configuration")
+    parser.add_argument("--queries", help="File with one query per line (defaults to built-in HR/finance questions)")
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--configs", help="JSON list of build_embed_model overrides; the first is the baseline")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    chunks = load_sample_chunks(args.persist_dir, args.limit)
+    if not chunks:
+        parser.error(f"No chunks found in {args.persist_dir}")
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    configs = json.loads(args.configs) if args.configs else DEFAULT_CONFIGS
+
+    results = []
+    baseline_top_k = None
+    for config in configs:
+        print(f"Benchmarking {config or 'baseline'} on {len(chunks)} chunk(s)...", file=sys.stderr)
+        try:
+            result = run_config(config, chunks, queries, args.top_k)
+        except Exception as e:
+            results.append({"config": config, "error": str(e)})
+            continue
+        top_k = top_k_ids(result.pop("_query_vectors"), result.pop("_chunk_vectors"), args.top_k)
+        if baseline_top_k is None:
+            baseline_top_k = top_k
+        result[f"overlap_at_{args.top_k}"] = round(
+            statistics.mean(len(a & b) / args.top_k for a, b in zip(baseline_top_k, top_k)), 3
+        )
+        results.append(result)
+
+    report = json.dumps({"persist_dir": args.persist_dir, "queries": len(queries), "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Local stand-ins for external services, so the serving path can be load-tested without API keys.
+
+FakeLLM and FakeEmbedding are real LlamaIndex LLM / embedding classes, so they can replace the
+Gemini LLM and the bge embedder everywhere (common_settings uses them when USE_FAKE_MODELS=true).
+Both are deterministic: the same prompt or text always gives the same reply or vector.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import random
+import asyncio
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+
+from llama_index.core.base.llms.types import CompletionResponse, LLMMetadata
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.custom import CustomLLM
+
+# --- Fake Model Configuration (USE_FAKE_MODELS=true) ---
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.2"))
+FAKE_LLM_JITTER_SECONDS = float(os.getenv("FAKE_LLM_JITTER_SECONDS", "0")) # 0 keeps latency fully deterministic
+FAKE_LLM_ANSWER_WORDS = int(os.getenv("FAKE_LLM_ANSWER_WORDS", "60"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "384"))
+FAKE_EMBED_SECONDS_PER_TEXT = float(os.getenv("FAKE_EMBED_SECONDS_PER_TEXT", "0")) # Simulated encoder cost
+
+_WORD_RE = re.compile(r"\w+")
+_QUESTION_RE = re.compile(r"question[^:\n]*:\s*\"?([^\"\n]+)", re.IGNORECASE)
+_STOP_WORDS = {"a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "is", "are", "what", "how", "do", "does", "i", "my", "can", "which", "who", "when", "was", "were", "with"}
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like the provider's throttling error: HTTP 429 / RESOURCE_EXHAUSTED."""
+    def __init__(self, message: str = "429 RESOURCE_EXHAUSTED: fake rate limit"):
+        super().__init__(message)
+        self.code = 429
+
+
+class FakeLLM(CustomLLM):
+    """
+    Stands in for the Gemini LLM: complete/acomplete/stream_complete with injected latency
+    (latency_seconds +/- jitter_seconds) and 429s, either at random (rate_limit_probability) or,
+    like a real quota, whenever more than `server_concurrency` calls are in flight.
+    Replies are derived from the prompt: retrieval-planning prompts get a valid JSON plan built
+    from the question's keywords, anything else a fixed-length excerpt of the prompt, unless a
+    constant response_text is given.
+    """
+    latency_seconds: float = 0.2
+    jitter_seconds: float = 0.05
+    rate_limit_probability: float = 0.0
+    server_concurrency: int = 0 # 0 = unlimited
+    response_text: Optional[str] = None
+    answer_words: int = FAKE_LLM_ANSWER_WORDS
+    stream_chunks: int = 8
+    seed: Optional[int] = None
+
+    _random: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+    _in_flight: int = PrivateAttr(default=0)
+    _calls: int = PrivateAttr(default=0)
+    _rate_limited: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="fake-llm", context_window=1_000_000, num_output=1024)
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def rate_limited(self) -> int:
+        return self._rate_limited
+
+    def _begin(self) -> float:
+        with self._lock:
+            self._calls += 1
+            throttled = (self.server_concurrency and self._in_flight >= self.server_concurrency) or \
+                self._random.random() < self.rate_limit_probability
+            if throttled:
+                self._rate_limited += 1
+                raise FakeRateLimitError()
+            self._in_flight += 1
+            jitter = self._random.uniform(-self.jitter_seconds, self.jitter_seconds) if self.jitter_seconds else 0.0
+            return max(0.0, self.latency_seconds + jitter)
+
+    def _end(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _respond(self, prompt: str) -> str:
+        if self.response_text is not None:
+            return self.response_text
+        if '"variants"' in prompt: # RetrievalPlanner.format_instructions
+            match = _QUESTION_RE.search(prompt)
+            question = match.group(1) if match else prompt[-200:]
+            keywords = [word for word in _WORD_RE.findall(question.lower()) if word not in _STOP_WORDS] or ["policy"]
+            variants = [" ".join(reversed(keywords)), " ".join(keywords[:max(1, len(keywords) // 2)]), " ".join(keywords + ["details"])]
+            return json.dumps({"query": " ".join(keywords), "variants": variants})
+        words = prompt.split()
+        if not words:
+            return "No information found."
+        start = zlib.crc32(prompt.encode("utf-8")) % max(1, len(words) - self.answer_words)
+        return " ".join(words[start:start + self.answer_words])
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        latency = self._begin()
+        try:
+            time.sleep(latency)
+            return CompletionResponse(text=self._respond(prompt))
+        finally:
+            self._end()
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        latency = self._begin()
+        try:
+            await asyncio.sleep(latency)
+            return CompletionResponse(text=self._respond(prompt))
+        finally:
+            self._end()
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        latency = self._begin()
+        try:
+            words = self._respond(prompt).split(" ")
+            step = max(1, len(words) // self.stream_chunks)
+            text = ""
+            for start in range(0, len(words), step):
+                time.sleep(latency / self.stream_chunks)
+                delta = " ".join(words[start:start + step]) + " "
+                text += delta
+                yield CompletionResponse(text=text, delta=delta)
+        finally:
+            self._end()
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Hash-based bag-of-words embedder: every token adds +/-1 to a crc32-chosen dimension and the
+    vector is L2-normalised. Texts sharing words score higher, so retrieval, fusion and the semantic
+    answer cache behave plausibly at a fraction of a real encoder's cost.
+    """
+    dim: int = FAKE_EMBED_DIM
+    seconds_per_text: float = 0.0 # Sleep per embedded text, to simulate encoder cost
+
+    def __init__(self, dim: int = FAKE_EMBED_DIM, seconds_per_text: float = 0.0, **kwargs):
+        kwargs.setdefault("model_name", f"fake-hash-{dim}")
+        super().__init__(dim=dim, seconds_per_text=seconds_per_text, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _WORD_RE.findall(text.lower()):
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if (bucket >> 16) & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _embed_many(self, texts: List[str]) -> List[List[float]]:
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_many([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed_many([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_many(texts)
+
+
+def build_fake_models():
+    """(llm, embed_model) configured from the FAKE_* environment variables."""
+    llm = FakeLLM(latency_seconds=FAKE_LLM_LATENCY_SECONDS, jitter_seconds=FAKE_LLM_JITTER_SECONDS, seed=0)
+    embed_model = FakeEmbedding(dim=FAKE_EMBED_DIM, seconds_per_text=FAKE_EMBED_SECONDS_PER_TEXT)
+    return llm, embed_model
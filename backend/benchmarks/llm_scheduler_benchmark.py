@@ -0,0 +1,114 @@
+"""
+Load-tests the LLM scheduler against FakeLLM, which injects latency and 429s.
+
+Interactive and batch callers run concurrently, either calling the fake LLM directly (the old
+behaviour) or through ScheduledLLM. Per lane it reports successes, errors (429s that reached the
+caller), shed calls and p50/p95 latency, plus the scheduler's own counters.
+
+Run from backend/:
+    python -m benchmarks.llm_scheduler_benchmark
+    python -m benchmarks.llm_scheduler_benchmark --server-concurrency 6 --max-in-flight 6 --batch-callers 32
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeLLM
+from llm_scheduler import (LLMOverloadedError, LLMScheduler, ScheduledLLM, PRIORITY_BATCH, PRIORITY_INTERACTIVE,
+                           PRIORITY_LANES, llm_priority)
+from rate_limit import TokenBucket
+
+
+def run_callers(llm, lanes_and_callers, calls_per_caller: int):
+    results = {lane: {"ok": 0, "errors": 0, "shed": 0, "latencies_ms": []} for lane in PRIORITY_LANES}
+    lock = threading.Lock()
+
+    def caller(lane: str):
+        with llm_priority(lane):
+            for _ in range(calls_per_caller):
+                started = time.perf_counter()
+                try:
+                    llm.complete("benchmark prompt")
+                    outcome = "ok"
+                except LLMOverloadedError:
+                    outcome = "shed"
+                except Exception:
+                    outcome = "errors"
+                with lock:
+                    results[lane][outcome] += 1
+                    if outcome == "ok":
+                        results[lane]["latencies_ms"].append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=caller, args=(lane,)) for lane, count in lanes_and_callers for _ in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {"elapsed_seconds": round(elapsed, 2)}
+    for lane, lane_results in results.items():
+        latencies = lane_results.pop("latencies_ms")
+        report[lane] = {
+            **lane_results,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 1) if latencies else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactive-callers", type=int, default=8)
+    parser.add_argument("--batch-callers", type=int, default=16)
+    parser.add_argument("--calls-per-caller", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake LLM latency in seconds")
+    parser.add_argument("--server-concurrency", type=int, default=8, help="Fake provider quota: concurrent calls beyond this get 429")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.02, help="Fake LLM: chance of a random 429")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Scheduler token bucket, calls/second (0 = off)")
+    parser.add_argument("--max-queue-interactive", type=int, default=64)
+    parser.add_argument("--max-queue-batch", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    lanes_and_callers = [(PRIORITY_INTERACTIVE, args.interactive_callers), (PRIORITY_BATCH, args.batch_callers)]
+
+    def fake_llm():
+        return FakeLLM(latency_seconds=args.latency, jitter_seconds=args.latency / 4, server_concurrency=args.server_concurrency,
+                       rate_limit_probability=args.rate_limit_probability, seed=args.seed)
+
+    direct_llm = fake_llm()
+    direct = run_callers(direct_llm, lanes_and_callers, args.calls_per_caller)
+
+    scheduler = LLMScheduler(
+        max_in_flight=args.max_in_flight,
+        rate_limiter=TokenBucket(args.rate_limit, max(1.0, args.max_in_flight)),
+        retry_base_seconds=args.latency / 2,
+        max_queue_depth={PRIORITY_INTERACTIVE: args.max_queue_interactive, PRIORITY_BATCH: args.max_queue_batch},
+    )
+    scheduled_fake = fake_llm()
+    scheduled = run_callers(ScheduledLLM(scheduled_fake, scheduler), lanes_and_callers, args.calls_per_caller)
+
+    report = json.dumps({
+        "config": vars(args),
+        "direct": {**direct, "provider_429s": direct_llm.rate_limited},
+        "scheduled": {**scheduled, "provider_429s": scheduled_fake.rate_limited, "scheduler": scheduler.stats()},
+    }, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == '__main__':
+    main()
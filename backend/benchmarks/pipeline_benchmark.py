@@ -0,0 +1,302 @@
+"""
+Offline end-to-end benchmark of the serving pipeline, with no API keys or model downloads.
+
+USE_FAKE_MODELS swaps in the deterministic FakeLLM (fixed latency) and the hash-based
+FakeEmbedding; both domains are served from a synthetic corpus. The suite measures:
+  index:        manage_index cold build (per phase) and reload time, per domain;
+  startup:      importing app.py and time until /api/ready, in a fresh interpreter;
+  single_query: sequential /api/chat latency and the per-stage timing breakdown;
+  load:         /api/chat over HTTP at each concurrency level: throughput and p50/p95/p99.
+The JSON report is written to --output; --compare flags metrics that regressed against an
+earlier report by more than --regression-threshold.
+
+Run from backend/:
+    python -m benchmarks.pipeline_benchmark --num-docs 200 --concurrency 1 8 32
+    python -m benchmarks.pipeline_benchmark --compare benchmarks/results/baseline.json --fail-on-regression
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic_corpus import generate_corpus, sample_queries
+
+DOMAINS = {"hr": ("HR", "HR_Policy_Service"), "finance": ("FINANCE", "Financial_Docs_Service")} # domain -> (env prefix, index name)
+READY_TIMEOUT_SECONDS = 600
+
+# Runs in a fresh interpreter so module imports and model set-up are not already warm
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+while app.domain_loader.overall_state() not in ("ready", "failed") and time.perf_counter() - started < {timeout}:
+    time.sleep(0.01)
+ready = time.perf_counter() - started
+sys.stdout.write("STARTUP_RESULT " + json.dumps({{"import_seconds": imported, "ready_seconds": ready,
+                                              "state": app.domain_loader.overall_state()}}) + "\\n")
+"""
+
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    return {
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "mean": round(float(np.mean(values)), 4),
+    }
+
+
+def configure_environment(args, work_dir: str):
+    """Points both domains at a synthetic corpus and selects the fake models; must run before any backend import."""
+    os.environ["USE_FAKE_MODELS"] = "true"
+    os.environ["FAKE_LLM_LATENCY_SECONDS"] = str(args.llm_latency)
+    os.environ.setdefault("FAKE_LLM_JITTER_SECONDS", "0")
+    if not args.with_answer_cache:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0" # Every request runs the full pipeline
+    for domain, (prefix, _) in DOMAINS.items():
+        data_dir = os.path.join(work_dir, "data", domain)
+        os.environ[f"{prefix}_DATA_DIR"] = data_dir
+        os.environ[f"{prefix}_PERSIST_DIR"] = os.path.join(work_dir, "storage", f"{domain}_index")
+        generate_corpus(data_dir, args.num_docs, domain, seed=args.seed)
+
+
+def bench_index() -> Dict:
+    from chunking import build_node_parser
+    from domain_config import get_domains_config
+    from index_utils import manage_index
+    from request_context import track_request
+
+    report = {}
+    for domain, (prefix, index_name) in DOMAINS.items():
+        persist_dir, data_dir = os.environ[f"{prefix}_PERSIST_DIR"], os.environ[f"{prefix}_DATA_DIR"]
+        node_parser = build_node_parser(get_domains_config().domains[domain].chunking_config) # As the service builds it
+        with track_request() as stats:
+            started = time.perf_counter()
+            index = manage_index(index_name, persist_dir, data_dir, doc_parser_instance=None, node_parser_for_build=node_parser)
+            build_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        manage_index(index_name, persist_dir, data_dir, doc_parser_instance=None, node_parser_for_build=node_parser)
+        load_seconds = time.perf_counter() - started
+        report[domain] = {
+            "build_seconds": round(build_seconds, 4),
+            "load_seconds": round(load_seconds, 4),
+            "nodes": len(index.docstore.docs) if index is not None else 0,
+            "build_phases": {phase: timing["seconds"] for phase, timing in stats.timing_breakdown()["stages"].items()},
+        }
+    return report
+
+
+def bench_startup(runs: int) -> Dict:
+    """Import and time-to-ready of app.py with the indexes already built (a warm restart)."""
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-c", STARTUP_PROBE.format(timeout=READY_TIMEOUT_SECONDS)],
+                                   cwd=BACKEND_DIR, env=os.environ.copy(), capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith("STARTUP_RESULT ")]
+        if completed.returncode != 0 or not lines:
+            return {"error": (completed.stderr or completed.stdout)[-2000:]}
+        samples.append(json.loads(lines[-1][len("STARTUP_RESULT "):]))
+    return {
+        "runs": runs,
+        "state": samples[-1]["state"],
+        "import_seconds": percentiles([sample["import_seconds"] for sample in samples]),
+        "ready_seconds": percentiles([sample["ready_seconds"] for sample in samples]),
+    }
+
+
+def wait_until_ready(app_module):
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while app_module.domain_loader.overall_state() not in ("ready", "failed"):
+        if time.monotonic() > deadline:
+            raise TimeoutError("Domains did not finish loading")
+        time.sleep(0.05)
+    if app_module.domain_loader.overall_state() != "ready":
+        raise RuntimeError(f"Domain loading failed: {app_module.domain_loader.status()}")
+
+
+def bench_single_query(app_module, queries: List[tuple]) -> Dict:
+    client = app_module.app.test_client()
+    latencies, llm_calls, context_tokens_saved = [], [], []
+    stage_seconds: Dict[str, List[float]] = {}
+    for domain, query in queries:
+        started = time.perf_counter()
+        response = client.post("/api/chat?timings=1", json={"query": query, "domain": domain})
+        latencies.append(time.perf_counter() - started)
+        payload = response.get_json() or {}
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/chat returned {response.status_code}: {payload}")
+        llm_calls.append(payload.get("llm_calls", 0))
+        context_tokens_saved.append(payload["timings"].get("context_tokens", {}).get("saved", 0))
+        for stage, timing in payload["timings"]["stages"].items():
+            stage_seconds.setdefault(stage, []).append(timing["seconds"])
+    return {
+        "queries": len(queries),
+        "latency_seconds": percentiles(latencies),
+        "llm_calls_mean": round(float(np.mean(llm_calls)), 2),
+        "context_tokens_saved_mean": round(float(np.mean(context_tokens_saved)), 1),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stage_seconds.items())},
+    }
+
+
+def _post_chat(url: str, domain: str, query: str):
+    request = urllib.request.Request(url, data=json.dumps({"query": query, "domain": domain}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = "connection_error"
+    return status, time.perf_counter() - started
+
+
+def bench_load(app_module, concurrency_levels: List[int], queries: List[tuple]) -> Dict:
+    """Real HTTP requests against a threaded WSGI server, so request handling runs as it does in production."""
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/chat"
+    report = {}
+    try:
+        offset = 0
+        for concurrency in concurrency_levels:
+            batch = queries[offset:offset + len(queries) // len(concurrency_levels)]
+            offset += len(batch)
+            print(f"Load test: {len(batch)} request(s) at concurrency {concurrency}...", file=sys.stderr)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(lambda item: _post_chat(url, *item), batch))
+            elapsed = time.perf_counter() - started
+            ok = [latency for status, latency in outcomes if status == 200]
+            errors: Dict[str, int] = {}
+            for status, _ in outcomes:
+                if status != 200:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+            report[str(concurrency)] = {
+                "requests": len(batch),
+                "ok": len(ok),
+                "errors": errors,
+                "elapsed_seconds": round(elapsed, 3),
+                "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+                "latency_seconds": percentiles(ok),
+            }
+    finally:
+        server.shutdown()
+    return report
+
+
+def _flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def compare_reports(previous: Dict, current: Dict, threshold: float) -> Dict:
+    """
+    Relative change of every timing and throughput metric present in both reports. Seconds should
+    not grow and throughput should not shrink by more than `threshold` (0.1 = 10%).
+    """
+    before, after = _flatten(previous.get("results", {})), _flatten(current.get("results", {}))
+    changes, regressions = {}, []
+    for path in sorted(before.keys() & after.keys()):
+        lower_is_better = "seconds" in path or ".p50" in path or ".p95" in path or ".p99" in path
+        higher_is_better = "throughput" in path
+        if not (lower_is_better or higher_is_better) or before[path] <= 0:
+            continue
+        change = (after[path] - before[path]) / before[path]
+        changes[path] = round(change, 4)
+        if (change > threshold if lower_is_better else change < -threshold):
+            regressions.append(path)
+    return {"threshold": threshold, "changes": changes, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-docs", type=int, default=100, help="Synthetic documents per domain")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM latency in seconds per call")
+    parser.add_argument("--single-queries", type=int, default=20, help="Sequential queries for the per-stage breakdown")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-level", type=int, default=64)
+    parser.add_argument("--startup-runs", type=int, default=3)
+    parser.add_argument("--with-answer-cache", action="store_true", help="Keep the answer cache on (off by default so every request runs the pipeline)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Corpus and index directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.1)
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if --compare finds regressions")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    try:
+        configure_environment(args, work_dir)
+        print(f"Benchmarking on {args.num_docs} synthetic document(s) per domain in {work_dir}", file=sys.stderr)
+
+        results = {"index": bench_index(), "startup": bench_startup(args.startup_runs)}
+
+        import app as app_module
+        for logger_name in ("", "werkzeug"): # Per-request INFO logging would dominate the load test
+            logging.getLogger(logger_name).setLevel(logging.WARNING)
+        wait_until_ready(app_module)
+
+        total_load = args.requests_per_level * len(args.concurrency)
+        per_domain = (args.single_queries + total_load + 1) // 2 + 1
+        queries = [item for pair in zip(*[[(domain, q) for q in sample_queries(domain, per_domain, args.seed)] for domain in DOMAINS]) for item in pair]
+        results["single_query"] = bench_single_query(app_module, queries[:args.single_queries])
+        results["load"] = bench_load(app_module, args.concurrency, queries[args.single_queries:args.single_queries + total_load])
+        results["llm_scheduler"] = app_module.get_default_scheduler().stats()
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            report["comparison"] = compare_reports(json.load(f), report, args.regression_threshold)
+
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Report written to {output}", file=sys.stderr)
+    if args.fail_on_regression and report.get("comparison", {}).get("regressions"):
+        print(f"Regressions: {report['comparison']['regressions']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Generates a deterministic synthetic HR or finance corpus: N markdown documents built from
+domain templates, plus matching sample questions, for offline index and serving benchmarks.
+The "reports" domain writes annual reports shaped like LlamaParse output (headings, lists and
+financial statement tables), with questions whose answers are single table cells.
+
+Run from backend/:
+    python -m benchmarks.synthetic_corpus /tmp/corpus/hr --domain hr --num-docs 200
+"""
+import os
+import sys
+import random
+import argparse
+from typing import Dict, List, Tuple
+
+HR_TOPICS = ["earned leave", "sick leave", "maternity leave", "leave travel concession", "medical reimbursement",
+             "travel allowance", "house rent allowance", "gratuity", "provident fund", "promotion policy",
+             "grievance redressal", "transfer policy", "onboarding", "performance appraisal", "retirement benefits"]
+HR_GRADES = ["Group A officers", "Group B officers", "supervisory staff", "contractual employees", "trainees", "senior management"]
+HR_SENTENCES = [
+    "Under the {topic} rules, {grade} are entitled to {days} days per calendar year.",
+    "Applications for {topic} must be submitted on Form {form} at least {notice} days in advance.",
+    "The {topic} policy was revised with effect from {date} following approval by the Board.",
+    "{grade} may carry forward up to {days} days of unused {topic} to the next year.",
+    "Claims under {topic} are settled within {notice} working days of receipt of complete documents.",
+    "The competent authority for sanctioning {topic} for {grade} is the {authority}.",
+]
+FINANCE_TOPICS = ["revenue from operations", "net profit", "finance costs", "lease receivables", "borrowings",
+                  "debt-equity ratio", "interest coverage", "dividend", "capital adequacy", "market borrowings",
+                  "rolling stock leasing", "project assets", "foreign currency loans", "bond issuances"]
+FINANCE_PERIODS = ["FY 2019-20", "FY 2020-21", "FY 2021-22", "FY 2022-23", "FY 2023-24", "Q1 FY 2024-25", "Q2 FY 2024-25"]
+FINANCE_SENTENCES = [
+    "During {period}, {topic} stood at ₹{amount} crore compared to ₹{previous} crore in the previous year.",
+    "The change in {topic} in {period} was primarily driven by {driver}.",
+    "As of {date}, the company reported {topic} of ₹{amount} crore.",
+    "The Board reviewed {topic} for {period} and noted a {percent}% movement year on year.",
+    "{topic} for {period} includes ₹{previous} crore attributable to {driver}.",
+]
+FINANCE_DRIVERS = ["higher lease income", "lower interest rates", "new rolling stock assets", "refinancing of legacy loans",
+                   "exchange rate movements", "increased market borrowings"]
+AUTHORITIES = ["Chief Personnel Officer", "Managing Director", "Head of Department", "General Manager (HR)"]
+REPORT_ENTITIES = ["Rolling Stock Leasing Unit", "Project Finance Division", "Treasury Operations Unit", "Infrastructure Lending Division",
+                   "Asset Monetisation Cell", "Bond Issuance Desk", "Regional Leasing Office", "Capital Markets Division"]
+REPORT_PERIODS = ["FY 2019-20", "FY 2020-21", "FY 2021-22", "FY 2022-23", "FY 2023-24"]
+REPORT_STATEMENTS = {
+    "Statement of Profit and Loss": ["Revenue from operations", "Lease income", "Interest income on loans", "Other income", "Total income",
+                                     "Finance costs", "Employee benefits expense", "Depreciation and amortisation", "Impairment on financial instruments",
+                                     "Other expenses", "Total expenses", "Profit before tax", "Current tax", "Deferred tax", "Profit for the year",
+                                     "Other comprehensive income", "Total comprehensive income"],
+    "Balance Sheet": ["Property, plant and equipment", "Capital work-in-progress", "Lease receivables", "Loans to project entities",
+                      "Investments", "Cash and cash equivalents", "Bank balances other than cash", "Other financial assets", "Total assets",
+                      "Equity share capital", "Other equity", "Non-current borrowings", "Current borrowings", "Lease liabilities",
+                      "Other financial liabilities", "Total equity and liabilities"],
+    "Cash Flow Statement": ["Net cash from operating activities", "Net cash used in investing activities", "Net cash from financing activities",
+                            "Proceeds from market borrowings", "Repayment of borrowings", "Dividend paid", "Net increase in cash and cash equivalents",
+                            "Cash and cash equivalents at the beginning of the year", "Cash and cash equivalents at the end of the year"],
+}
+
+
+def _fill(template: str, rng: random.Random, topic: str) -> str:
+    return template.format(
+        topic=topic, grade=rng.choice(HR_GRADES), days=rng.randint(5, 300), form=f"HR-{rng.randint(1, 40):02d}",
+        notice=rng.randint(3, 45), date=f"{rng.randint(1, 28)} {rng.choice(['January', 'April', 'July', 'October'])} {rng.randint(2015, 2024)}",
+        authority=rng.choice(AUTHORITIES), period=rng.choice(FINANCE_PERIODS), amount=f"{rng.randint(100, 99999):,}",
+        previous=f"{rng.randint(100, 99999):,}", driver=rng.choice(FINANCE_DRIVERS), percent=rng.randint(1, 40),
+    )
+
+
+def generate_document(domain: str, doc_index: int, rng: random.Random, paragraphs: int = 6, sentences_per_paragraph: int = 5) -> str:
+    topics, sentences = (HR_TOPICS, HR_SENTENCES) if domain == "hr" else (FINANCE_TOPICS, FINANCE_SENTENCES)
+    title_topic = topics[doc_index % len(topics)]
+    lines = [f"# {title_topic.title()} - Document {doc_index:05d}", ""]
+    for paragraph in range(paragraphs):
+        topic = title_topic if paragraph == 0 else rng.choice(topics)
+        lines.append(f"## {topic.title()}")
+        lines.append(" ".join(_fill(rng.choice(sentences), rng, topic) for _ in range(sentences_per_paragraph)))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_corpus(out_dir: str, num_docs: int, domain: str = "hr", seed: int = 0, paragraphs: int = 6) -> List[str]:
+    """Writes num_docs markdown files to out_dir (same seed, same bytes) and returns their paths."""
+    if domain not in ("hr", "finance"):
+        raise ValueError(f"Unknown domain: {domain}")
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(f"{domain}-{seed}")
+    paths = []
+    for doc_index in range(num_docs):
+        path = os.path.join(out_dir, f"{domain}_{doc_index:05d}.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generate_document(domain, doc_index, rng, paragraphs=paragraphs))
+        paths.append(path)
+    return paths
+
+
+def generate_report_document(doc_index: int, rng: random.Random) -> Tuple[str, str, List[Dict[str, str]]]:
+    """(entity, markdown, table cells) for one annual report; a cell is {statement, row, period, value}."""
+    entity = f"{REPORT_ENTITIES[doc_index % len(REPORT_ENTITIES)]} {doc_index:04d}"
+    lines = [f"# Annual Report of the {entity}", "",
+             " ".join(_fill(rng.choice(FINANCE_SENTENCES), rng, rng.choice(FINANCE_TOPICS)) for _ in range(4)), "",
+             "## Highlights of the Year", ""]
+    lines += [f"- {_fill(rng.choice(FINANCE_SENTENCES), rng, rng.choice(FINANCE_TOPICS))}" for _ in range(5)]
+    lines += ["", "## Financial Statements", ""]
+    cells = []
+    for statement, rows in REPORT_STATEMENTS.items():
+        lines += [f"### {statement} (₹ crore)", "", "| Particulars | " + " | ".join(REPORT_PERIODS) + " |",
+                  "|---|" + "---:|" * len(REPORT_PERIODS)]
+        for row in rows:
+            values = [f"{rng.randint(10, 99999):,}.{rng.randint(0, 99):02d}" for _ in REPORT_PERIODS]
+            lines.append(f"| {row} | " + " | ".join(values) + " |")
+            cells += [{"statement": statement, "row": row, "period": period, "value": value} for period, value in zip(REPORT_PERIODS, values)]
+        lines.append("")
+    lines += ["## Management Discussion and Analysis", ""]
+    for _ in range(3):
+        lines += [" ".join(_fill(rng.choice(FINANCE_SENTENCES), rng, rng.choice(FINANCE_TOPICS)) for _ in range(6)), ""]
+    return entity, "\n".join(lines), cells
+
+
+def generate_report_corpus(out_dir: str, num_docs: int, seed: int = 0, questions_per_doc: int = 3) -> List[Dict[str, str]]:
+    """
+    Writes num_docs annual reports to out_dir and returns questions about them: {query, file_name,
+    row, value}. A chunk answers a question when it holds the whole table row with that value.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(f"reports-{seed}")
+    questions = []
+    for doc_index in range(num_docs):
+        entity, text, cells = generate_report_document(doc_index, rng)
+        file_name = f"report_{doc_index:05d}.md"
+        with open(os.path.join(out_dir, file_name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        for cell in rng.sample(cells, min(questions_per_doc, len(cells))):
+            questions.append({
+                "query": f"What was the {cell['row'].lower()} of the {entity} in {cell['period']} as per its {cell['statement'].lower()}?",
+                "file_name": file_name, "row": cell["row"], "value": cell["value"],
+            })
+    return questions
+
+
+def sample_queries(domain: str, count: int, seed: int = 0) -> List[str]:
+    """Distinct natural-language questions about the generated corpus."""
+    rng = random.Random(f"{domain}-queries-{seed}")
+    if domain == "hr":
+        templates = ["How many days of {topic} are {grade} entitled to?", "What is the procedure to apply for {topic}?",
+                     "Who sanctions {topic} for {grade}?", "When was the {topic} policy last revised?"]
+        pick = lambda template: template.format(topic=rng.choice(HR_TOPICS), grade=rng.choice(HR_GRADES))
+    else:
+        templates = ["What was the {topic} in {period}?", "Why did {topic} change in {period}?",
+                     "How did {topic} compare with the previous year in {period}?"]
+        pick = lambda template: template.format(topic=rng.choice(FINANCE_TOPICS), period=rng.choice(FINANCE_PERIODS))
+    queries, seen = [], set()
+    for attempt in range(count * 20):
+        query = pick(rng.choice(templates))
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+        if len(queries) == count:
+            break
+    while len(queries) < count: # Template space exhausted: number the repeats so they stay distinct
+        queries.append(f"{queries[len(queries) % len(seen)]} (case {len(queries)})")
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--domain", choices=["hr", "finance", "reports"], default="hr")
+    parser.add_argument("--num-docs", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=6, help="Paragraphs per document")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.domain == "reports":
+        generate_report_corpus(args.out_dir, args.num_docs, args.seed)
+        print(f"Wrote {args.num_docs} report(s) to {args.out_dir}", file=sys.stderr)
+        return
+    paths = generate_corpus(args.out_dir, args.num_docs, args.domain, args.seed, args.paragraphs)
+    print(f"Wrote {len(paths)} {args.domain} document(s) to {args.out_dir}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
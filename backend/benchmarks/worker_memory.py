@@ -0,0 +1,221 @@
+"""
+Memory of the gunicorn server (gunicorn.conf.py / wsgi.py) per process, against the single-process baseline.
+
+Each scenario starts gunicorn, waits for /api/ready, sends --requests chat queries so the workers touch
+their indexes as in service, and reads /proc/<pid>/smaps_rollup of the parent and every worker:
+  rss: resident pages, shared ones included (summing RSS over workers counts shared pages once per worker);
+  pss: RSS with each shared page divided among the processes mapping it (sums to the real total);
+  uss: pages only this process maps (what stopping it would free).
+Scenarios: "baseline" (one worker, no preloading: the single-process server), then for each --workers N,
+"preload" (models and indexes loaded once in the parent, shared copy-on-write) and, with --no-preload,
+"no_preload" (every worker loads its own copy). Linux only.
+
+By default both domains serve a synthetic corpus with the fake models, which measures the mechanism
+but not the real models' footprint. For the figures that matter, run with --real from a configured
+environment (real data directories, API keys and the embedding model available):
+    python -m benchmarks.worker_memory --workers 2 4
+    python -m benchmarks.worker_memory --real --workers 4 --no-preload
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.pipeline_benchmark import DOMAINS, READY_TIMEOUT_SECONDS, configure_environment
+from benchmarks.synthetic_corpus import sample_queries
+
+SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private_clean", "Private_Dirty": "private_dirty"}
+
+
+def read_smaps_rollup(pid: int) -> Optional[Dict[str, float]]:
+    """rss/pss/uss of a process in MB, or None if it exited."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    values[SMAPS_FIELDS[key]] = int(rest.split()[0]) / 1024 # kB -> MB
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss_mb": round(values.get("rss", 0.0), 1),
+        "pss_mb": round(values.get("pss", 0.0), 1),
+        "uss_mb": round(values.get("private_clean", 0.0) + values.get("private_dirty", 0.0), 1),
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid: # fields[0] is the state, fields[1] the parent pid
+            children.append(int(entry))
+    return sorted(children)
+
+
+def build_indexes():
+    """Builds and persists the preloaded domains' indexes first, so no scenario pays for ingestion."""
+    probe = "import app; print('state:', app.domain_loader.wait_for_preload())"
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND_DIR, env=os.environ.copy(), capture_output=True, text=True)
+    if completed.returncode != 0 or "state: ready" not in completed.stdout:
+        raise RuntimeError(f"Index build failed: {(completed.stderr or completed.stdout)[-2000:]}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return None
+
+
+def _post_chat(url: str, domain: str, query: str) -> Optional[int]:
+    request = urllib.request.Request(url, data=json.dumps({"query": query, "domain": domain}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return None
+
+
+def measure_scenario(name: str, workers: int, preload: bool, threads: int, requests: int, domains: List[str], seed: int, log_dir: str) -> Dict:
+    port = free_port()
+    env = {**os.environ, "WEB_WORKERS": str(workers), "WEB_PRELOAD": str(preload).lower(),
+           "WEB_THREADS": str(threads), "PORT": str(port)}
+    log_path = os.path.join(log_dir, f"gunicorn-{name}.log")
+    base_url = f"http://127.0.0.1:{port}"
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+                                  cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            started = time.monotonic()
+            # Without preloading each worker loads on its own: wait until every one of them answers ready
+            ready_streak = 0
+            while ready_streak < 4 * workers:
+                if server.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited with {server.returncode}; see {log_path}")
+                if time.monotonic() - started > READY_TIMEOUT_SECONDS:
+                    raise TimeoutError(f"Server did not become ready; see {log_path}")
+                ready_streak = ready_streak + 1 if _get(f"{base_url}/api/ready") == 200 else 0
+                time.sleep(0.05)
+            ready_seconds = time.monotonic() - started
+            statuses = []
+            for i in range(requests):
+                domain = domains[i % len(domains)]
+                query = sample_queries(domain, requests, seed)[i]
+                statuses.append(_post_chat(f"{base_url}/api/chat", domain, query))
+            time.sleep(1.0) # Let background work (caches, compaction) settle
+            processes = [{"role": "parent", "pid": server.pid, **(read_smaps_rollup(server.pid) or {})}]
+            processes += [{"role": "worker", "pid": pid, **(read_smaps_rollup(pid) or {})} for pid in child_pids(server.pid)]
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    worker_rows = [p for p in processes if p["role"] == "worker" and "rss_mb" in p]
+    return {
+        "scenario": name,
+        "workers": workers,
+        "preload": preload,
+        "ready_seconds": round(ready_seconds, 2),
+        "requests_ok": sum(1 for status in statuses if status == 200),
+        "requests": requests,
+        "processes": processes,
+        "worker_rss_mb": round(sum(p["rss_mb"] for p in worker_rows) / max(1, len(worker_rows)), 1),
+        "worker_uss_mb": round(sum(p["uss_mb"] for p in worker_rows) / max(1, len(worker_rows)), 1),
+        "total_pss_mb": round(sum(p.get("pss_mb", 0.0) for p in processes), 1),
+    }
+
+
+def print_table(results: List[Dict], baseline_pss: float):
+    print(f"{'scenario':<16}{'workers':>8}{'worker RSS':>12}{'worker USS':>12}{'total PSS':>12}{'vs baseline':>13}")
+    for result in results:
+        ratio = result["total_pss_mb"] / baseline_pss if baseline_pss else 0.0
+        print(f"{result['scenario']:<16}{result['workers']:>8}{result['worker_rss_mb']:>10.1f}MB{result['worker_uss_mb']:>10.1f}MB"
+              f"{result['total_pss_mb']:>10.1f}MB{ratio:>12.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="Worker counts to measure")
+    parser.add_argument("--threads", type=int, default=4, help="WEB_THREADS per worker")
+    parser.add_argument("--no-preload", action="store_true", help="Also measure N workers that each load their own copy")
+    parser.add_argument("--requests", type=int, default=20, help="Chat queries sent before measuring")
+    parser.add_argument("--real", action="store_true", help="Use the configured domains and models instead of the fake ones")
+    parser.add_argument("--num-docs", type=int, default=200, help="Synthetic documents per domain (fake mode)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM latency in seconds per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Corpus, index and log directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/worker-memory-<timestamp>.json)")
+    args = parser.parse_args()
+    args.with_answer_cache = False # Every warm-up request runs the pipeline
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-worker-memory-")
+    scenarios = [("baseline", 1, False)]
+    for workers in args.workers:
+        scenarios.append((f"preload-{workers}", workers, True))
+        if args.no_preload:
+            scenarios.append((f"no_preload-{workers}", workers, False))
+    try:
+        if not args.real:
+            configure_environment(args, work_dir)
+        os.environ.setdefault("SESSION_DB_PATH", os.path.join(work_dir, "sessions.sqlite3"))
+        print("Building indexes ...", file=sys.stderr)
+        build_indexes()
+        results = []
+        for name, workers, preload in scenarios:
+            print(f"Measuring {name} ...", file=sys.stderr)
+            results.append(measure_scenario(name, workers, preload, args.threads, args.requests, list(DOMAINS), args.seed, work_dir))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                        "models": "configured" if args.real else "fake"},
+        "results": results,
+    }
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"worker-memory-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(results, results[0]["total_pss_mb"])
+    print(f"Report written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import Stemmer # PyStemmer, installed with llama-index-retrievers-bm25
+from bm25s.stopwords import STOPWORDS_EN
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+
+BM25_DIRNAME = "bm25"
+BM25_FORMAT_VERSION = 1
+# Same tokenization and scoring defaults as BM25Retriever (bm25s "lucene" variant)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+BM25_STEMMER_LANGUAGE = "english"
+BM25_COMPACT_DEAD_FRACTION = 0.2 # Rewrite postings on persist once this share of documents is deleted
+
+_STOPWORDS = frozenset(STOPWORDS_EN)
+
+
+class BM25Tokenizer:
+    """Tokenizes like BM25Retriever. Callable from any thread: each thread gets its own stemmer, which is not thread-safe."""
+    def __init__(self, stemmer_language: Optional[str] = BM25_STEMMER_LANGUAGE):
+        self.stemmer_language = stemmer_language
+        self._local = threading.local()
+
+    def _stemmer(self):
+        stemmer = getattr(self._local, 'stemmer', None)
+        if stemmer is None:
+            stemmer = self._local.stemmer = Stemmer.Stemmer(self.stemmer_language)
+        return stemmer
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = [token for token in BM25_TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+        if self.stemmer_language:
+            tokens = self._stemmer().stemWords(tokens)
+        return tokens
+
+
+class SparseBM25Index:
+    """
+    Persistent, incrementally updatable BM25 index over node IDs (the text itself stays in the docstore).
+
+    Postings are stored term-major in three flat arrays (CSC layout): term_ptr[t]:term_ptr[t+1] slices
+    post_docs/post_tfs for term t. A query touches only the postings of its own terms and scores them
+    with vectorized NumPy, so latency tracks the query's posting lengths rather than the corpus size.
+    Deleted documents are tombstoned and dropped from the postings on compaction.
+    Updates replace the arrays rather than writing into them, so a query scores a snapshot taken under
+    the lock and concurrent queries do not serialize on it.
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, stemmer_language: Optional[str] = BM25_STEMMER_LANGUAGE):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = BM25Tokenizer(stemmer_language)
+        self.node_ids: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.float32)
+        self._id_to_doc: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._alive_count = 0
+        self._alive_length = 0.0 # Summed length of the live documents
+
+    # --- Stats ---
+    @property
+    def num_docs(self) -> int:
+        return self._alive_count
+
+    @property
+    def num_dead(self) -> int:
+        return len(self.node_ids) - self.num_docs
+
+    def _avg_doc_length(self) -> float:
+        return self._alive_length / self._alive_count if self._alive_count else 0.0
+
+    def _refresh_stats(self):
+        """Recounts the live documents after an update, so queries never scan the whole corpus for them."""
+        alive = np.asarray(self.alive)
+        self._alive_count = int(alive.sum())
+        self._alive_length = float(np.asarray(self.doc_lengths)[alive].sum())
+
+    # --- Updates ---
+    def add_nodes(self, nodes: Iterable[BaseNode]):
+        """Adds (or replaces) nodes. Tokenization happens once here, never at startup."""
+        nodes = list(nodes)
+        if not nodes:
+            return
+        with self._lock:
+            self.remove_node_ids([node.node_id for node in nodes if node.node_id in self._id_to_doc])
+
+            new_terms: List[int] = []
+            new_docs: List[int] = []
+            new_tfs: List[float] = []
+            new_lengths: List[float] = []
+            first_doc = len(self.node_ids)
+            for offset, node in enumerate(nodes):
+                tokens = self.tokenizer(node.get_content(metadata_mode=MetadataMode.EMBED))
+                doc_index = first_doc + offset
+                self.node_ids.append(node.node_id)
+                self._id_to_doc[node.node_id] = doc_index
+                new_lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = len(self.vocab)
+                        self.vocab[term] = term_id
+                    new_terms.append(term_id)
+                    new_docs.append(doc_index)
+                    new_tfs.append(tf)
+
+            self.doc_lengths = np.concatenate([self.doc_lengths, np.asarray(new_lengths, dtype=np.float32)])
+            self.alive = np.concatenate([self.alive, np.ones(len(nodes), dtype=bool)])
+            self._merge_postings(
+                np.asarray(new_terms, dtype=np.int64),
+                np.asarray(new_docs, dtype=np.int32),
+                np.asarray(new_tfs, dtype=np.float32),
+            )
+            self._refresh_stats()
+
+    def _posting_terms(self) -> np.ndarray:
+        """Expands term_ptr back into a per-posting term id array."""
+        return np.repeat(np.arange(len(self.term_ptr) - 1, dtype=np.int64), np.diff(self.term_ptr))
+
+    def _merge_postings(self, terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        all_terms = np.concatenate([self._posting_terms(), terms])
+        all_docs = np.concatenate([np.asarray(self.post_docs), docs])
+        all_tfs = np.concatenate([np.asarray(self.post_tfs), tfs])
+        order = np.argsort(all_terms, kind="stable")
+        self._set_postings(all_terms[order], all_docs[order], all_tfs[order])
+
+    def _set_postings(self, sorted_terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        counts = np.bincount(sorted_terms, minlength=len(self.vocab)) if len(sorted_terms) else np.zeros(len(self.vocab), dtype=np.int64)
+        self.term_ptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.post_docs = docs.astype(np.int32)
+        self.post_tfs = tfs.astype(np.float32)
+
+    def remove_node_ids(self, node_ids: Iterable[str]) -> int:
+        """Tombstones nodes; their postings are physically dropped by compact()."""
+        removed = 0
+        with self._lock:
+            alive = None # Copied on the first removal: queries may be scoring the current array
+            for node_id in node_ids:
+                doc_index = self._id_to_doc.pop(node_id, None)
+                if doc_index is not None and self.alive[doc_index]:
+                    if alive is None:
+                        alive = np.array(self.alive)
+                    alive[doc_index] = False
+                    removed += 1
+            if alive is not None:
+                self.alive = alive
+                self._refresh_stats()
+        return removed
+
+    def compact(self):
+        """Drops tombstoned documents and unused terms, renumbering the survivors."""
+        with self._lock:
+            if self.num_dead == 0:
+                return
+            keep = np.flatnonzero(self.alive)
+            new_doc_index = np.full(len(self.node_ids), -1, dtype=np.int64)
+            new_doc_index[keep] = np.arange(len(keep))
+
+            terms = self._posting_terms()
+            live_postings = self.alive[np.asarray(self.post_docs)]
+            terms = terms[live_postings]
+            docs = new_doc_index[np.asarray(self.post_docs)[live_postings]].astype(np.int32)
+            tfs = np.asarray(self.post_tfs)[live_postings]
+
+            used_terms = np.unique(terms)
+            new_term_index = np.full(len(self.vocab), -1, dtype=np.int64)
+            new_term_index[used_terms] = np.arange(len(used_terms))
+            id_to_term = self._terms_by_id()
+            self.vocab = {id_to_term[old_id]: new_id for new_id, old_id in enumerate(used_terms.tolist())}
+
+            self.node_ids = [self.node_ids[i] for i in keep.tolist()]
+            self._id_to_doc = {node_id: i for i, node_id in enumerate(self.node_ids)}
+            self.doc_lengths = np.asarray(self.doc_lengths)[keep]
+            self.alive = np.ones(len(keep), dtype=bool)
+            self._set_postings(new_term_index[terms], docs, tfs) # Relabelling keeps postings term-sorted
+            self._refresh_stats()
+
+    def _terms_by_id(self) -> List[str]:
+        id_to_term = [""] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            id_to_term[term_id] = term
+        return id_to_term
+
+    # --- Query ---
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Returns up to top_k (node_id, score) pairs, best first."""
+        tokens = self.tokenizer(query)
+        with self._lock:
+            term_ids = {self.vocab[token] for token in tokens if token in self.vocab}
+            alive_count = self.num_docs
+            avg_doc_length = self._avg_doc_length() or 1.0
+            term_ptr, post_docs, post_tfs = self.term_ptr, self.post_docs, self.post_tfs
+            alive, doc_lengths, node_ids = self.alive, self.doc_lengths, self.node_ids
+        if not term_ids or alive_count == 0:
+            return []
+
+        # Each term's contribution to the live documents in its postings (unique within a term)
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            start, end = term_ptr[term_id], term_ptr[term_id + 1]
+            docs = np.asarray(post_docs[start:end])
+            live = alive[docs]
+            if not live.any():
+                continue
+            docs = docs[live]
+            tfs = np.asarray(post_tfs[start:end])[live]
+            doc_freq = len(docs)
+            idf = np.log(1.0 + (alive_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[docs] / avg_doc_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not doc_parts:
+            return []
+        # Summed per document over the union of the postings touched, never over the whole corpus
+        candidates, positions = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(score_parts), minlength=len(candidates)).astype(np.float32)
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(node_ids[candidates[i]], float(scores[i])) for i in ranked.tolist()]
+
+    # --- Persistence ---
+    def persist(self, persist_dir: str):
+        """Writes the index to persist_dir/bm25, compacting first if many documents were deleted."""
+        with self._lock:
+            if self.node_ids and self.num_dead / len(self.node_ids) > BM25_COMPACT_DEAD_FRACTION:
+                self.compact()
+            bm25_dir = os.path.join(persist_dir, BM25_DIRNAME)
+            os.makedirs(bm25_dir, exist_ok=True)
+            for name in ("doc_lengths", "alive", "term_ptr", "post_docs", "post_tfs"):
+                # Write-then-rename: the current files may be memory-mapped by this or another process
+                tmp_path = os.path.join(bm25_dir, f"{name}.tmp.npy")
+                np.save(tmp_path, np.asarray(getattr(self, name)))
+                os.replace(tmp_path, os.path.join(bm25_dir, f"{name}.npy"))
+            meta = {
+                "version": BM25_FORMAT_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "stemmer_language": self.tokenizer.stemmer_language,
+                "node_ids": self.node_ids,
+                "terms": self._terms_by_id(),
+            }
+            tmp_path = os.path.join(bm25_dir, "meta.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(bm25_dir, "meta.json"))
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, BM25_DIRNAME, "meta.json"))
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "SparseBM25Index":
+        """Loads a persisted index; the posting arrays are memory-mapped rather than read up front."""
+        bm25_dir = os.path.join(persist_dir, BM25_DIRNAME)
+        with open(os.path.join(bm25_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != BM25_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format version: {meta.get('version')}")
+        index = cls(k1=meta["k1"], b=meta["b"], stemmer_language=meta["stemmer_language"])
+        index.node_ids = meta["node_ids"]
+        index.vocab = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        for name in ("doc_lengths", "alive", "term_ptr", "post_docs", "post_tfs"):
+            setattr(index, name, np.load(os.path.join(bm25_dir, f"{name}.npy"), mmap_mode="r"))
+        index.alive = np.array(index.alive) # Small; read on every query
+        index._id_to_doc = {node_id: i for i, node_id in enumerate(index.node_ids) if index.alive[i]}
+        index._refresh_stats()
+        return index
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[BaseNode], **kwargs) -> "SparseBM25Index":
+        index = cls(**kwargs)
+        index.add_nodes(nodes)
+        return index
+
+
+def _docstore_node_count(docstore) -> int:
+    """Nodes in a docstore, counted from its key-value store keys without deserializing any node."""
+    kvstore = getattr(docstore, '_kvstore', None)
+    collection = getattr(docstore, '_node_collection', None)
+    if kvstore is not None and collection:
+        return len(kvstore.get_all(collection=collection)) # Raw JSON dicts; docstore.docs would build every node
+    return len(docstore.docs)
+
+
+def load_or_build_bm25_index(persist_dir: str, docstore) -> SparseBM25Index:
+    """
+    Loads the persisted BM25 index for a vector index, or (first run / stale / corrupt) builds it
+    once from the docstore and persists it so later startups only load. The staleness check counts
+    docstore keys; nodes are only read from the docstore when rebuilding.
+    """
+    docstore_count = _docstore_node_count(docstore)
+    if SparseBM25Index.exists(persist_dir):
+        try:
+            bm25_index = SparseBM25Index.load(persist_dir)
+            if bm25_index.num_docs == docstore_count:
+                print(f"Loaded persisted BM25 index ({bm25_index.num_docs} nodes, {len(bm25_index.vocab)} terms) from {persist_dir}.")
+                return bm25_index
+            print(f"Persisted BM25 index has {bm25_index.num_docs} nodes but docstore has {docstore_count}. Rebuilding.")
+        except Exception as e:
+            print(f"Error loading BM25 index from {persist_dir}: {e}. Rebuilding.")
+    print(f"Building BM25 index from {docstore_count} docstore nodes for {persist_dir}...")
+    bm25_index = SparseBM25Index.from_nodes(docstore.docs.values())
+    bm25_index.persist(persist_dir)
+    return bm25_index
+
+
+class SparseBM25Retriever(BaseRetriever):
+    """Retriever over a SparseBM25Index that resolves node IDs through the index's docstore."""
+    def __init__(self, bm25_index: SparseBM25Index, docstore, similarity_top_k: int, **kwargs):
+        super().__init__(**kwargs)
+        self._bm25_index = bm25_index
+        self._docstore = docstore
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        results = self._bm25_index.search(query_bundle.query_str, self.similarity_top_k)
+        nodes_with_scores = []
+        for node_id, score in results:
+            node = self._docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                nodes_with_scores.append(NodeWithScore(node=node, score=score))
+        return nodes_with_scores
@@ -0,0 +1,300 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import PrivateAttr
+from llama_index.core.node_parser import NodeParser, SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.utils import get_tokenizer, get_tqdm_iterable
+
+# --- Chunking Configuration ---
+# "sentence" is LlamaIndex's SentenceSplitter, blind to document structure. "markdown" reads the markdown
+# LlamaParse produces: chunks end at headings rather than mid-section, tables are cut only between rows
+# (repeating their header), lists only between items, and every chunk carries the path of headings above
+# it as section_path metadata. Structure replaces most of the overlap, so only text that has to be split
+# mid-paragraph overlaps. A domain selects its strategy with "chunking" in domains.json; changing it
+# re-chunks the index on its next build (see manage_index).
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "sentence") # Default for domains without a "chunking" entry
+SENTENCE_CHUNK_SIZE = 768
+SENTENCE_CHUNK_OVERLAP = 250
+MARKDOWN_CHUNK_SIZE = 768
+MARKDOWN_CHUNK_OVERLAP = 32 # Only between the pieces of a paragraph too long for one chunk
+SECTION_PATH_RESERVE_TOKENS = 32 # Chunk budget left for the section_path metadata
+SECTION_PATH_SEPARATOR = " > "
+
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM_RE = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+BLOCK_HEADING = "heading"
+BLOCK_TABLE = "table"
+BLOCK_LIST = "list"
+BLOCK_CODE = "code"
+BLOCK_PARAGRAPH = "paragraph"
+
+
+class _Block:
+    """A run of markdown lines of one kind, as a [start, end) character span of the document."""
+    __slots__ = ("kind", "start", "end", "lines", "level", "path", "tokens")
+
+    def __init__(self, kind: str, start: int, end: int, lines: List[str], level: int = 0):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.lines = lines
+        self.level = level
+        self.path: Tuple[str, ...] = ()
+        self.tokens = 0
+
+
+def _is_table_line(line: str) -> bool:
+    return line.lstrip().startswith("|")
+
+
+def _starts_block(line: str) -> bool:
+    """Whether a line (without its line ending) opens a heading, table, list item or code fence."""
+    return bool(_HEADING_RE.match(line) or _is_table_line(line) or _LIST_ITEM_RE.match(line) or _FENCE_RE.match(line))
+
+
+def parse_markdown_blocks(text: str) -> List[_Block]:
+    """Splits markdown into heading, table, list, code and paragraph blocks, tagged with their heading path."""
+    lines = text.splitlines(keepends=True)
+    offsets = []
+    position = 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line)
+    offsets.append(position)
+
+    blocks: List[_Block] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip("\r\n")
+        if not line.strip():
+            i += 1
+            continue
+        start = i
+        heading = _HEADING_RE.match(line)
+        if heading:
+            i += 1
+            block = _Block(BLOCK_HEADING, offsets[start], offsets[i], [heading.group(2)], level=len(heading.group(1)))
+        elif _FENCE_RE.match(line):
+            fence = _FENCE_RE.match(line).group(1)
+            i += 1
+            while i < len(lines) and not lines[i].lstrip().startswith(fence):
+                i += 1
+            i = min(i + 1, len(lines)) # The closing fence
+            block = _Block(BLOCK_CODE, offsets[start], offsets[i], [])
+        elif _is_table_line(line):
+            while i < len(lines) and _is_table_line(lines[i]):
+                i += 1
+            block = _Block(BLOCK_TABLE, offsets[start], offsets[i], [lines[j].rstrip("\r\n") for j in range(start, i)])
+        elif _LIST_ITEM_RE.match(line):
+            base_indent = len(_LIST_ITEM_RE.match(line).group(1))
+            items = [] # Top-level items, each with its continuation and nested lines
+            while i < len(lines):
+                current = lines[i].rstrip("\r\n")
+                item = _LIST_ITEM_RE.match(current)
+                if item and len(item.group(1)) <= base_indent:
+                    items.append([current])
+                elif current.strip() and (current[:1].isspace() or not _starts_block(current)):
+                    if not lines[i - 1].strip() and not current[:1].isspace():
+                        break # An unindented line after a blank line starts a paragraph
+                    items[-1].append(current)
+                elif not current.strip() and i + 1 < len(lines) and (lines[i + 1][:1].isspace() or _LIST_ITEM_RE.match(lines[i + 1].rstrip("\r\n"))):
+                    items[-1].append("") # A blank line inside the list
+                else:
+                    break
+                i += 1
+            block = _Block(BLOCK_LIST, offsets[start], offsets[i], ["\n".join(item).rstrip() for item in items])
+        else:
+            # The first line is taken even if it looks like a marker ("-", "#"): it matched no block above
+            i += 1
+            while i < len(lines) and lines[i].strip() and not _starts_block(lines[i].rstrip("\r\n")):
+                i += 1
+            block = _Block(BLOCK_PARAGRAPH, offsets[start], offsets[i], [])
+        blocks.append(block)
+
+    headings: List[Tuple[int, str]] = [] # (level, title) of the headings above the current block
+    for block in blocks:
+        if block.kind == BLOCK_HEADING:
+            while headings and headings[-1][0] >= block.level:
+                headings.pop()
+            headings.append((block.level, block.lines[0]))
+        block.path = tuple(title for _, title in headings)
+    return blocks
+
+
+def _common_path(paths: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+    common = paths[0]
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(common), len(path)) and common[length] == path[length]:
+            length += 1
+        common = common[:length]
+    return common
+
+
+class MarkdownStructureParser(NodeParser):
+    """
+    Chunks markdown along its structure. Sections are kept whole when they fit in chunk_size tokens, and
+    consecutive small sections share a chunk. Blocks too large for a chunk are split at their own
+    boundaries: tables between rows (each piece repeats the header, and a table up to max_table_tokens
+    stays whole in a chunk of its own), lists between items, paragraphs and code by SentenceSplitter.
+    Nodes get section_path (the headings above the chunk, e.g. "Annual Report > Financial Statements")
+    and chunk_type ("table" or "text") metadata; section_path is embedded and shown to the LLM.
+    """
+    chunk_size: int = MARKDOWN_CHUNK_SIZE
+    chunk_overlap: int = MARKDOWN_CHUNK_OVERLAP
+    max_table_tokens: int = MARKDOWN_CHUNK_SIZE
+
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, chunk_size: int = MARKDOWN_CHUNK_SIZE, chunk_overlap: int = MARKDOWN_CHUNK_OVERLAP,
+                 max_table_tokens: Optional[int] = None, tokenizer: Optional[Callable] = None, **kwargs):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                         max_table_tokens=max(max_table_tokens or chunk_size, chunk_size), **kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MarkdownStructureParser"
+
+    def _count(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def split_markdown(self, text: str, chunk_size: Optional[int] = None) -> List[Tuple[str, Tuple[str, ...], str]]:
+        """[(chunk text, section path, chunk type)] for one document."""
+        chunk_size = chunk_size or self.chunk_size
+        blocks = parse_markdown_blocks(text)
+        for block in blocks:
+            block.tokens = self._count(text[block.start:block.end])
+        # Tokens of each heading's section, subsections included, to keep sections whole when they fit
+        section_tokens = {}
+        for i, block in enumerate(blocks):
+            if block.kind == BLOCK_HEADING:
+                j = i + 1
+                while j < len(blocks) and not (blocks[j].kind == BLOCK_HEADING and blocks[j].level <= block.level):
+                    j += 1
+                section_tokens[i] = sum(b.tokens for b in blocks[i:j])
+
+        chunks = []
+        current: List[_Block] = []
+        current_tokens = 0
+
+        def flush():
+            # Emits the current chunk; headings at its end introduce what follows, so they start the next one
+            nonlocal current, current_tokens
+            carried = []
+            while current and current[-1].kind == BLOCK_HEADING:
+                carried.insert(0, current.pop())
+            if current:
+                chunk_type = BLOCK_TABLE if any(block.kind == BLOCK_TABLE for block in current) else "text"
+                chunks.append((text[current[0].start:current[-1].end].strip(), _common_path([block.path for block in current]), chunk_type))
+            current, current_tokens = carried, sum(block.tokens for block in carried)
+
+        for i, block in enumerate(blocks):
+            if block.kind == BLOCK_HEADING and current_tokens + section_tokens[i] > chunk_size:
+                flush() # The section does not fit beside what came before: it starts a chunk
+            if current_tokens + block.tokens > chunk_size:
+                flush() # Keeps only the headings introducing this block
+            if current_tokens + block.tokens <= chunk_size:
+                current.append(block)
+                current_tokens += block.tokens
+                continue
+            if block.kind == BLOCK_TABLE and block.tokens <= self.max_table_tokens:
+                current.append(block)
+                flush() # A table over chunk_size but within max_table_tokens stays whole, in a chunk of its own
+                continue
+            # One block larger than a chunk: split at its own boundaries, the first piece under its headings
+            prefix = "".join(text[b.start:b.end] for b in current)
+            for piece in self._split_block(text, block, max(chunk_size - current_tokens, chunk_size // 2)):
+                chunks.append(((prefix + piece).strip(), block.path, BLOCK_TABLE if block.kind == BLOCK_TABLE else "text"))
+                prefix = ""
+            current, current_tokens = [], 0
+        flush() # Headings at the very end, with nothing under them, are left out
+        if not chunks and text.strip():
+            chunks.append((text.strip(), (), "text")) # Headings only
+        return chunks
+
+    def _split_text(self, text: str, budget: int) -> List[str]:
+        return SentenceSplitter(chunk_size=budget, chunk_overlap=min(self.chunk_overlap, budget // 4), tokenizer=self._tokenizer).split_text(text)
+
+    def _split_block(self, text: str, block: _Block, budget: int) -> List[str]:
+        if block.kind == BLOCK_TABLE:
+            header = block.lines[:2] if len(block.lines) > 1 and _TABLE_SEPARATOR_RE.match(block.lines[1]) else block.lines[:1]
+            return self._pack(block.lines[len(header):], budget, header)
+        if block.kind == BLOCK_LIST:
+            return self._pack(block.lines, budget)
+        return self._split_text(text[block.start:block.end], budget)
+
+    def _pack(self, units: List[str], budget: int, header: List[str] = None) -> List[str]:
+        """Greedily packs table rows or list items into pieces of at most budget tokens, each starting with the header."""
+        header = header or []
+        header_tokens = self._count("\n".join(header)) + 1 if header else 0
+        pieces, piece, piece_tokens = [], [], header_tokens
+        for unit in units:
+            unit_tokens = self._count(unit) + 1
+            if piece and piece_tokens + unit_tokens > budget:
+                pieces.append("\n".join(header + piece))
+                piece, piece_tokens = [], header_tokens
+            if header_tokens + unit_tokens > budget: # One row or item alone is too large
+                pieces.extend("\n".join(header + [part]) for part in self._split_text(unit, max(budget - header_tokens, 50)))
+                continue
+            piece.append(unit)
+            piece_tokens += unit_tokens
+        if piece:
+            pieces.append("\n".join(header + piece))
+        return pieces
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        all_nodes: List[BaseNode] = []
+        for node in get_tqdm_iterable(nodes, show_progress, "Parsing nodes"):
+            text = node.get_content(metadata_mode=MetadataMode.NONE)
+            metadata_tokens = 0
+            if self.include_metadata:
+                metadata_tokens = max(self._count(node.get_metadata_str(mode=MetadataMode.EMBED)),
+                                      self._count(node.get_metadata_str(mode=MetadataMode.LLM)))
+            chunk_size = max(self.chunk_size - metadata_tokens - SECTION_PATH_RESERVE_TOKENS, self.chunk_size // 2)
+            chunks = self.split_markdown(text, chunk_size)
+            new_nodes = build_nodes_from_splits([chunk_text for chunk_text, _, _ in chunks], node, id_func=self.id_func)
+            for new_node, (_, path, chunk_type) in zip(new_nodes, chunks):
+                if path:
+                    new_node.metadata["section_path"] = SECTION_PATH_SEPARATOR.join(path)
+                new_node.metadata["chunk_type"] = chunk_type
+                new_node.excluded_embed_metadata_keys = list(new_node.excluded_embed_metadata_keys) + ["chunk_type"]
+                new_node.excluded_llm_metadata_keys = list(new_node.excluded_llm_metadata_keys) + ["chunk_type"]
+            all_nodes.extend(new_nodes)
+        return all_nodes
+
+
+def build_node_parser(config: Dict = None) -> NodeParser:
+    """
+    The node parser for a domain's "chunking" config: {"strategy": "sentence" | "markdown", "chunk_size",
+    "chunk_overlap", "max_table_tokens" (markdown only)}. Omitted sizes take the strategy's defaults.
+    """
+    config = config or {}
+    strategy = config.get("strategy") or CHUNKING_STRATEGY
+    if strategy == "sentence":
+        return SentenceSplitter(chunk_size=int(config.get("chunk_size") or SENTENCE_CHUNK_SIZE),
+                                chunk_overlap=int(config.get("chunk_overlap", SENTENCE_CHUNK_OVERLAP)))
+    if strategy == "markdown":
+        return MarkdownStructureParser(chunk_size=int(config.get("chunk_size") or MARKDOWN_CHUNK_SIZE),
+                                       chunk_overlap=int(config.get("chunk_overlap", MARKDOWN_CHUNK_OVERLAP)),
+                                       max_table_tokens=config.get("max_table_tokens"))
+    raise ValueError(f"Unknown chunking strategy '{strategy}'")
+
+
+def node_parser_signature(node_parser) -> str:
+    """Identifies the chunks a node parser produces; recorded in index_metadata.json to detect a change of chunking."""
+    if isinstance(node_parser, MarkdownStructureParser):
+        return f"markdown:{node_parser.chunk_size}:{node_parser.chunk_overlap}:{node_parser.max_table_tokens}"
+    if isinstance(node_parser, SentenceSplitter):
+        return f"sentence:{node_parser.chunk_size}:{node_parser.chunk_overlap}"
+    return type(node_parser).__name__
+
+
+# Indexes built before chunking was recorded used SentenceSplitter(768, 250)
+LEGACY_NODE_PARSER_SIGNATURE = f"sentence:{SENTENCE_CHUNK_SIZE}:{SENTENCE_CHUNK_OVERLAP}"
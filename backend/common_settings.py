@@ -1,33 +1,41 @@
 import os
 from dotenv import load_dotenv
 from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core import Settings
-from llama_index.core.node_parser import SentenceSplitter
 from llama_parse import LlamaParse
+from embedding_backend import build_embed_model
+from chunking import build_node_parser
+from llm_scheduler import ScheduledLLM
 
 load_dotenv()
 
 # --- Environment Variables & API Keys ---
 API_KEY_LLAMA = os.getenv("CLOUD_API_KEY")
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+USE_FAKE_MODELS = os.getenv("USE_FAKE_MODELS", "false").lower() == "true" # Offline benchmarks: deterministic fakes, no API keys (see benchmarks/fakes.py)
 
-if not GEMINI_API_KEY:
+if not GEMINI_API_KEY and not USE_FAKE_MODELS:
     raise ValueError("GOOGLE_API_KEY for Gemini is missing in the environment variables!")
 
 # --- LlamaIndex Basic Configuration ---
-LLM = GoogleGenAI(model="gemini-2.0-flash")
-EMBED_MODEL = HuggingFaceEmbedding(model_name="BAAI/bge-large-en-v1.5")
-NODE_PARSER = SentenceSplitter(chunk_size=768, chunk_overlap=250)
+if USE_FAKE_MODELS:
+    from benchmarks.fakes import build_fake_models
+    BASE_LLM, EMBED_MODEL = build_fake_models()
+    print("Warning: USE_FAKE_MODELS is set; using the fake LLM and hash embedder.")
+else:
+    BASE_LLM = GoogleGenAI(model="gemini-2.0-flash")
+    EMBED_MODEL = build_embed_model() # bge-large on PyTorch by default; see embedding_backend for EMBED_* overrides
+LLM = ScheduledLLM(BASE_LLM) # Agents call the LLM through the shared scheduler (concurrency, rate limit, retries, priority)
+NODE_PARSER = build_node_parser() # Domains choose their own with "chunking" in domains.json (see chunking)
 
-Settings.llm = LLM
+Settings.llm = BASE_LLM # LlamaIndex components need a real LLM instance
 Settings.embed_model = EMBED_MODEL
 Settings.node_parser = NODE_PARSER # Global default, can be overridden
 Settings.num_workers = 0
 
 # Initialize LlamaParse
 PDF_PARSER = None
-if API_KEY_LLAMA:
+if API_KEY_LLAMA and not USE_FAKE_MODELS:
     try:
         PDF_PARSER = LlamaParse(api_key=API_KEY_LLAMA, result_type="markdown", verbose=True)
         print("LlamaParse initialized successfully in common_settings.")
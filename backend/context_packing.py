@@ -0,0 +1,189 @@
+import os
+import re
+from typing import Dict, List, Set
+
+from metrics import CHARS_PER_TOKEN_ESTIMATE, REGISTRY, span, estimate_tokens
+from request_context import current_stats
+
+# --- Context Packing Configuration ---
+# Retrieved chunks overlap (chunk_overlap=250) and fused results often repeat the same passage,
+# so the synthesis context is packed first: overlapping or adjacent chunks of one source are merged,
+# near-duplicate passages are dropped, and passages are added by fused score until the budget is full.
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true" # false = join every retrieved chunk, as before
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000")) # Estimated tokens; 0 = no budget
+CONTEXT_DUPLICATE_CONTAINMENT = float(os.getenv("CONTEXT_DUPLICATE_CONTAINMENT", "0.8")) # Share of a passage's shingles already packed to drop it
+CONTEXT_ADJACENT_GAP_CHARS = 2 # Chunks this close in their source document are treated as adjacent and merged
+CONTEXT_MIN_OVERLAP_CHARS = 20 # Shortest text overlap trusted when chunks carry no character offsets
+CONTEXT_SEPARATOR = "\n---\n"
+SHINGLE_WORDS = 3
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Passage:
+    """One or more merged chunks of the same source, with the best fused score among them."""
+    def __init__(self, node_with_score):
+        node = node_with_score.node
+        self.text = str(node.get_content())
+        self.score = node_with_score.score if node_with_score.score is not None else 0.0
+        self.source = getattr(node, 'ref_doc_id', None) or getattr(node, 'metadata', {}).get('file_name') or node.node_id
+        self.start = getattr(node, 'start_char_idx', None)
+        self.end = getattr(node, 'end_char_idx', None)
+        self.nodes = [node_with_score]
+
+    @property
+    def has_offsets(self) -> bool:
+        return self.start is not None and self.end is not None
+
+    def absorb(self, other: "Passage", overlap_chars: int):
+        """Appends `other`, which follows this passage in the source and repeats its last overlap_chars characters."""
+        separator = "" if overlap_chars > 0 or self.text[-1:].isspace() else " "
+        self.text = self.text + separator + other.text[max(0, overlap_chars):]
+        self.score = max(self.score, other.score)
+        self.end = max(self.end, other.end) if self.has_offsets and other.has_offsets else None
+        self.nodes.extend(other.nodes)
+
+
+class PackedContext:
+    """The packed synthesis context, the nodes it was built from, and what packing saved."""
+    def __init__(self, text: str, source_nodes: list, retrieved_tokens: int, packed_tokens: int,
+                 merged_chunks: int = 0, dropped_duplicates: int = 0, dropped_over_budget: int = 0):
+        self.text = text
+        self.source_nodes = source_nodes
+        self.retrieved_tokens = retrieved_tokens
+        self.packed_tokens = packed_tokens
+        self.merged_chunks = merged_chunks
+        self.dropped_duplicates = dropped_duplicates
+        self.dropped_over_budget = dropped_over_budget
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.retrieved_tokens - self.packed_tokens
+
+    def to_dict(self) -> Dict:
+        return {
+            "retrieved_tokens": self.retrieved_tokens,
+            "packed_tokens": self.packed_tokens,
+            "tokens_saved": self.tokens_saved,
+            "merged_chunks": self.merged_chunks,
+            "dropped_duplicates": self.dropped_duplicates,
+            "dropped_over_budget": self.dropped_over_budget,
+        }
+
+
+def _suffix_prefix_overlap(a: str, b: str, min_overlap: int = CONTEXT_MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (at least min_overlap characters), else 0."""
+    if len(a) < min_overlap or len(b) < min_overlap:
+        return 0
+    probe = b[:min_overlap]
+    position = a.find(probe, max(0, len(a) - len(b)))
+    while position != -1:
+        if b.startswith(a[position:]):
+            return len(a) - position
+        position = a.find(probe, position + 1)
+    return 0
+
+
+def _shingles(text: str) -> Set[tuple]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class ContextPacker:
+    """
+    Turns fused retrieval results into the synthesis context: merges overlapping or adjacent chunks
+    of the same source, drops passages whose shingles are mostly already packed, and adds passages
+    in fused-score order until token_budget (estimated tokens) is reached.
+    """
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, duplicate_containment: float = CONTEXT_DUPLICATE_CONTAINMENT,
+                 enabled: bool = CONTEXT_PACKING, separator: str = CONTEXT_SEPARATOR):
+        self.token_budget = token_budget
+        self.duplicate_containment = duplicate_containment
+        self.enabled = enabled
+        self.separator = separator
+
+    def _merge_same_source(self, passages: List[Passage]) -> List[Passage]:
+        """Merges chunks of one source that overlap or touch, using character offsets when every chunk has them."""
+        if all(passage.has_offsets for passage in passages):
+            passages = sorted(passages, key=lambda passage: (passage.start, passage.end))
+        merged: List[Passage] = []
+        for passage in passages:
+            previous = merged[-1] if merged else None
+            if previous is None:
+                merged.append(passage)
+                continue
+            if previous.has_offsets and passage.has_offsets:
+                if previous.start <= passage.start and passage.end <= previous.end: # Fully inside the previous chunk
+                    previous.score = max(previous.score, passage.score)
+                    previous.nodes.extend(passage.nodes)
+                    continue
+                if passage.start <= previous.end + CONTEXT_ADJACENT_GAP_CHARS:
+                    overlap = previous.end - passage.start
+                    # Offsets say how much repeats; confirm against the text, which may have been stripped
+                    if overlap <= 0 or previous.text.endswith(passage.text[:overlap]):
+                        previous.absorb(passage, max(0, overlap))
+                        continue
+            overlap = _suffix_prefix_overlap(previous.text, passage.text)
+            if overlap:
+                previous.absorb(passage, overlap)
+            else:
+                merged.append(passage)
+        return merged
+
+    def pack(self, source_nodes) -> PackedContext:
+        nodes = [n for n in (source_nodes or []) if hasattr(n, 'node') and hasattr(n.node, 'get_content')]
+        texts = [str(n.node.get_content()) for n in nodes]
+        retrieved_tokens = estimate_tokens(self.separator.join(texts))
+        if not self.enabled:
+            return PackedContext(self.separator.join(texts), nodes, retrieved_tokens, retrieved_tokens)
+
+        with span("context_packing"):
+            by_source: Dict[str, List[Passage]] = {}
+            for node_with_score in nodes:
+                passage = Passage(node_with_score)
+                by_source.setdefault(str(passage.source), []).append(passage)
+            passages = [merged for group in by_source.values() for merged in self._merge_same_source(group)]
+            passages.sort(key=lambda passage: passage.score, reverse=True)
+
+            packed: List[Passage] = []
+            packed_shingles: Set[tuple] = set()
+            used_tokens = 0
+            dropped_duplicates = dropped_over_budget = 0
+            separator_tokens = estimate_tokens(self.separator)
+            for passage in passages:
+                shingles = _shingles(passage.text)
+                if shingles and len(shingles & packed_shingles) / len(shingles) >= self.duplicate_containment:
+                    dropped_duplicates += 1
+                    continue
+                cost = estimate_tokens(passage.text) + (separator_tokens if packed else 0)
+                if self.token_budget and used_tokens + cost > self.token_budget:
+                    if packed:
+                        dropped_over_budget += 1
+                        continue
+                    passage.text = passage.text[:self.token_budget * CHARS_PER_TOKEN_ESTIMATE] # The best passage alone is over budget: keep its start
+                    cost = estimate_tokens(passage.text)
+                packed.append(passage)
+                packed_shingles |= shingles
+                used_tokens += cost
+
+            text = self.separator.join(passage.text for passage in packed)
+            result = PackedContext(
+                text, [n for passage in packed for n in passage.nodes], retrieved_tokens, estimate_tokens(text),
+                merged_chunks=len(nodes) - len(passages), dropped_duplicates=dropped_duplicates, dropped_over_budget=dropped_over_budget,
+            )
+        record_packing(result)
+        return result
+
+
+def record_packing(result: PackedContext):
+    """Feeds tokens saved by packing into the metrics registry and the current request's stats."""
+    REGISTRY.inc("context_tokens_retrieved_total", result.retrieved_tokens, help="Estimated tokens of retrieved context before packing")
+    REGISTRY.inc("context_tokens_packed_total", result.packed_tokens, help="Estimated tokens of context sent to synthesis after packing")
+    for reason, count in (("merged", result.merged_chunks), ("duplicate", result.dropped_duplicates), ("budget", result.dropped_over_budget)):
+        if count:
+            REGISTRY.inc("context_chunks_removed_total", count, help="Retrieved chunks merged or dropped by context packing", reason=reason)
+    stats = current_stats()
+    if stats is not None:
+        stats.add_context_tokens(result.retrieved_tokens, result.packed_tokens)
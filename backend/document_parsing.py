@@ -0,0 +1,137 @@
+import os
+import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from llama_index.core import SimpleDirectoryReader, Document
+
+from rate_limit import TokenBucket
+
+PARSE_CACHE_DIRNAME = "parse_cache"
+PARSE_MAX_WORKERS = int(os.getenv("PARSE_MAX_WORKERS", "4")) # Files parsed concurrently
+PARSE_RATE_LIMIT_PER_SECOND = float(os.getenv("PARSE_RATE_LIMIT_PER_SECOND", "2")) # Calls/sec to the parser service (LlamaParse); 0 disables
+PARSE_RATE_LIMIT_BURST = float(os.getenv("PARSE_RATE_LIMIT_BURST", "4"))
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed Documents, one JSON file per (content hash, parser).
+    A crash, rebuild or chunking change re-uses the parsed text instead of calling the parser again.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock() # get() runs on parse_files' pool threads
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def for_persist_dir(cls, persist_dir: str) -> "ParseCache":
+        return cls(os.path.join(persist_dir, PARSE_CACHE_DIRNAME))
+
+    def _path(self, file_hash: str, parser_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{file_hash}-{parser_name}.json")
+
+    def get(self, file_hash: str, parser_name: str) -> List[Document] | None:
+        try:
+            with open(self._path(file_hash, parser_name), 'r', encoding='utf-8') as f:
+                documents = [Document.from_dict(item) for item in json.load(f)]
+        except (IOError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return documents
+
+    def put(self, file_hash: str, parser_name: str, documents: List[Document]):
+        path = self._path(file_hash, parser_name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([document.to_dict() for document in documents], f)
+        os.replace(tmp_path, path) # Readers never see a half-written entry
+
+    def prune(self, keep_hashes: Iterable[str]) -> int:
+        """Removes entries for content hashes that are no longer in the data directory."""
+        keep = set(keep_hashes)
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json") and name.split("-", 1)[0] not in keep:
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
+
+
+def _refresh_documents(documents: List[Document], file_path: str) -> List[Document]:
+    """
+    Cached Documents may come from an identical file under another name, or from an earlier run
+    whose IDs are already in the docstore: point them at the current file and give them fresh IDs.
+    """
+    for document in documents:
+        document.id_ = str(uuid.uuid4())
+        if 'file_path' in document.metadata:
+            document.metadata['file_path'] = file_path
+        if 'file_name' in document.metadata:
+            document.metadata['file_name'] = os.path.basename(file_path)
+    return documents
+
+
+def parse_files(
+    files: List[Tuple[str, str, str]],
+    doc_parser_instance = None,
+    parse_cache: ParseCache = None,
+    max_workers: int = PARSE_MAX_WORKERS,
+    rate_limiter: TokenBucket = None
+) -> Tuple[Dict[str, List[Document]], Dict[str, str]]:
+    """
+    Parses (key, file_path, content_hash) entries on a bounded thread pool.
+    PDFs go to doc_parser_instance (anything with load_data(file_path), e.g. LlamaParse) behind the
+    rate limiter; other files use SimpleDirectoryReader. Results are cached by content hash.
+    Returns ({key: documents}, {key: error message}); files yielding no content are in neither.
+    """
+    if rate_limiter is None:
+        rate_limiter = TokenBucket(PARSE_RATE_LIMIT_PER_SECOND, PARSE_RATE_LIMIT_BURST)
+
+    def parse_one(entry):
+        key, file_path, file_hash = entry
+        use_service_parser = file_path.lower().endswith(".pdf") and doc_parser_instance is not None
+        parser_name = type(doc_parser_instance).__name__ if use_service_parser else "SimpleDirectoryReader"
+
+        if parse_cache is not None and file_hash:
+            cached = parse_cache.get(file_hash, parser_name)
+            if cached is not None:
+                print(f"Using cached parse of {file_path}")
+                return key, _refresh_documents(cached, file_path), None
+
+        print(f"Processing file: {file_path}")
+        try:
+            if use_service_parser:
+                print(f"Using {parser_name} for PDF: {key}")
+                rate_limiter.acquire()
+                documents = doc_parser_instance.load_data(file_path)
+            else:
+                if file_path.lower().endswith(".pdf"):
+                    print(f"Warning: LlamaParse not used for PDF '{key}'. Using SimpleDirectoryReader.")
+                documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+        except Exception as e:
+            return key, None, str(e)
+
+        if documents and parse_cache is not None and file_hash:
+            parse_cache.put(file_hash, parser_name, documents)
+        return key, documents, None
+
+    parsed: Dict[str, List[Document]] = {}
+    errors: Dict[str, str] = {}
+    if not files:
+        return parsed, errors
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files))), thread_name_prefix="parse") as pool:
+        for key, documents, error in pool.map(parse_one, files):
+            if error is not None:
+                errors[key] = error
+            elif documents:
+                parsed[key] = documents
+            else:
+                print(f"Warning: No content loaded from file: {key}")
+    return parsed, errors
@@ -0,0 +1,115 @@
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+
+# --- Domain Configuration ---
+# Every domain (HR, Finance, Legal, ...) is one entry in domains.json: where its documents and index
+# live, retrieval settings and prompts. DomainService builds any of them; nothing is domain-specific in code.
+# Per-domain environment overrides use the domain's env_prefix (default: the name upper-cased),
+# e.g. HR_DATA_DIR, HR_PERSIST_DIR, HR_SIMILARITY_K, FINANCE_VECTOR_INDEX_MODE, FINANCE_IVF_NPROBE, FINANCE_CHUNKING.
+DOMAINS_CONFIG_PATH = os.getenv("DOMAINS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "domains.json"))
+
+DEFAULT_SIMILARITY_K = 7
+DEFAULT_VECTOR_INDEX_CONFIG = {"index_mode": "exact", "nlist": 0, "nprobe": 8} # nlist 0 = about 4 * sqrt(number of chunks)
+DEFAULT_NO_HISTORY_TEXT = "No conversation history provided for this request."
+SOURCE_FORMATS = ("file", "node_id") # How sources are reported: "Node: <id> (Source: <file>)" or the bare node id
+RETRIEVER_TYPES = ("vector", "bm25")
+CHUNKING_STRATEGIES = ("sentence", "markdown")
+
+
+class DomainConfigError(ValueError):
+    """Raised for an invalid domains config file or entry."""
+
+
+def _join(template) -> str:
+    # Prompts may be written as a list of lines in the JSON file, for readability
+    return "".join(template) if isinstance(template, list) else (template or "")
+
+
+class DomainConfig:
+    """Settings for one domain, with environment overrides applied."""
+    def __init__(self, name: str, data: Dict):
+        self.name = name.lower()
+        self.label = data.get("label") or name.upper()
+        self.env_prefix = data.get("env_prefix") or name.upper()
+        env = lambda key, default: os.getenv(f"{self.env_prefix}_{key}", default)
+
+        self.index_name = data.get("index_name") or f"{self.label}_Docs_Service"
+        self.data_dir = env("DATA_DIR", data.get("data_dir") or f"../data/{self.name}/")
+        self.persist_dir = env("PERSIST_DIR", data.get("persist_dir") or f"../storage/{self.name}_index")
+        self.tool_name = data.get("tool_name") or f"{self.name}_documents"
+        self.tool_description = data.get("tool_description") or f"{self.label} documents."
+        self.similarity_top_k = int(env("SIMILARITY_K", data.get("similarity_top_k", DEFAULT_SIMILARITY_K)))
+        vector_index = {**DEFAULT_VECTOR_INDEX_CONFIG, **(data.get("vector_index") or {})}
+        self.vector_index_config = {
+            "index_mode": env("VECTOR_INDEX_MODE", vector_index["index_mode"]),
+            "nlist": int(env("IVF_NLIST", vector_index["nlist"])),
+            "nprobe": int(env("IVF_NPROBE", vector_index["nprobe"])),
+        }
+        chunking = data.get("chunking") or {}
+        # Strategy plus optional chunk_size/chunk_overlap/max_table_tokens; see chunking.build_node_parser
+        self.chunking_config = {**chunking, "strategy": env("CHUNKING", chunking.get("strategy") or os.getenv("CHUNKING_STRATEGY", "sentence"))}
+        fusion = data.get("fusion") or {}
+        self.retrievers: List[str] = list(fusion.get("retrievers") or RETRIEVER_TYPES)
+        self.fusion_top_k = int(fusion.get("top_k") or self.similarity_top_k) # Results kept after fusion
+        self.rrf_k: Optional[int] = fusion.get("rrf_k")
+        self.source_format = data.get("source_format", "file")
+        self.preload = bool(data.get("preload", False)) # Loaded at startup and required for readiness; others load on first use
+        self.verbose = bool(data.get("verbose", True))
+
+        prompts = data.get("prompts") or {}
+        self.system_prompt = prompts.get("system") or f"You are a helpful {self.label} assistant. Use the context from {self.label} documents to answer the question accurately."
+        self.plan_prompt = _join(prompts.get("plan"))
+        self.answer_prompt = _join(prompts.get("answer"))
+        self.fallback_answer = prompts.get("fallback_answer") or f"Could not generate {self.label} answer based on the provided documents."
+        self.no_history_text = prompts.get("no_history", DEFAULT_NO_HISTORY_TEXT)
+        self.validate()
+
+    def validate(self):
+        if not self.plan_prompt or "{format_instructions}" not in self.plan_prompt:
+            raise DomainConfigError(f"Domain '{self.name}': prompts.plan must include {{format_instructions}}")
+        if not self.answer_prompt or "{tool_context}" not in self.answer_prompt:
+            raise DomainConfigError(f"Domain '{self.name}': prompts.answer must include {{tool_context}}")
+        if self.source_format not in SOURCE_FORMATS:
+            raise DomainConfigError(f"Domain '{self.name}': source_format must be one of {SOURCE_FORMATS}")
+        if self.chunking_config["strategy"] not in CHUNKING_STRATEGIES:
+            raise DomainConfigError(f"Domain '{self.name}': chunking.strategy must be one of {CHUNKING_STRATEGIES}")
+        unknown = [retriever for retriever in self.retrievers if retriever not in RETRIEVER_TYPES]
+        if unknown or not self.retrievers:
+            raise DomainConfigError(f"Domain '{self.name}': fusion.retrievers must be a non-empty subset of {RETRIEVER_TYPES}")
+
+    def prompt_values(self) -> Dict[str, str]:
+        """Placeholders available to every prompt template, besides the per-request ones."""
+        return {"label": self.label, "tool_name": self.tool_name, "tool_description": self.tool_description, "system_prompt": self.system_prompt}
+
+
+class DomainsConfig:
+    def __init__(self, domains: Dict[str, DomainConfig], default_domain: str):
+        self.domains = domains
+        self.default_domain = default_domain
+
+
+def load_domains_config(path: str = DOMAINS_CONFIG_PATH) -> DomainsConfig:
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    domains = {name.lower(): DomainConfig(name, data or {}) for name, data in (raw.get("domains") or {}).items()}
+    if not domains:
+        raise DomainConfigError(f"No domains configured in {path}")
+    default_domain = (raw.get("default_domain") or next(iter(domains))).lower()
+    if default_domain not in domains:
+        raise DomainConfigError(f"default_domain '{default_domain}' is not configured in {path}")
+    return DomainsConfig(domains, default_domain)
+
+
+_domains_config: Optional[DomainsConfig] = None
+_domains_config_lock = threading.Lock()
+
+
+def get_domains_config() -> DomainsConfig:
+    """The process-wide domains config, read once from DOMAINS_CONFIG_PATH."""
+    global _domains_config
+    with _domains_config_lock:
+        if _domains_config is None:
+            _domains_config = load_domains_config()
+        return _domains_config
@@ -0,0 +1,402 @@
+import os
+import gc
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from metrics import REGISTRY
+
+DOMAIN_RETRY_AFTER_SECONDS = 5 # Hint sent with 503s while a domain is still loading
+DOMAIN_LOAD_MAX_WORKERS = int(os.getenv("DOMAIN_LOAD_MAX_WORKERS", "4")) # Domains built at once, however many are registered
+DOMAIN_RETRY_FAILED_SECONDS = float(os.getenv("DOMAIN_RETRY_FAILED_SECONDS", "60")) # A failed domain is retried on a request after this long
+DOMAIN_MEMORY_BUDGET_MB = float(os.getenv("DOMAIN_MEMORY_BUDGET_MB", "0")) # Process RSS above which idle domains are unloaded; 0 = never unload
+DOMAIN_IDLE_UNLOAD_SECONDS = float(os.getenv("DOMAIN_IDLE_UNLOAD_SECONDS", "600")) # Only domains unused this long are unloaded
+DOMAIN_REAPER_INTERVAL_SECONDS = 30
+
+STATE_PENDING = "pending"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+STATE_UNLOADED = "unloaded"
+STATE_EMPTY = "empty" # No documents to index: not retried on requests, loaded once files arrive
+
+
+class DomainNotReadyError(Exception):
+    """Raised when a request targets a domain that is still loading."""
+    def __init__(self, domain: str, retry_after: int = DOMAIN_RETRY_AFTER_SECONDS):
+        super().__init__(f"{domain.upper()} Service is still loading")
+        self.domain = domain
+        self.retry_after = retry_after
+
+
+class DomainUnavailableError(Exception):
+    """Raised when a domain failed to load."""
+    def __init__(self, domain: str, error: str = None):
+        super().__init__(f"{domain.upper()} Service is not available")
+        self.domain = domain
+        self.error = error
+
+
+class DomainEmptyError(DomainUnavailableError):
+    """Raised by a factory whose data directory holds no documents, and for requests to such a domain."""
+    def __init__(self, domain: str, data_dir: str = None):
+        Exception.__init__(self, f"{domain.upper()} has no documents yet; add files to its data directory to enable it")
+        self.domain = domain
+        self.error = str(self)
+        self.data_dir = data_dir
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil # Optional; used on platforms without /proc
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+class _DomainState:
+    def __init__(self, preload: bool = False):
+        self.preload = preload
+        self.state = STATE_PENDING
+        self.stage = None
+        self.service = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.stage_started_at = None
+        self.stage_timings: Dict[str, float] = {}
+        self.last_used_at = None
+        self.loads = 0
+        self.unloads = 0
+        self.reloading = False
+        self.reload_pending = None # force flag of a reload requested while one was running
+        self.reloads = 0
+        self.last_reload = None # {"outcome", "reason", "seconds", "finished_at", "error"}
+        self.empty_data_dir = None # Data directory of an empty domain, watched for new files
+
+
+class DomainLoader:
+    """
+    Builds domain services on a shared background thread pool, so domains warm in parallel while the
+    HTTP server is already accepting requests. Domains are registered at any time: preloaded ones are
+    built at start() and gate readiness; the rest are built on their first request. With a memory
+    budget, domains idle for DOMAIN_IDLE_UNLOAD_SECONDS are unloaded (least recently used first)
+    while the process is over budget, and rebuilt on their next request.
+    A factory receives a progress(stage) callback and returns the ready service object. reload() runs a
+    ready service's reload(force) on the same pool (hot index reload); on_ready(domain, service) is
+    called after every load and every reload that changed the service.
+    """
+    def __init__(self, factories: Dict[str, Callable[[Callable[[str], None]], object]] = None,
+                 max_workers: int = DOMAIN_LOAD_MAX_WORKERS,
+                 memory_budget_mb: float = DOMAIN_MEMORY_BUDGET_MB,
+                 idle_unload_seconds: float = DOMAIN_IDLE_UNLOAD_SECONDS,
+                 retry_failed_seconds: float = DOMAIN_RETRY_FAILED_SECONDS,
+                 on_ready: Callable[[str, object], None] = None):
+        self.on_ready = on_ready
+        self._factories: Dict[str, Callable] = {}
+        self._states: Dict[str, _DomainState] = {}
+        self._lock = threading.Lock()
+        self._max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="domain-loader")
+        self._started = False
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.idle_unload_seconds = idle_unload_seconds
+        self.retry_failed_seconds = retry_failed_seconds
+        self._reaper_stop = threading.Event()
+        for domain, factory in (factories or {}).items():
+            self.register(domain, factory, preload=True)
+
+    @property
+    def domains(self):
+        with self._lock:
+            return list(self._factories.keys())
+
+    def register(self, domain: str, factory: Callable[[Callable[[str], None]], object], preload: bool = False):
+        """Adds a domain. A preloaded domain registered after start() begins loading right away."""
+        with self._lock:
+            if domain in self._factories:
+                raise ValueError(f"Domain '{domain}' is already registered")
+            self._factories[domain] = factory
+            self._states[domain] = _DomainState(preload=preload)
+            if preload and self._started:
+                self._schedule_locked(domain)
+
+    def start(self):
+        """Schedules every preloaded domain for loading; returns immediately."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for domain, state in self._states.items():
+                if state.preload:
+                    self._schedule_locked(domain)
+        self._start_reaper()
+
+    def _start_reaper(self):
+        if self.memory_budget_bytes > 0:
+            threading.Thread(target=self._reap_forever, name="domain-reaper", daemon=True).start()
+
+    def _schedule_locked(self, domain: str):
+        # Marked as loading before submission, so concurrent requests never schedule the same load twice
+        state = self._states[domain]
+        state.state = STATE_LOADING
+        state.started_at = time.monotonic()
+        state.finished_at = None
+        state.error = None
+        state.stage_timings = {}
+        self._executor.submit(self._load, domain)
+
+    def _set_stage(self, domain: str, stage: str):
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[domain]
+            if state.stage is not None and state.stage_started_at is not None:
+                state.stage_timings[state.stage] = round(now - state.stage_started_at, 3)
+            state.stage = stage
+            state.stage_started_at = now
+        print(f"Domain '{domain}': {stage}")
+
+    def _load(self, domain: str):
+        with self._lock:
+            state = self._states[domain]
+            factory = self._factories[domain]
+        try:
+            service = factory(lambda stage: self._set_stage(domain, stage))
+            self._set_stage(domain, STATE_READY)
+            with self._lock:
+                state.service = service
+                state.state = STATE_READY
+                state.loads += 1
+                state.last_used_at = state.last_used_at or time.monotonic()
+            self._notify_ready(domain, service)
+        except DomainEmptyError as e:
+            print(f"Domain '{domain}' has no documents in {e.data_dir}; it loads once files are added.")
+            self._set_stage(domain, STATE_EMPTY)
+            with self._lock:
+                state.state = STATE_EMPTY
+                state.error = str(e)
+                state.empty_data_dir = e.data_dir
+        except Exception as e:
+            print(f"Domain '{domain}' failed to load: {e}")
+            traceback.print_exc()
+            self._set_stage(domain, STATE_FAILED)
+            with self._lock:
+                state.state = STATE_FAILED
+                state.error = str(e)
+        finally:
+            with self._lock:
+                state.finished_at = time.monotonic()
+        self.enforce_memory_budget(exclude=domain)
+
+    def _notify_ready(self, domain: str, service):
+        if self.on_ready is None:
+            return
+        try:
+            self.on_ready(domain, service)
+        except Exception as e:
+            print(f"Warning: on_ready hook failed for domain '{domain}': {e}")
+
+    def reload(self, domain: str, force: bool = False, reason: str = "manual") -> str:
+        """
+        Schedules a hot reload of a ready domain off the request path. Returns 'scheduled', 'queued'
+        (one is running; another follows it), or 'not_loaded' (the next load picks up changes anyway).
+        An empty domain is loaded again ('scheduled'), for when documents were added to it.
+        Raises KeyError for unknown domains.
+        """
+        with self._lock:
+            state = self._states[domain]
+            if state.state == STATE_EMPTY:
+                self._schedule_locked(domain)
+                return "scheduled"
+            if state.state != STATE_READY:
+                return "not_loaded"
+            if state.reloading:
+                state.reload_pending = bool(state.reload_pending) or force
+                return "queued"
+            state.reloading = True
+        self._executor.submit(self._reload, domain, force, reason)
+        return "scheduled"
+
+    def _reload(self, domain: str, force: bool, reason: str):
+        with self._lock:
+            state = self._states[domain]
+            service = state.service
+        started = time.monotonic()
+        error = None
+        try:
+            changed = service.reload(force=force) if service is not None else False
+            outcome = "changed" if changed else "unchanged"
+        except Exception as e:
+            # The service keeps serving its previous engine
+            print(f"Domain '{domain}' failed to reload: {e}")
+            traceback.print_exc()
+            changed, outcome, error = False, "failed", str(e)
+        seconds = round(time.monotonic() - started, 3)
+        REGISTRY.observe("domain_reload_duration_seconds", seconds, help="Hot index reload duration", domain=domain)
+        REGISTRY.inc("domain_reloads_total", help="Hot index reloads by outcome", domain=domain, outcome=outcome)
+        print(f"Domain '{domain}': reload ({reason}) {outcome} in {seconds:.3f}s")
+        if changed:
+            self._notify_ready(domain, service)
+        with self._lock:
+            state.reloads += 1
+            state.last_reload = {"outcome": outcome, "reason": reason, "seconds": seconds, "finished_at": time.time(), "error": error}
+            pending, state.reload_pending = state.reload_pending, None
+            state.reloading = pending is not None and state.state == STATE_READY
+        if state.reloading:
+            self._executor.submit(self._reload, domain, pending, "queued")
+
+    def get(self, domain: str):
+        """
+        Returns the domain's service, starting its load if it is not loaded. Raises KeyError for unknown
+        domains, DomainNotReadyError while it is loading, DomainEmptyError if it has no documents and
+        DomainUnavailableError if loading failed.
+        """
+        with self._lock:
+            state = self._states[domain]
+            state.last_used_at = time.monotonic()
+            if state.state == STATE_READY:
+                return state.service
+            if state.state == STATE_EMPTY:
+                raise DomainEmptyError(domain, state.empty_data_dir)
+            if state.state == STATE_FAILED:
+                if time.monotonic() - (state.finished_at or 0) < self.retry_failed_seconds:
+                    raise DomainUnavailableError(domain, state.error)
+                self._schedule_locked(domain)
+            elif state.state in (STATE_PENDING, STATE_UNLOADED):
+                self._schedule_locked(domain)
+        raise DomainNotReadyError(domain)
+
+    def servable_domains(self):
+        """Registered domains except those known to have no documents; "auto" routes among these."""
+        with self._lock:
+            return [domain for domain, state in self._states.items() if state.state != STATE_EMPTY]
+
+    def empty_domains(self) -> Dict[str, str]:
+        """Data directory of every domain that had no documents when it last loaded."""
+        with self._lock:
+            return {domain: state.empty_data_dir for domain, state in self._states.items() if state.state == STATE_EMPTY}
+
+    def get_if_ready(self, domain: str):
+        with self._lock:
+            state = self._states.get(domain)
+            return state.service if state is not None and state.state == STATE_READY else None
+
+    def unload(self, domain: str) -> bool:
+        """Drops a ready domain's service so its index and engine can be freed; the next request reloads it."""
+        with self._lock:
+            state = self._states[domain]
+            if state.state != STATE_READY:
+                return False
+            state.service = None # Requests already holding the service finish with it
+            state.state = STATE_UNLOADED
+            state.stage = STATE_UNLOADED
+            state.unloads += 1
+        gc.collect()
+        print(f"Domain '{domain}': unloaded")
+        return True
+
+    def enforce_memory_budget(self, exclude: str = None) -> list:
+        """Unloads idle domains, least recently used first, while the process is over its memory budget."""
+        if self.memory_budget_bytes <= 0:
+            return []
+        unloaded = []
+        while True:
+            rss = process_rss_bytes()
+            if rss is None or rss <= self.memory_budget_bytes:
+                return unloaded
+            now = time.monotonic()
+            with self._lock:
+                idle = [(state.last_used_at or 0, domain) for domain, state in self._states.items()
+                        if domain != exclude and state.state == STATE_READY and now - (state.last_used_at or 0) >= self.idle_unload_seconds]
+            if not idle:
+                return unloaded
+            _, domain = min(idle)
+            print(f"Process RSS {rss / 1024 / 1024:.0f} MB is over the {self.memory_budget_bytes / 1024 / 1024:.0f} MB domain budget.")
+            if self.unload(domain):
+                unloaded.append(domain)
+
+    def _reap_forever(self):
+        while not self._reaper_stop.wait(DOMAIN_REAPER_INTERVAL_SECONDS):
+            try:
+                self.enforce_memory_budget()
+            except Exception as e:
+                print(f"Warning: Domain memory budget check failed: {e}")
+
+    def is_ready(self) -> bool:
+        return self.overall_state() == STATE_READY
+
+    def overall_state(self) -> str:
+        """
+        'ready' when every preloaded domain is ready (or unloaded, it reloads on demand, or empty: it
+        serves nothing until the index watcher loads it once files arrive), 'loading' while any is still
+        loading, else 'degraded'. Lazily loaded domains do not affect readiness.
+        """
+        with self._lock:
+            states = [state.state for state in self._states.values() if state.preload]
+        if all(state in (STATE_READY, STATE_UNLOADED, STATE_EMPTY) for state in states):
+            return STATE_READY
+        if any(state in (STATE_PENDING, STATE_LOADING) for state in states):
+            return STATE_LOADING
+        return "degraded"
+
+    def status(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for domain, state in self._states.items():
+                elapsed = None
+                if state.started_at is not None:
+                    elapsed = round((state.finished_at or now) - state.started_at, 3)
+                report[domain] = {
+                    "state": state.state,
+                    "stage": state.stage,
+                    "preload": state.preload,
+                    "elapsed_seconds": elapsed,
+                    "stage_timings": dict(state.stage_timings),
+                    "idle_seconds": round(now - state.last_used_at, 1) if state.last_used_at is not None else None,
+                    "loads": state.loads,
+                    "unloads": state.unloads,
+                    "index_version": getattr(state.service, 'index_version', None),
+                    "reloading": state.reloading,
+                    "reloads": state.reloads,
+                    "last_reload": state.last_reload,
+                    "error": state.error,
+                }
+            return report
+
+    def wait_for_preload(self, timeout: float = None) -> str:
+        """Blocks until no preloaded domain is loading or reloading (or the timeout passes); returns overall_state()."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                busy = any(state.reloading or (state.preload and state.state in (STATE_PENDING, STATE_LOADING))
+                           for state in self._states.values())
+            if not busy or (deadline is not None and time.monotonic() > deadline):
+                return self.overall_state()
+            time.sleep(0.05)
+
+    def stop_background(self):
+        """Stops the memory reaper; a server's parent process calls this before forking workers."""
+        self._reaper_stop.set()
+
+    def after_fork(self):
+        """
+        Called in a forked worker: threads do not survive fork, so the load pool and the reaper are
+        recreated. Services loaded before the fork are kept and shared copy-on-write with the parent.
+        """
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="domain-loader")
+        self._reaper_stop = threading.Event()
+        self._start_reaper()
+
+    def shutdown(self, wait: bool = False):
+        self._reaper_stop.set()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,172 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ivf_index import IVFIndex
+from metrics import REGISTRY, span
+
+# --- Domain Routing Configuration ---
+# Requests with domain "auto" are routed by embedding similarity. Each domain is summarized by a few k-means
+# centroids of its chunk embeddings, computed from the index when the domain loads and persisted beside it.
+# Routing therefore costs one query embedding and a few dot products, never an LLM call. When the best
+# domains score too close to call, retrieval fans out to them and the answer is synthesized once.
+AUTO_DOMAIN = "auto"
+ROUTER_SUMMARY_VECTORS = int(os.getenv("ROUTER_SUMMARY_VECTORS", "8")) # Centroids per domain; a domain scores its best-matching one
+ROUTER_PROFILE_SAMPLE_ROWS = 4096 # Chunk embeddings sampled to compute a domain's centroids
+ROUTER_AMBIGUITY_MARGIN = float(os.getenv("ROUTER_AMBIGUITY_MARGIN", "0.03")) # Domains scoring within this of the best are searched too
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.2")) # Below this no domain is trusted: fan out to the top ones
+ROUTER_MAX_FANOUT = int(os.getenv("ROUTER_MAX_FANOUT", "2")) # Most domains searched for one query; 1 disables fan-out
+ROUTER_CONFIDENCE_TEMPERATURE = 0.02 # Softmax temperature turning similarities into the reported confidence
+ROUTING_PROFILE_FILENAME = "routing_profile.npz"
+
+METHOD_EMBEDDING = "embedding" # One domain clearly closest
+METHOD_AMBIGUOUS = "ambiguous" # Several domains within the margin: fan-out
+METHOD_LOW_SIMILARITY = "low_similarity" # Nothing close: fan-out to the top domains
+METHOD_DEFAULT = "default" # No domain profiles yet: the default domain
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _index_vectors(index, max_rows: int = ROUTER_PROFILE_SAMPLE_ROWS) -> np.ndarray:
+    """A sample of the index's chunk embeddings (MmapVectorStore, or SimpleVectorStore's embedding dict)."""
+    vector_store = getattr(index, 'vector_store', None)
+    if hasattr(vector_store, 'live_vectors'):
+        return vector_store.live_vectors(max_rows=max_rows)
+    embedding_dict = getattr(getattr(vector_store, 'data', None), 'embedding_dict', None) or {}
+    vectors = list(embedding_dict.values())
+    if len(vectors) > max_rows:
+        rows = np.random.default_rng(0).choice(len(vectors), max_rows, replace=False)
+        vectors = [vectors[row] for row in sorted(rows)]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def compute_routing_profile(vectors: np.ndarray, num_vectors: int = ROUTER_SUMMARY_VECTORS) -> Optional[np.ndarray]:
+    """Normalized k-means centroids summarizing a domain's chunk embeddings, or None for an empty index."""
+    if vectors.ndim != 2 or vectors.shape[0] == 0:
+        return None
+    return IVFIndex.train(vectors, nlist=min(num_vectors, vectors.shape[0])).centroids
+
+
+def read_routing_profile(persist_dir: str):
+    """(centroids, index_version) persisted for a domain, or (None, None)."""
+    try:
+        with np.load(os.path.join(persist_dir, ROUTING_PROFILE_FILENAME)) as data:
+            return _normalize_rows(data["centroids"]), str(data["index_version"])
+    except (IOError, ValueError, KeyError):
+        return None, None
+
+
+def load_or_build_routing_profile(index, persist_dir: str, index_version: Optional[str]) -> Optional[np.ndarray]:
+    """The domain's routing centroids: reused from disk while the index version matches, else recomputed and saved."""
+    centroids, persisted_version = read_routing_profile(persist_dir)
+    if centroids is not None and persisted_version == str(index_version or ""):
+        return centroids
+    centroids = compute_routing_profile(_index_vectors(index))
+    if centroids is not None and os.path.isdir(persist_dir):
+        path = os.path.join(persist_dir, ROUTING_PROFILE_FILENAME)
+        with open(path + ".tmp", 'wb') as f:
+            np.savez(f, centroids=centroids, index_version=np.array(str(index_version or "")))
+        os.replace(path + ".tmp", path)
+    return centroids
+
+
+class RoutingDecision:
+    """The domains chosen for a query (best first), every profiled domain's similarity, and the confidence."""
+    def __init__(self, domains: List[str], scores: Dict[str, float], confidence: float, method: str):
+        self.domains = domains
+        self.scores = scores
+        self.confidence = confidence
+        self.method = method
+
+    @property
+    def domain(self) -> str:
+        return self.domains[0]
+
+    @property
+    def fanout(self) -> bool:
+        return len(self.domains) > 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "domain": self.domain,
+            "domains": self.domains,
+            "method": self.method,
+            "confidence": round(self.confidence, 4),
+            "scores": {domain: round(score, 4) for domain, score in self.scores.items()},
+        }
+
+
+class DomainRouter:
+    """
+    Picks domains for a query by cosine similarity between its embedding and each domain's centroids.
+    Profiles are added as domains load (and read from disk at startup, so domains that have not
+    loaded yet can still be routed to).
+    """
+    def __init__(self, ambiguity_margin: float = ROUTER_AMBIGUITY_MARGIN, min_similarity: float = ROUTER_MIN_SIMILARITY,
+                 max_fanout: int = ROUTER_MAX_FANOUT, temperature: float = ROUTER_CONFIDENCE_TEMPERATURE):
+        self.ambiguity_margin = ambiguity_margin
+        self.min_similarity = min_similarity
+        self.max_fanout = max(1, max_fanout)
+        self.temperature = temperature
+        self._profiles: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def domains(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def set_profile(self, domain: str, centroids: Optional[np.ndarray]):
+        with self._lock:
+            if centroids is None:
+                self._profiles.pop(domain, None)
+            else:
+                self._profiles[domain] = _normalize_rows(centroids)
+
+    def load_profile(self, domain: str, persist_dir: str) -> bool:
+        centroids, _ = read_routing_profile(persist_dir)
+        if centroids is not None:
+            self.set_profile(domain, centroids)
+        return centroids is not None
+
+    def embed(self, embed_model, queries: Sequence[str]) -> np.ndarray:
+        """Normalized query embeddings, one row per query, in one batch."""
+        from embedding_backend import embed_queries # Imported lazily: pulls in the embedding backends
+        return _normalize_rows(embed_queries(embed_model, list(queries)))
+
+    def route(self, query_embedding: np.ndarray, domains: Sequence[str] = None, default_domain: str = None) -> RoutingDecision:
+        """Routes one normalized query embedding among `domains` (default: every profiled domain)."""
+        with self._lock:
+            profiles = {domain: centroids for domain, centroids in self._profiles.items() if domains is None or domain in domains}
+        if not profiles:
+            decision = RoutingDecision([default_domain], {}, 0.0, METHOD_DEFAULT)
+        else:
+            query_embedding = np.asarray(query_embedding, dtype=np.float32).ravel()
+            scores = {domain: float(np.max(centroids @ query_embedding)) for domain, centroids in profiles.items()}
+            ranked = sorted(scores, key=scores.get, reverse=True)
+            best = scores[ranked[0]]
+            values = np.array([scores[domain] for domain in ranked], dtype=np.float64)
+            weights = np.exp((values - best) / self.temperature)
+            confidence = float(weights[0] / weights.sum())
+            if best < self.min_similarity:
+                chosen, method = ranked[:self.max_fanout], METHOD_LOW_SIMILARITY
+            else:
+                chosen = [domain for domain in ranked if best - scores[domain] <= self.ambiguity_margin][:self.max_fanout]
+                method = METHOD_AMBIGUOUS if len(chosen) > 1 else METHOD_EMBEDDING
+            decision = RoutingDecision(chosen, dict((domain, scores[domain]) for domain in ranked), confidence, method)
+        REGISTRY.inc("domain_routing_total", help="Auto-routed queries by chosen domain and routing method", domain=decision.domain, method=decision.method)
+        return decision
+
+    def route_queries(self, embed_model, queries: Sequence[str], domains: Sequence[str] = None, default_domain: str = None):
+        """Embeds the queries in one batch and routes each; returns [(decision, query_embedding)]."""
+        if not self.domains:
+            return [(self.route(None, domains, default_domain), None) for _ in queries]
+        with span("routing"):
+            embeddings = self.embed(embed_model, queries)
+            return [(self.route(embedding, domains, default_domain), embedding) for embedding in embeddings]
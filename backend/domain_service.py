@@ -0,0 +1,486 @@
+import os
+import sys
+import asyncio
+import argparse
+import threading
+import nest_asyncio
+from flask import Flask, request, jsonify
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Import shared settings and utilities: one LLM client and one embedding model serve every domain
+from common_settings import LLM, BASE_LLM, PDF_PARSER, Settings # PDF_PARSER might be None
+from chunking import build_node_parser
+from domain_config import DomainConfig, get_domains_config
+from index_utils import INDEX_SCAN_RECURSIVE, manage_index, get_index_version, persist_dir_lock #
+from file_scanner import data_dir_has_files, fingerprint_data_dir
+from domain_loader import DomainEmptyError
+from retrievers import MultiQueryFusionRetriever, reciprocal_rank_fusion, retrieve_for_queries, aretrieve_for_queries, retrieve_across, aretrieve_across
+from retrieval_planner import RetrievalPlan, RetrievalPlanner
+from speculative_retrieval import Speculation, SpeculativeRetriever
+from context_packing import ContextPacker
+from domain_router import load_or_build_routing_profile
+from batch_chat import BATCH_MAX_CONCURRENCY, run_batch
+from llm_scheduler import LLMOverloadedError
+from request_context import record_llm_call, current_llm_calls
+from metrics import span, record_token_usage
+from llama_index.core.query_engine import BaseQueryEngine, RetrieverQueryEngine
+from llama_index.core.retrievers import VectorIndexRetriever
+from bm25_index import SparseBM25Retriever, load_or_build_bm25_index
+
+nest_asyncio.apply()
+
+History = List[Dict[str, str]]
+
+
+def build_query_engine(config: DomainConfig, progress: Callable[[str], None] = None):
+    """
+    Loads (or builds/updates) the domain's index and wraps it in the hybrid query engine: the configured
+    retrievers (vector and/or BM25) fused by reciprocal rank. Returns (index, query_engine).
+    """
+    progress = progress or (lambda stage: None)
+    progress("loading_index")
+    print(f"--- Initializing {config.label} Index for {config.index_name} ---")
+    index = manage_index(
+        config.index_name,
+        config.persist_dir,
+        config.data_dir,
+        doc_parser_instance=PDF_PARSER,
+        node_parser_for_build=build_node_parser(config.chunking_config), # Per-domain chunking strategy
+        vector_index_config=config.vector_index_config
+    )
+    if not index:
+        print(f"CRITICAL: {config.label} index for {config.index_name} could not be initialized. {config.label} service will not be functional.")
+        return None, None
+
+    progress("building_retrievers")
+    print(f"Initializing Hybrid Query Engine for {config.index_name}...")
+    try:
+        retrievers = []
+        if "vector" in config.retrievers:
+            retrievers.append(VectorIndexRetriever(index=index, similarity_top_k=config.similarity_top_k))
+        if "bm25" in config.retrievers:
+            # The persisted sparse BM25 index is kept in step with the docstore by manage_index
+            bm25_index = load_or_build_bm25_index(config.persist_dir, index.docstore)
+            if bm25_index.num_docs == 0:
+                print(f"Warning: No nodes found in the {config.label} docstore. BM25Retriever might be ineffective.")
+            else:
+                print(f"BM25 index ready with {bm25_index.num_docs} nodes for {config.index_name}.")
+                retrievers.append(SparseBM25Retriever(bm25_index, docstore=index.docstore, similarity_top_k=config.similarity_top_k))
+        if not retrievers:
+            # Fallback to default vector search if nodes are not available for BM25
+            query_engine = index.as_query_engine(similarity_top_k=config.similarity_top_k, llm=BASE_LLM) #
+            print(f"{config.label} Query Engine (Fell back to Default Vector Search) for {config.index_name} initialized.") #
+            return index, query_engine
+
+        # The agent's RetrievalPlanner supplies the refined query and its variants in one LLM call;
+        # every (query, retriever) pair runs concurrently on the shared fusion pool and results are fused by reciprocal rank
+        fusion_options = {"rrf_k": config.rrf_k} if config.rrf_k else {}
+        query_fusion_retriever = MultiQueryFusionRetriever(
+            retrievers=retrievers,
+            similarity_top_k=config.fusion_top_k, # Top k results after fusion
+            embed_model=Settings.embed_model, # Used by speculative retrieval to compare raw and refined queries
+            **fusion_options,
+        )
+        # Simpler way relying on global Settings from common_settings.py
+        query_engine = RetrieverQueryEngine.from_args(query_fusion_retriever)
+        print(f"{config.label} Query Engine (Hybrid - MultiQueryFusion) for {config.index_name} initialized.")
+    except Exception as e:
+        print(f"Error initializing Hybrid Query Engine for {config.index_name}: {e}. Falling back to default vector search.")
+        query_engine = index.as_query_engine(similarity_top_k=config.similarity_top_k, llm=BASE_LLM) #
+        print(f"{config.label} Query Engine (Default Vector Search after error) for {config.index_name} initialized.") #
+    return index, query_engine
+
+
+# --- Simplified ReActAgent (Stateless per request; history, if any, comes with the request) ---
+class DomainAgent: #
+    def __init__(self, query_engine: BaseQueryEngine, llm, config: DomainConfig, verbose: bool = False): #
+        if query_engine is None:
+            raise ValueError(f"Query engine must be provided and initialized for the {config.label} agent.")
+        self.query_engine = query_engine
+        self.llm = llm
+        self.config = config
+        self.label = config.label
+        self.system_prompt = config.system_prompt
+        self.verbose = verbose
+        self.tool_name = config.tool_name
+        self.tool_description = config.tool_description
+        self.planner = RetrievalPlanner(llm, verbose=verbose)
+        self.speculator = SpeculativeRetriever.for_query_engine(query_engine) # None unless SPECULATIVE_RETRIEVAL is on
+        self.context_packer = ContextPacker()
+        if self.verbose: print(f"ReActAgent for {self.tool_name} initialized. Verbose: {self.verbose}")
+
+    def _render(self, template: str, **values) -> str:
+        return template.format(**self.config.prompt_values(), **values)
+
+    def _format_history_for_prompt(self, current_history: Optional[History]) -> str: # Accept history
+        if not current_history:
+            return self.config.no_history_text #
+        return "\n".join([f"{item['role'].capitalize()}: {item['content']}" for item in current_history]) #
+
+    def _think(self, user_input: str, history_str: str) -> str: #
+        thought = f"{self.label} Agent Thought: User asked: '{user_input}'. History: '{history_str.splitlines()[0] if history_str else 'None'}'. Formulating query for {self.tool_name}." #
+        if self.verbose: print(thought)
+        return thought
+
+    def _build_plan_prompt(self, user_input: str, history_str: str) -> str:
+        return self._render(self.config.plan_prompt, user_input=user_input, history=history_str,
+                            format_instructions=self.planner.format_instructions())
+
+    def _plan_retrieval(self, user_input: str, history_str: str, has_history: bool) -> RetrievalPlan: #
+        """
+        Refines the user input (and history) into a search query plus variants for fusion, in a single
+        LLM call (or none for keyword-like input when the planner allows it).
+        """
+        if self.planner.should_skip_llm(user_input, has_history=has_history):
+            return self.planner.direct_plan(user_input)
+        return self.planner.plan(user_input, self._build_plan_prompt(user_input, history_str))
+
+    async def _aplan_retrieval(self, user_input: str, history_str: str, has_history: bool) -> RetrievalPlan:
+        if self.planner.should_skip_llm(user_input, has_history=has_history):
+            return self.planner.direct_plan(user_input)
+        return await self.planner.aplan(user_input, self._build_plan_prompt(user_input, history_str))
+
+    def _start_speculation(self, user_input: str, has_history: bool, use_async: bool = False,
+                           peer_query_engines: Sequence = ()) -> Optional[Speculation]:
+        """Starts retrieval on the raw input to overlap with the planning LLM call (only when one will be made)."""
+        if self.speculator is None or peer_query_engines or self.planner.should_skip_llm(user_input, has_history=has_history):
+            return None
+        return self.speculator.astart(user_input) if use_async else self.speculator.start(user_input)
+
+    def _merge_peer_results(self, result_lists: List[list]) -> list:
+        # Each domain's fused list is ranked on its own; rank fusion interleaves them into one list of the usual size
+        return reciprocal_rank_fusion(result_lists, self.config.fusion_top_k)
+
+    def _use_tool(self, retrieval_plan: RetrievalPlan, speculation: Optional[Speculation] = None,
+                  peer_query_engines: Sequence = ()) -> Tuple[str, List[str]]: #
+        if self.verbose: print(f"{self.label} Agent: Using tool '{self.tool_name}' with queries: {retrieval_plan.queries}") #
+        # Retrieval only: the agent synthesizes the answer itself in _llm_answer, so query()'s own synthesis would be wasted LLM work
+        with span("retrieval"):
+            if peer_query_engines:
+                source_nodes = self._merge_peer_results(retrieve_across([self.query_engine, *peer_query_engines], retrieval_plan.retrieval_queries()))
+            elif speculation is not None:
+                source_nodes = self.speculator.finish(speculation, retrieval_plan)
+            else:
+                source_nodes = retrieve_for_queries(self.query_engine, retrieval_plan.retrieval_queries())
+        return self._summarize_tool_results(source_nodes)
+
+    async def _ause_tool(self, retrieval_plan: RetrievalPlan, speculation: Optional[Speculation] = None,
+                         peer_query_engines: Sequence = ()) -> Tuple[str, List[str]]:
+        if self.verbose: print(f"{self.label} Agent: Using tool '{self.tool_name}' (async) with queries: {retrieval_plan.queries}") #
+        with span("retrieval"):
+            if peer_query_engines:
+                source_nodes = self._merge_peer_results(await aretrieve_across([self.query_engine, *peer_query_engines], retrieval_plan.retrieval_queries()))
+            elif speculation is not None:
+                source_nodes = await self.speculator.afinish(speculation, retrieval_plan)
+            else:
+                source_nodes = await aretrieve_for_queries(self.query_engine, retrieval_plan.retrieval_queries())
+        return self._summarize_tool_results(source_nodes)
+
+    def _source_identifier(self, node) -> Optional[str]:
+        node_id = getattr(node, 'node_id', getattr(node, 'id_', None)) #
+        if self.config.source_format == "node_id":
+            return str(node_id) if node_id else None
+        file_name = getattr(node, 'metadata', {}).get('file_name', "Unknown File") #
+        return f"Node: {node_id or 'Unknown Node'} (Source: {file_name})" #
+
+    def _summarize_tool_results(self, source_nodes) -> Tuple[str, List[str]]:
+        # Overlapping chunks are merged, near-duplicates dropped and the rest fitted to the token budget
+        packed_context = self.context_packer.pack(source_nodes)
+        source_identifiers = [identifier for identifier in (self._source_identifier(n.node) for n in packed_context.source_nodes) if identifier]
+        tool_finding_summary = packed_context.text or "No information found by the tool for the query." #
+        if self.verbose: print(f"{self.label} Context packing: {packed_context.to_dict()}")
+        if self.verbose: print(f"{self.label} Tool Findings Summary (first 200 chars): {tool_finding_summary[:200]}...") #
+        return tool_finding_summary, list(set(source_identifiers)) # Unique source identifiers
+
+    def _build_answer_prompt(self, user_input: str, history_str: str, tool_context: str) -> str:
+        return self._render(self.config.answer_prompt, user_input=user_input, history=history_str, tool_context=tool_context)
+
+    def _llm_answer(self, user_input: str, history_str: str, tool_context: str) -> str: #
+        prompt = self._build_answer_prompt(user_input, history_str, tool_context)
+        record_llm_call("answer")
+        with span("synthesis"):
+            response_object = self.llm.complete(prompt)
+        record_token_usage("answer", prompt, response_object)
+        return self._parse_answer(response_object)
+
+    async def _allm_answer(self, user_input: str, history_str: str, tool_context: str) -> str:
+        prompt = self._build_answer_prompt(user_input, history_str, tool_context)
+        record_llm_call("answer")
+        with span("synthesis"):
+            response_object = await self.llm.acomplete(prompt)
+        record_token_usage("answer", prompt, response_object)
+        return self._parse_answer(response_object)
+
+    def _parse_answer(self, response_object) -> str:
+        final_answer = self.config.fallback_answer #
+        if hasattr(response_object, 'text'): final_answer = response_object.text.strip() #
+        elif isinstance(response_object, str): final_answer = response_object.strip() #
+        if self.verbose: print(f"{self.label} LLM Synthesized Answer: {final_answer}") #
+        return final_answer
+
+    def plan_query(self, user_input: str) -> RetrievalPlan:
+        """Retrieval plan for a history-free request, computed ahead of chat() (batch chat plans all items first)."""
+        return self._plan_retrieval(user_input, self._format_history_for_prompt(None), False)
+
+    def chat(self, user_input: str, current_request_history: Optional[History] = None,
+             retrieval_plan: Optional[RetrievalPlan] = None, peer_query_engines: Sequence = ()) -> str: #
+        """
+        Plans, retrieves and answers. With peer_query_engines (other domains' engines, for an ambiguous
+        auto-routed query) retrieval runs against all of them in parallel and this agent synthesizes once.
+        """
+        history_str = self._format_history_for_prompt(current_request_history) #
+        self._think(user_input, history_str) #
+
+        speculation = None
+        if retrieval_plan is None:
+            speculation = self._start_speculation(user_input, bool(current_request_history), peer_query_engines=peer_query_engines)
+            try:
+                retrieval_plan = self._plan_retrieval(user_input, history_str, bool(current_request_history)) #
+            except BaseException:
+                if speculation is not None: speculation.cancel() # e.g. shed by the LLM scheduler: nobody will read it
+                raise
+        tool_result_text, source_identifiers = self._use_tool(retrieval_plan, speculation, peer_query_engines) #
+        return self._llm_answer(user_input, history_str, tool_result_text) #
+
+    async def achat(self, user_input: str, current_request_history: Optional[History] = None, peer_query_engines: Sequence = ()) -> str:
+        """Non-blocking chat(): LLM calls use acomplete and retrieval runs the fusion sub-queries concurrently."""
+        history_str = self._format_history_for_prompt(current_request_history) #
+        self._think(user_input, history_str) #
+
+        speculation = self._start_speculation(user_input, bool(current_request_history), use_async=True, peer_query_engines=peer_query_engines)
+        try:
+            retrieval_plan = await self._aplan_retrieval(user_input, history_str, bool(current_request_history)) #
+        except BaseException:
+            if speculation is not None: speculation.cancel()
+            raise
+        tool_result_text, source_identifiers = await self._ause_tool(retrieval_plan, speculation, peer_query_engines) #
+        return await self._allm_answer(user_input, history_str, tool_result_text) #
+
+    def _stream_llm_answer(self, user_input: str, history_str: str, tool_context: str) -> Iterator[str]:
+        """Yields answer text deltas from the LLM's streaming completion."""
+        prompt = self._build_answer_prompt(user_input, history_str, tool_context)
+        record_llm_call("answer")
+        answer_parts = []
+        with span("synthesis"): # Includes the time the client takes to consume the stream
+            for response_chunk in self.llm.stream_complete(prompt):
+                delta = getattr(response_chunk, 'delta', None)
+                if delta:
+                    answer_parts.append(delta)
+                    yield delta
+        record_token_usage("answer", prompt, completion_text="".join(answer_parts))
+
+    def stream_chat(self, user_input: str, current_request_history: Optional[History] = None, peer_query_engines: Sequence = ()) -> Iterator[Dict]:
+        """
+        Same pipeline as chat(), but yields progress events as each stage starts and
+        then the answer tokens as the LLM produces them.
+        """
+        history_str = self._format_history_for_prompt(current_request_history) #
+        self._think(user_input, history_str) #
+        yield {"event": "stage", "stage": "refining"}
+        speculation = self._start_speculation(user_input, bool(current_request_history), peer_query_engines=peer_query_engines)
+        try:
+            retrieval_plan = self._plan_retrieval(user_input, history_str, bool(current_request_history)) #
+        except BaseException:
+            if speculation is not None: speculation.cancel()
+            raise
+        yield {"event": "stage", "stage": "retrieving", "query": retrieval_plan.query, "variants": retrieval_plan.variants, "speculative": speculation is not None}
+        tool_result_text, source_identifiers = self._use_tool(retrieval_plan, speculation, peer_query_engines) #
+        yield {"event": "sources", "count": len(source_identifiers), "sources": source_identifiers}
+        yield {"event": "stage", "stage": "answering"}
+
+        answer_parts = []
+        for delta in self._stream_llm_answer(user_input, history_str, tool_result_text):
+            answer_parts.append(delta)
+            yield {"event": "token", "text": delta}
+        final_answer = "".join(answer_parts).strip() or self.config.fallback_answer
+        if self.verbose: print(f"{self.label} LLM Streamed Answer: {final_answer}") #
+        yield {"event": "done", "response": final_answer}
+
+
+# --- Domain Service Class ---
+class DomainService: #
+    """
+    One domain's index, query engine and agent, built from its DomainConfig. reload() ingests data_dir
+    changes into a newly built engine and agent and swaps them in without interrupting requests.
+    """
+    def __init__(self, config: DomainConfig, answer_cache=None, progress: Callable[[str], None] = None): #
+        self.config = config
+        self.CACHE_DOMAIN = config.name
+        self._reload_lock = threading.Lock()
+        self.index, self.agent, self.routing_profile, self.index_version, self.data_fingerprint = self._build(progress)
+        self.answer_cache = answer_cache
+        if self.answer_cache is not None:
+            self.answer_cache.register_domain(self.CACHE_DOMAIN, config.persist_dir)
+
+    def _build(self, progress: Callable[[str], None] = None):
+        """Loads the index (ingesting new, changed and removed files) and builds its engine, agent and routing profile."""
+        config = self.config
+        # Taken before ingestion, so files that change while it runs are picked up by the next reload
+        data_fingerprint = fingerprint_data_dir(config.data_dir, INDEX_SCAN_RECURSIVE)
+        if not data_dir_has_files(config.data_dir, INDEX_SCAN_RECURSIVE):
+            raise DomainEmptyError(config.name, config.data_dir) # Not a failure: nothing to serve until files are added
+        with persist_dir_lock(config.persist_dir): # Server workers share the persist dir; one ingests at a time
+            index, query_engine = build_query_engine(config, progress)
+            if query_engine is None:
+                raise ValueError(f"{config.label} Query Engine is not initialized. Cannot create the {config.label} service.")
+            index_version = get_index_version(config.persist_dir)
+            routing_profile = None # Centroids of the index's embeddings, for auto domain routing
+            try:
+                if progress: progress("building_routing_profile")
+                routing_profile = load_or_build_routing_profile(index, config.persist_dir, index_version)
+            except Exception as e:
+                print(f"Warning: Could not build the routing profile for {config.index_name}: {e}. Auto routing will skip this domain.")
+        agent = DomainAgent(query_engine=query_engine, llm=LLM, config=config, verbose=config.verbose) #
+        return index, agent, routing_profile, index_version, data_fingerprint
+
+    def data_changed(self) -> bool:
+        """True when files in data_dir were added, modified or removed since the serving index was built."""
+        return fingerprint_data_dir(self.config.data_dir, INDEX_SCAN_RECURSIVE) != self.data_fingerprint
+
+    def reload(self, force: bool = False, progress: Callable[[str], None] = None) -> bool:
+        """
+        Incrementally ingests data_dir changes and atomically swaps in the rebuilt engine and agent.
+        Requests already running finish on the agent they started with. Returns False, keeping the
+        current engine, when nothing changed (force=True runs ingestion even if the file listing did not).
+        """
+        with self._reload_lock:
+            if not force and not self.data_changed():
+                return False
+            index, agent, routing_profile, index_version, data_fingerprint = self._build(progress)
+            self.data_fingerprint = data_fingerprint
+            if index_version == self.index_version:
+                return False # e.g. only mtimes changed: the new engine would serve the same index
+            self.index, self.routing_profile, self.index_version = index, routing_profile, index_version
+            self.agent = agent # The swap: requests read self.agent once, so each runs wholly on one engine
+            if self.answer_cache is not None:
+                self.answer_cache.clear(self.CACHE_DOMAIN) # Answers from the previous index are stale
+                self.answer_cache.register_domain(self.CACHE_DOMAIN, self.config.persist_dir)
+            print(f"{self.config.label} index reloaded; now serving version {index_version}.")
+            return True
+
+    def _error_message(self, e: Exception) -> str:
+        return f"Sorry, I encountered an error while processing your {self.config.label} query: {str(e)}"
+
+    def _peer_query_engines(self, peers: Optional[Sequence["DomainService"]]) -> list:
+        return [peer.agent.query_engine for peer in (peers or []) if peer is not self]
+
+    def process_query(self, query: str, history: Optional[History] = None,
+                      query_embedding=None, peers: Optional[Sequence["DomainService"]] = None) -> str: #
+        """
+        Answers a query from this domain. query_embedding (normalized, e.g. from the domain router) saves
+        the answer cache embedding the query again; peers are further domains whose retrieval is merged
+        into this one's for an ambiguous auto-routed query.
+        """
+        try:
+            # Answers that depend on conversation history or on other domains' documents are not cacheable
+            use_cache = self.answer_cache is not None and not history and not peers
+            if use_cache:
+                with span("answer_cache_lookup"):
+                    cached_answer, query_embedding = self.answer_cache.lookup(self.CACHE_DOMAIN, query, query_embedding)
+                if cached_answer is not None:
+                    print(f"{self.config.label} answer cache hit for query: {query}")
+                    return cached_answer
+            answer = self.agent.chat(query, current_request_history=history, peer_query_engines=self._peer_query_engines(peers)) #
+            if use_cache:
+                self.answer_cache.store(self.CACHE_DOMAIN, query, answer, query_embedding=query_embedding, llm_calls=current_llm_calls())
+            return answer
+        except LLMOverloadedError:
+            raise # Surfaced to the client as 503 + Retry-After rather than an apology string
+        except Exception as e:
+            print(f"Error processing {self.config.label} query: {str(e)}")
+            return self._error_message(e)
+
+    async def aprocess_query(self, query: str, history: Optional[History] = None,
+                             query_embedding=None, peers: Optional[Sequence["DomainService"]] = None) -> str:
+        """Async counterpart of process_query for the ASGI entry point."""
+        try:
+            use_cache = self.answer_cache is not None and not history and not peers
+            if use_cache:
+                # Cache lookup embeds the query on CPU; keep it off the event loop
+                with span("answer_cache_lookup"):
+                    cached_answer, query_embedding = await asyncio.to_thread(self.answer_cache.lookup, self.CACHE_DOMAIN, query, query_embedding)
+                if cached_answer is not None:
+                    print(f"{self.config.label} answer cache hit for query: {query}")
+                    return cached_answer
+            answer = await self.agent.achat(query, current_request_history=history, peer_query_engines=self._peer_query_engines(peers))
+            if use_cache:
+                self.answer_cache.store(self.CACHE_DOMAIN, query, answer, query_embedding=query_embedding, llm_calls=current_llm_calls())
+            return answer
+        except LLMOverloadedError:
+            raise # Surfaced to the client as 503 + Retry-After rather than an apology string
+        except Exception as e:
+            print(f"Error processing {self.config.label} query: {str(e)}")
+            return self._error_message(e)
+
+    def iter_batch(self, queries: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> Iterator[Dict]:
+        """
+        Answers many independent queries: duplicates are answered once, cache lookups and query
+        embeddings are batched, and at most `max_concurrency` items run at a time.
+        Yields {"index", "query", "response" | "error", "cached"} per input, in completion order.
+        """
+        return run_batch(self, queries, max_concurrency)
+
+    def process_batch(self, queries: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> List[Dict]:
+        """iter_batch() collected into input order."""
+        return sorted(self.iter_batch(queries, max_concurrency), key=lambda result: result["index"])
+
+    def stream_query(self, query: str, history: Optional[History] = None,
+                     query_embedding=None, peers: Optional[Sequence["DomainService"]] = None) -> Iterator[Dict]:
+        """Streaming counterpart of process_query; yields the agent's stage/token events."""
+        try:
+            use_cache = self.answer_cache is not None and not history and not peers
+            if use_cache:
+                with span("answer_cache_lookup"):
+                    cached_answer, query_embedding = self.answer_cache.lookup(self.CACHE_DOMAIN, query, query_embedding)
+                if cached_answer is not None:
+                    print(f"{self.config.label} answer cache hit for query: {query}")
+                    yield {"event": "token", "text": cached_answer}
+                    yield {"event": "done", "response": cached_answer, "cached": True}
+                    return
+            for event in self.agent.stream_chat(query, current_request_history=history, peer_query_engines=self._peer_query_engines(peers)):
+                if event["event"] == "done" and use_cache:
+                    self.answer_cache.store(self.CACHE_DOMAIN, query, event["response"], query_embedding=query_embedding, llm_calls=current_llm_calls())
+                yield event
+        except LLMOverloadedError as e:
+            yield {"event": "error", "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"Error streaming {self.config.label} query: {str(e)}")
+            yield {"event": "error", "error": self._error_message(e)}
+
+
+# --- Flask App for a single domain (python domain_service.py <domain>), for testing one service on its own ---
+_app_domain_service_local = Flask(__name__)
+
+_domain_service_local_instance = None # Created only when this module is run directly; app.py loads services through its DomainLoader
+
+@_app_domain_service_local.route('/chat', methods=['POST'])
+def chat_domain_local():
+    if not _domain_service_local_instance:
+        return jsonify({"error": "Chatbot service is not available due to an initialization issue."}), 503 #
+
+    data = request.json or {}
+    user_input = data.get('user_input') #
+    if not user_input:
+        return jsonify({"error": "user_input is required"}), 400 #
+
+    response = _domain_service_local_instance.process_query(user_input, history=data.get('history')) #
+    return jsonify({"response": response}) #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve one configured domain on its own.")
+    parser.add_argument("domain", nargs="?", help="Domain name from the domains config (default: its default_domain)")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5001")))
+    args = parser.parse_args()
+    domains_config = get_domains_config()
+    domain = (args.domain or domains_config.default_domain).lower()
+    if domain not in domains_config.domains:
+        sys.exit(f"Unknown domain '{domain}'; configured: {', '.join(domains_config.domains)}")
+    try:
+        _domain_service_local_instance = DomainService(domains_config.domains[domain]) #
+    except ValueError as e:
+        print(f"{domain} service instance could not be created: {e}") #
+    if _domain_service_local_instance:
+        print(f"{domain} Service Ready: Running Flask app on port {args.port} (domain_service.py direct run)")
+        _app_domain_service_local.run(host='0.0.0.0', port=args.port, debug=False)
+    else:
+        print(f"{domain} Service cannot start as the service instance is not initialized (likely due to query engine failure).") #
@@ -0,0 +1,106 @@
+import os
+import atexit
+import threading
+from typing import Any, List, Optional
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+# Embedding backend selection. The defaults reproduce the original bge-large / PyTorch setup,
+# so existing indexes and embedding caches stay valid unless a setting is changed on purpose.
+DEFAULT_EMBEDDING_CONFIG = {
+    "model_name": os.getenv("EMBED_MODEL_NAME", "BAAI/bge-large-en-v1.5"),
+    "backend": os.getenv("EMBED_BACKEND", "torch"), # torch | onnx | openvino (sentence-transformers backends)
+    "onnx_file": os.getenv("EMBED_ONNX_FILE", ""), # e.g. onnx/model_qint8_avx512_vnni.onnx for a quantized export
+    "device": os.getenv("EMBED_DEVICE", "cpu"),
+    "batch_size": int(os.getenv("EMBED_BATCH_SIZE", "32")),
+    "num_processes": int(os.getenv("EMBED_NUM_PROCESSES", "1")), # >1 encodes large ingestion batches in worker processes
+    "torch_threads": int(os.getenv("EMBED_TORCH_THREADS", "0")), # 0 keeps PyTorch's default intra-op thread count
+}
+POOL_MIN_BATCH = int(os.getenv("EMBED_POOL_MIN_BATCH", "64")) # Smaller batches (e.g. queries) stay in-process
+
+
+class ConfigurableHuggingFaceEmbedding(HuggingFaceEmbedding):
+    """
+    HuggingFaceEmbedding that can encode large batches on a persistent multi-process pool.
+    The pool starts on the first large batch and is reused, unlike parallel_process=True which
+    starts and stops a pool on every call. Query embeddings always run in-process.
+    cache_namespace identifies the vectors this configuration produces (see EmbeddingCache).
+    """
+    cache_namespace: str = ""
+    num_processes: int = 1
+
+    _pool: Any = PrivateAttr(default=None)
+    _pool_lock: Any = PrivateAttr(default=None)
+
+    def __init__(self, cache_namespace: str = "", num_processes: int = 1, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_namespace = cache_namespace or self.model_name
+        self.num_processes = num_processes
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                print(f"Starting {self.num_processes} embedding worker process(es) for {self.model_name}...")
+                self._pool = self._model.start_multi_process_pool(target_devices=[str(self._model.device)] * self.num_processes)
+                atexit.register(self.close_pool)
+            return self._pool
+
+    def close_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def _embed(self, sentences: List[str], prompt_name: Optional[str] = None, **kwargs) -> List[List[float]]:
+        if self.num_processes > 1 and len(sentences) >= POOL_MIN_BATCH:
+            embeddings = self._model.encode_multi_process(
+                sentences, pool=self._get_pool(), batch_size=self.embed_batch_size,
+                prompt_name=prompt_name, normalize_embeddings=self.normalize
+            )
+            return embeddings.tolist()
+        return super()._embed(sentences, prompt_name=prompt_name, **kwargs)
+
+
+def build_embed_model(config: dict = None) -> HuggingFaceEmbedding:
+    """
+    Builds the embedding model from DEFAULT_EMBEDDING_CONFIG, overridden by `config`.
+    The onnx/openvino backends run through sentence-transformers' CPU runtimes; `onnx_file` selects a
+    specific (e.g. int8 quantized) export from the model repository.
+    """
+    settings = {**DEFAULT_EMBEDDING_CONFIG, **(config or {})}
+    backend = settings["backend"]
+
+    if settings["torch_threads"] > 0:
+        import torch
+        torch.set_num_threads(settings["torch_threads"])
+
+    model_kwargs = {}
+    cache_namespace = settings["model_name"]
+    if backend != "torch":
+        model_kwargs["backend"] = backend
+        if settings["onnx_file"]:
+            model_kwargs["model_kwargs"] = {"file_name": settings["onnx_file"]}
+        # Different runtimes/quantization give slightly different vectors: keep their cache entries apart
+        cache_namespace = f"{settings['model_name']}@{backend}:{settings['onnx_file'] or 'default'}"
+
+    return ConfigurableHuggingFaceEmbedding(
+        model_name=settings["model_name"],
+        device=settings["device"],
+        embed_batch_size=settings["batch_size"],
+        cache_namespace=cache_namespace,
+        num_processes=settings["num_processes"],
+        **model_kwargs
+    )
+
+
+def embed_queries(embed_model, queries: List[str]) -> List[List[float]]:
+    """
+    Query embeddings for many queries. HuggingFace models encode them in one batched forward pass
+    (with the model's query prompt, as get_query_embedding does); other models embed one at a time.
+    """
+    if isinstance(embed_model, HuggingFaceEmbedding):
+        return embed_model._embed(list(queries), prompt_name="query")
+    return [embed_model.get_query_embedding(query) for query in queries]
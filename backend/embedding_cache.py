@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, List, Sequence
+
+from llama_index.core.schema import BaseNode, MetadataMode
+
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite"
+_SQLITE_MAX_VARIABLES = 500 # Keep IN (...) lookups below SQLite's bound-parameter limit
+
+
+def get_embed_model_name(embed_model) -> str:
+    """Best-effort stable identifier for an embedding model, used as part of the cache key."""
+    return getattr(embed_model, "cache_namespace", None) or getattr(embed_model, "model_name", None) or type(embed_model).__name__
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of chunk embeddings.
+    Keys are sha256(model name + chunk text), so identical text is only ever embedded once per model,
+    across rebuilds, corrupt-load fallbacks and re-processed files.
+    """
+    def __init__(self, cache_path: str, embed_model, batch_size: int = 64):
+        self.cache_path = cache_path
+        self.embed_model = embed_model
+        self.model_name = get_embed_model_name(embed_model)
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    @classmethod
+    def for_persist_dir(cls, persist_dir: str, embed_model, **kwargs) -> "EmbeddingCache":
+        return cls(os.path.join(persist_dir, EMBEDDING_CACHE_FILENAME), embed_model, **kwargs)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), _SQLITE_MAX_VARIABLES):
+                batch = unique_keys[start:start + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def embed_texts(self, texts: Sequence[str], show_progress: bool = False) -> List[List[float]]:
+        """Returns embeddings for texts, only running the model on text not seen before."""
+        keys = [self._key(text) for text in texts]
+        cached = self.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing.keys())
+            new_vectors: Dict[str, List[float]] = {}
+            for start in range(0, len(missing_keys), self.batch_size):
+                batch_keys = missing_keys[start:start + self.batch_size]
+                vectors = self.embed_model.get_text_embedding_batch(
+                    [missing[key] for key in batch_keys], show_progress=show_progress
+                )
+                new_vectors.update(zip(batch_keys, vectors))
+                self.put_many(dict(zip(batch_keys, vectors))) # Persist per batch so an interrupted build keeps its work
+            cached.update(new_vectors)
+
+        return [cached[key] for key in keys]
+
+    def embed_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False) -> Sequence[BaseNode]:
+        """
+        Fills node.embedding from the cache (embedding only unseen chunks). VectorStoreIndex skips
+        its own embedding step for nodes that already carry an embedding.
+        """
+        nodes_to_embed = [node for node in nodes if node.embedding is None]
+        if nodes_to_embed:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes_to_embed]
+            for node, embedding in zip(nodes_to_embed, self.embed_texts(texts, show_progress=show_progress)):
+                node.embedding = embedding
+        return nodes
+
+    def prune(self, keep_texts: Sequence[str]) -> int:
+        """Deletes cached vectors for text no longer in the index and reclaims the file space."""
+        keep_keys = {self._key(text) for text in keep_texts}
+        with self._lock:
+            stale_keys = [key for (key,) in self._conn.execute("SELECT key FROM embeddings") if key not in keep_keys]
+            for start in range(0, len(stale_keys), _SQLITE_MAX_VARIABLES):
+                batch = stale_keys[start:start + _SQLITE_MAX_VARIABLES]
+                self._conn.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        return len(stale_keys)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,129 @@
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+HASH_CHUNK_BYTES = int(os.getenv("SCAN_HASH_CHUNK_BYTES", str(1024 * 1024))) # Read size per hash update; bounds memory per file
+SCAN_HASH_WORKERS = int(os.getenv("SCAN_HASH_WORKERS", "4")) # Files hashed concurrently (hashlib releases the GIL on large updates)
+
+
+def hash_file(file_path: str, chunk_bytes: int = HASH_CHUNK_BYTES) -> Tuple[str, int]:
+    """Streams a file through MD5 in fixed-size chunks. Returns (hexdigest, bytes_read)."""
+    hasher = hashlib.md5()
+    bytes_read = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            bytes_read += len(chunk)
+    return hasher.hexdigest(), bytes_read
+
+
+class ScanResult:
+    """
+    Outcome of scanning a data directory against previously processed file metadata.
+    Keys are paths relative to the data directory using '/' separators; top-level files keep their
+    bare filename, so metadata written before recursive scanning stays valid.
+    """
+    def __init__(self):
+        self.files: Dict[str, Dict] = {} # key -> {'hash', 'mtime', 'size'} for every readable file
+        self.changed: List[str] = [] # New files, or files whose content hash differs from the stored one
+        self.touched: List[str] = [] # Size/mtime changed but content is identical; only metadata needs refreshing
+        self.removed: List[str] = [] # Previously processed files no longer present
+        self.stats = {"files_seen": 0, "files_hashed": 0, "bytes_read": 0, "elapsed_seconds": 0.0}
+
+    def path_for(self, data_dir: str, key: str) -> str:
+        return os.path.join(data_dir, *key.split('/'))
+
+
+def _list_files(data_dir: str, recursive: bool) -> Dict[str, os.stat_result]:
+    found = {}
+    if recursive:
+        for root, dirs, files in os.walk(data_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, data_dir).replace(os.sep, '/')
+                found[key] = os.stat(path)
+    else:
+        with os.scandir(data_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_file():
+                    found[entry.name] = entry.stat()
+    return found
+
+
+def fingerprint_data_dir(data_dir: str, recursive: bool = False) -> Optional[str]:
+    """
+    Signature of a data directory from stat() alone (path, size and mtime of every file): it changes
+    when a file is added, removed or modified, and costs no reads. None if the directory is missing.
+    """
+    try:
+        stats_by_key = _list_files(data_dir, recursive)
+    except FileNotFoundError:
+        return None
+    digest = hashlib.sha256()
+    for key, stat in stats_by_key.items():
+        digest.update(f"{key}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def data_dir_has_files(data_dir: str, recursive: bool = False) -> bool:
+    """True if the data directory exists and holds at least one file to index."""
+    try:
+        return bool(_list_files(data_dir, recursive))
+    except FileNotFoundError:
+        return False
+
+
+def scan_data_dir(data_dir: str, processed_files: Dict[str, Dict], recursive: bool = False,
+                  force: bool = False, max_workers: int = SCAN_HASH_WORKERS) -> ScanResult:
+    """
+    Detects new, modified and removed files with as little I/O as possible. A file whose size and
+    mtime match its stored metadata costs one stat() and is not read. Only the remaining candidates
+    are hashed, in streamed chunks on a thread pool, and only a differing hash counts as a change.
+    force=True hashes and reports every file (used for full rebuilds).
+    """
+    started = time.perf_counter()
+    result = ScanResult()
+    stats_by_key = _list_files(data_dir, recursive)
+    result.stats["files_seen"] = len(stats_by_key)
+    result.removed = [key for key in processed_files if key not in stats_by_key]
+
+    candidates = []
+    for key, stat in stats_by_key.items():
+        previous = processed_files.get(key)
+        if (not force and previous and previous.get('hash')
+                and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime):
+            result.files[key] = {'hash': previous['hash'], 'mtime': stat.st_mtime, 'size': stat.st_size}
+        else:
+            candidates.append(key)
+
+    def hash_candidate(key):
+        try:
+            return key, hash_file(result.path_for(data_dir, key))
+        except OSError as e:
+            print(f"Could not read '{key}' while scanning {data_dir}: {e}")
+            return key, (None, 0)
+
+    if candidates:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(candidates))), thread_name_prefix="scan-hash") as pool:
+            hashed = list(pool.map(hash_candidate, candidates))
+        for key, (file_hash, bytes_read) in hashed:
+            result.stats["bytes_read"] += bytes_read
+            if file_hash is None:
+                continue
+            result.stats["files_hashed"] += 1
+            stat = stats_by_key[key]
+            result.files[key] = {'hash': file_hash, 'mtime': stat.st_mtime, 'size': stat.st_size}
+            previous = processed_files.get(key)
+            if force or not previous or previous.get('hash') != file_hash:
+                result.changed.append(key)
+            else:
+                result.touched.append(key)
+
+    result.stats["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+    return result
@@ -0,0 +1,37 @@
+import os
+
+# gunicorn settings for the production server (see wsgi.py). Run from backend/:
+#     gunicorn -c gunicorn.conf.py
+# WEB_WORKERS=1 with WEB_PRELOAD=false is the single-process baseline;
+# benchmarks/worker_memory.py compares the two.
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2")) # Worker processes; each shares the parent's models and indexes
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8")) # Request threads per worker
+WEB_PRELOAD = os.getenv("WEB_PRELOAD", "true").lower() == "true" # Load models and indexes once, in the parent
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+wsgi_app = "wsgi:application"
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = "gthread"
+preload_app = WEB_PRELOAD
+timeout = int(os.getenv("WEB_TIMEOUT_SECONDS", "300")) # Streamed and batch answers can take minutes
+graceful_timeout = 30
+keepalive = 5
+
+# The fast tokenizers' thread pool does not survive fork either; the workers encode in their own threads
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# A conversation's turns can reach different workers, so they share their sessions through SQLite
+if WEB_WORKERS > 1:
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join("..", "storage", "sessions.sqlite3"))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import wsgi
+        wsgi.prepare_for_fork()
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.after_fork(server.cfg.workers, preloaded=server.cfg.preload_app)
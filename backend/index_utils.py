@@ -1,54 +1,189 @@
 import os
 import json
-import hashlib
+import argparse
+import contextlib
 from datetime import datetime
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, load_index_from_storage, Document
-from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
+from llama_index.core.schema import MetadataMode
+from llama_index.core.node_parser import NodeParser
 from llama_parse import LlamaParse # Keep for type hinting if needed, actual parser object from common_settings
-from common_settings import NODE_PARSER # Import default node parser
+from common_settings import NODE_PARSER, EMBED_MODEL # Import default node parser and embedding model
+from chunking import LEGACY_NODE_PARSER_SIGNATURE, node_parser_signature
+from embedding_cache import EmbeddingCache
+from bm25_index import SparseBM25Index, load_or_build_bm25_index
+from file_scanner import hash_file, scan_data_dir
+from document_parsing import ParseCache, parse_files
+from domain_config import get_domains_config
+from mmap_vector_store import MmapVectorStore
+from metrics import REGISTRY, span
+
+INDEX_SCAN_RECURSIVE = os.getenv("INDEX_SCAN_RECURSIVE", "false").lower() == "true" # Also index files in subdirectories of data_dir
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "mmap") # mmap (MmapVectorStore) or simple (LlamaIndex JSON store)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32") # float16 halves vector memory for new builds
+PERSIST_LOCK_FILENAME = ".index.lock"
+
+try:
+    import fcntl # POSIX only; elsewhere a single process owns each persist dir
+except ImportError:
+    fcntl = None
 
 def get_file_metadata(file_path):
-    """Generates a hash and modification time for a file."""
-    hasher = hashlib.md5()
+    """Generates a hash and modification time for a file (hashed in streamed chunks)."""
     try:
-        with open(file_path, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest(), os.path.getmtime(file_path)
+        file_hash, _ = hash_file(file_path)
+        return file_hash, os.path.getmtime(file_path)
     except IOError:
         return None, None
 
+@contextlib.contextmanager
+def persist_dir_lock(persist_dir: str):
+    """
+    Exclusive lock on a persist dir across processes (e.g. forked server workers), so only one of them
+    ingests into an index at a time; the others wait and then load what it persisted.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, PERSIST_LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_index_version(persist_dir: str) -> str | None:
+    """
+    Returns an identifier for the current contents of a persisted index.
+    Uses the 'last_updated' stamp manage_index writes to index_metadata.json,
+    falling back to the docstore modification time for indexes without metadata.
+    """
+    metadata_path = os.path.join(persist_dir, "index_metadata.json")
+    try:
+        with open(metadata_path, 'r') as f:
+            last_updated = json.load(f).get("last_updated")
+        if last_updated:
+            return last_updated
+    except (IOError, ValueError):
+        pass
+    docstore_path = os.path.join(persist_dir, "docstore.json")
+    if os.path.exists(docstore_path):
+        return str(os.path.getmtime(docstore_path))
+    return None
+
+def _node_source_name(node) -> str | None:
+    metadata = getattr(node, 'metadata', None) or {}
+    if metadata.get('file_name'):
+        return metadata['file_name']
+    if metadata.get('file_path'):
+        return os.path.basename(metadata['file_path'])
+    return None
+
+def _file_node_ids(docstore, ref_doc_ids) -> list:
+    """Node IDs the docstore tracks for a file's ref docs."""
+    node_ids = []
+    for ref_doc_id in ref_doc_ids:
+        ref_doc_info = docstore.get_ref_doc_info(ref_doc_id)
+        if ref_doc_info is not None:
+            node_ids.extend(ref_doc_info.node_ids)
+    return node_ids
+
+def _node_ids_by_source_name(docstore) -> dict:
+    """Source file name -> IDs of its nodes, from one pass over the docstore."""
+    node_ids_by_source = {}
+    for node_id, node in docstore.docs.items():
+        node_ids_by_source.setdefault(_node_source_name(node), []).append(node_id)
+    return node_ids_by_source
+
+def _delete_file_from_index(index: VectorStoreIndex, filename: str, file_metadata: dict, node_ids_by_source=None) -> list:
+    """
+    Deletes every node a previously processed file contributed to the index; returns the deleted node IDs.
+    node_ids_by_source is a callable returning _node_ids_by_source_name of the index's docstore, only
+    needed (and called) for metadata written before per-file node tracking.
+    """
+    ref_doc_ids = file_metadata.get('ref_doc_ids')
+    if ref_doc_ids is None:
+        # Metadata written before per-file node tracking: match nodes by their source file name
+        by_source = node_ids_by_source() if node_ids_by_source is not None else _node_ids_by_source_name(index.docstore)
+        node_ids = by_source.pop(os.path.basename(filename), [])
+        if node_ids:
+            index.delete_nodes(node_ids, delete_from_docstore=True)
+        return node_ids
+    node_ids = set(file_metadata.get('node_ids', [])) | set(_file_node_ids(index.docstore, ref_doc_ids))
+    for ref_doc_id in ref_doc_ids:
+        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+    return list(node_ids)
+
+def load_storage_context(persist_dir: str, vector_index_config: dict = None) -> StorageContext:
+    """
+    Opens a persisted storage context with the configured vector store (migrating JSON vectors to mmap on first use).
+    vector_index_config holds MmapVectorStore options, e.g. {"index_mode": "ivf", "nprobe": 8}.
+    """
+    if VECTOR_STORE_BACKEND == "mmap":
+        vector_store = MmapVectorStore.from_persist_dir(persist_dir, dtype=VECTOR_STORE_DTYPE, **(vector_index_config or {}))
+        return StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store)
+    return StorageContext.from_defaults(persist_dir=persist_dir)
+
+def new_storage_context(vector_index_config: dict = None) -> StorageContext:
+    if VECTOR_STORE_BACKEND == "mmap":
+        return StorageContext.from_defaults(vector_store=MmapVectorStore(dtype=VECTOR_STORE_DTYPE, **(vector_index_config or {})))
+    return StorageContext.from_defaults()
+
 def manage_index(
     index_name: str,
     persist_dir: str,
     data_dir: str,
     doc_parser_instance: LlamaParse = None, # Expecting the initialized LlamaParse object
     force_rebuild: bool = False,
-    node_parser_for_build: SentenceSplitter = NODE_PARSER # Use default from common_settings
+    node_parser_for_build: NodeParser = NODE_PARSER, # Use default from common_settings
+    embed_model = EMBED_MODEL,
+    recursive: bool = INDEX_SCAN_RECURSIVE,
+    vector_index_config: dict = None
 ) -> VectorStoreIndex | None:
     """
     Manages a VectorStoreIndex: loads if exists, updates with new files, or builds if new.
-    Tracks processed files using a metadata file to avoid re-processing.
-    Uses an explicit node_parser when building the index.
+    Tracks processed files (and the ref-doc/node IDs each produced) using a metadata file to avoid re-processing.
+    Modified files have their old nodes replaced and files removed from data_dir are purged from the index.
+    Uses an explicit node_parser when building the index. The parser's signature is recorded in the metadata
+    file; when a different one is passed (a domain switched chunking strategy), the index is rebuilt so every
+    file is re-chunked, reusing cached parses and embeddings of unchanged chunks.
+    Files are parsed concurrently (see document_parsing) and parsed Documents are cached by content hash,
+    so unchanged files are never parsed twice.
+    Chunk embeddings go through a persistent EmbeddingCache in persist_dir, so only unseen text is embedded.
+    The sparse BM25 index persisted beside the vector index is kept in step with every build/insert.
+    Change detection trusts (size, mtime) and only hashes files whose stat changed (see file_scanner).
+    With recursive=True, files in subdirectories are indexed under their data_dir-relative path.
+    vector_index_config selects exact or IVF (approximate) vector search; the IVF index is trained or
+    retrained here whenever the corpus has grown enough.
     """
     os.makedirs(persist_dir, exist_ok=True)
     os.makedirs(data_dir, exist_ok=True)
+    embedding_cache = EmbeddingCache.for_persist_dir(persist_dir, embed_model)
 
     metadata_path = os.path.join(persist_dir, "index_metadata.json")
     processed_files_metadata = {}
+    previous_last_updated = None
+    index_changed = False
 
     index = None
 
+    chunking = node_parser_signature(node_parser_for_build)
     if os.path.exists(metadata_path) and not force_rebuild:
         print(f"Loading metadata for index '{index_name}' from {metadata_path}")
         with open(metadata_path, 'r') as f:
-            processed_files_metadata = json.load(f).get("processed_files", {})
+            stored_metadata = json.load(f)
+            processed_files_metadata = stored_metadata.get("processed_files", {})
+            previous_last_updated = stored_metadata.get("last_updated")
+        stored_chunking = stored_metadata.get("node_parser", LEGACY_NODE_PARSER_SIGNATURE)
+        if stored_chunking != chunking:
+            print(f"Chunking for index '{index_name}' changed ({stored_chunking} -> {chunking}). Rebuilding to re-chunk every file.")
+            force_rebuild = True
 
     if os.path.exists(os.path.join(persist_dir, "docstore.json")) and not force_rebuild:
         print(f"Loading existing index '{index_name}' from {persist_dir}...")
         try:
-            storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
-            index = load_index_from_storage(storage_context)
+            storage_context = load_storage_context(persist_dir, vector_index_config)
+            index = load_index_from_storage(storage_context, embed_model=embed_model)
             print(f"Index '{index_name}' loaded successfully.")
         except Exception as e:
             print(f"Error loading index '{index_name}' from storage: {e}. Will attempt to rebuild.")
@@ -61,67 +196,88 @@ def manage_index(
             print(f"No existing index found for '{index_name}' at {persist_dir}. Will build new one.")
         processed_files_metadata = {}
 
-    current_files_in_data_dir = [f for f in os.listdir(data_dir) if os.path.isfile(os.path.join(data_dir, f))]
-    new_or_modified_files_to_process = []
-    all_docs_for_new_index = []
-
     print(f"Scanning data directory: {data_dir} for index '{index_name}'...")
-    for filename in current_files_in_data_dir:
-        file_path = os.path.join(data_dir, filename)
-        file_hash, file_mtime = get_file_metadata(file_path)
+    rebuilding = index is None or force_rebuild
+    def phase(name: str):
+        return span(name, metric="index_phase_duration_seconds", index=index_name)
 
-        if not file_hash:
-            continue
+    with phase("scan"):
+        scan = scan_data_dir(data_dir, processed_files_metadata, recursive=recursive, force=rebuilding)
+    print(f"Scanned {scan.stats['files_seen']} file(s) for '{index_name}' in {scan.stats['elapsed_seconds']}s: "
+          f"{scan.stats['files_hashed']} hashed, {scan.stats['bytes_read']} bytes read.")
 
-        is_new = filename not in processed_files_metadata
-        is_modified = not is_new and (
-            processed_files_metadata[filename]['hash'] != file_hash or
-            processed_files_metadata[filename]['mtime'] != file_mtime
-        )
+    removed_files = []
+    if not rebuilding:
+        removed_files = scan.removed
+        for filename in removed_files:
+            print(f"File '{filename}' was removed from {data_dir}. Will purge its nodes.")
+        for filename in scan.touched:
+            # Same content under a new mtime/size stamp: refresh the stamp so the next scan is stat-only again
+            processed_files_metadata[filename].update(scan.files[filename])
 
-        if is_new or is_modified or force_rebuild:
-            if is_modified: print(f"File '{filename}' has been modified. Will re-process.")
-            elif is_new: print(f"New file '{filename}' found. Will process.")
-            new_or_modified_files_to_process.append(file_path)
-
-        if index is None or force_rebuild:
-             all_docs_for_new_index.append(file_path)
+    new_or_modified_files_to_process = []
+    all_docs_for_new_index = [scan.path_for(data_dir, filename) for filename in scan.files] if rebuilding else []
+    for filename in scan.changed:
+        if filename in processed_files_metadata: print(f"File '{filename}' has been modified. Will re-process.")
+        else: print(f"New file '{filename}' found. Will process.")
+        new_or_modified_files_to_process.append(scan.path_for(data_dir, filename))
 
     documents_to_add_as_llama_docs = []
+    documents_by_file = {} # filename -> Documents parsed from it in this run
     files_for_current_processing_run = all_docs_for_new_index if (index is None or force_rebuild) else new_or_modified_files_to_process
 
-    if not files_for_current_processing_run and index:
+    if not files_for_current_processing_run and not removed_files and index:
         print(f"No new or modified files to process for index '{index_name}'. Index is up-to-date.")
     elif not files_for_current_processing_run and not index:
          print(f"No files found in {data_dir} to build index '{index_name}'.")
          return None
 
+    files_to_parse = []
     for file_path in files_for_current_processing_run:
-        filename = os.path.basename(file_path)
-        print(f"Processing file: {file_path} for index '{index_name}'")
-        try:
-            loaded_llama_docs_from_file = []
-            if filename.lower().endswith(".pdf") and doc_parser_instance:
-                print(f"Using LlamaParse for PDF: {filename}")
-                loaded_llama_docs_from_file = doc_parser_instance.load_data(file_path)
-            else:
-                if filename.lower().endswith(".pdf"):
-                    print(f"Warning: LlamaParse not used for PDF '{filename}'. Using SimpleDirectoryReader.")
-                reader = SimpleDirectoryReader(input_files=[file_path])
-                loaded_llama_docs_from_file = reader.load_data()
-
-            if loaded_llama_docs_from_file:
-                documents_to_add_as_llama_docs.extend(loaded_llama_docs_from_file)
-                file_hash, file_mtime = get_file_metadata(file_path)
-                if file_hash:
-                    processed_files_metadata[filename] = {'hash': file_hash, 'mtime': file_mtime, 'processed_at': str(datetime.now())}
-            else:
-                print(f"Warning: No content loaded from file: {filename}")
+        filename = os.path.relpath(file_path, data_dir).replace(os.sep, '/') # Metadata key; the bare name for top-level files
+        files_to_parse.append((filename, file_path, scan.files[filename]['hash']))
+    if files_to_parse:
+        print(f"Parsing {len(files_to_parse)} file(s) for index '{index_name}'...")
+        parse_cache = ParseCache.for_persist_dir(persist_dir)
+        with phase("parse"):
+            documents_by_file, parse_errors = parse_files(files_to_parse, doc_parser_instance, parse_cache)
+        REGISTRY.inc("parse_cache_hits_total", parse_cache.hits, help="Files whose parsed Documents were reused", index=index_name)
+        REGISTRY.inc("parse_cache_misses_total", parse_cache.misses, help="Files parsed from scratch", index=index_name)
+        for filename, error in parse_errors.items():
+            # Keep any previous metadata entry: its old nodes stay in the index and the file is retried next run
+            print(f"Error processing file {filename}: {error}")
+        for filename, _, _ in files_to_parse:
+            documents_to_add_as_llama_docs.extend(documents_by_file.get(filename, []))
+        if parse_cache.hits:
+            print(f"Parse cache for '{index_name}': {parse_cache.hits} file(s) reused, {len(documents_by_file) - parse_cache.hits} parsed.")
 
-        except Exception as e:
-            print(f"Error processing file {filename}: {e}")
-            if filename in processed_files_metadata:
-                del processed_files_metadata[filename]
+    def record_processed_file(filename, ref_doc_ids, node_ids):
+        # Stamps come from the scan, taken before parsing: a file edited mid-run is picked up next run
+        processed_files_metadata[filename] = {
+            **scan.files[filename], 'processed_at': str(datetime.now()),
+            'ref_doc_ids': ref_doc_ids, 'node_ids': node_ids
+        }
+
+    legacy_node_ids_by_source = None
+    def node_ids_by_source():
+        # Built on first use and shared by every file of this run, instead of one docstore pass per file
+        nonlocal legacy_node_ids_by_source
+        if legacy_node_ids_by_source is None:
+            legacy_node_ids_by_source = _node_ids_by_source_name(index.docstore)
+        return legacy_node_ids_by_source
+
+    if removed_files and index is not None and not force_rebuild:
+        bm25_index = load_or_build_bm25_index(persist_dir, index.docstore)
+        for filename in removed_files:
+            deleted_node_ids = _delete_file_from_index(index, filename, processed_files_metadata.pop(filename), node_ids_by_source)
+            bm25_index.remove_node_ids(deleted_node_ids)
+            print(f"Purged {len(deleted_node_ids)} node(s) of removed file '{filename}' from index '{index_name}'.")
+        if not documents_to_add_as_llama_docs:
+            print(f"Persisting index '{index_name}' after purging removed files...")
+            with phase("persist"):
+                index.storage_context.persist(persist_dir=persist_dir)
+                bm25_index.persist(persist_dir)
+            index_changed = True
 
     if not documents_to_add_as_llama_docs and index:
         print(f"Index '{index_name}' is loaded and no new valid documents were added in this run.")
@@ -135,32 +291,165 @@ def manage_index(
     if index is None or force_rebuild:
         if documents_to_add_as_llama_docs:
             print(f"Building new VectorStoreIndex for '{index_name}' from {len(documents_to_add_as_llama_docs)} Document object(s)...")
-            index = VectorStoreIndex.from_documents(
-                documents_to_add_as_llama_docs,
-                transformations=[node_parser_for_build],
-                show_progress=True
-            )
+            # Same steps as VectorStoreIndex.from_documents, run one by one so each phase is timed
+            with phase("chunk"):
+                new_nodes = node_parser_for_build.get_nodes_from_documents(documents_to_add_as_llama_docs)
+            with phase("embed"):
+                embedding_cache.embed_nodes(new_nodes, show_progress=True)
+            with phase("build"):
+                storage_context = new_storage_context(vector_index_config)
+                for doc in documents_to_add_as_llama_docs:
+                    storage_context.docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+                index = VectorStoreIndex(new_nodes, storage_context=storage_context, embed_model=embed_model, show_progress=True)
             print(f"Persisting new index '{index_name}' to {persist_dir}...")
-            index.storage_context.persist(persist_dir=persist_dir)
+            with phase("persist"):
+                index.storage_context.persist(persist_dir=persist_dir)
+            index_changed = True
             print("Index persisted.")
+            print(f"Building BM25 index for '{index_name}'...")
+            with phase("bm25"):
+                SparseBM25Index.from_nodes(index.docstore.docs.values()).persist(persist_dir)
+            for filename, docs in documents_by_file.items():
+                ref_doc_ids = [doc.doc_id for doc in docs]
+                record_processed_file(filename, ref_doc_ids, _file_node_ids(index.docstore, ref_doc_ids))
         else:
             print(f"No documents to build new index '{index_name}'.")
             return None
     elif documents_to_add_as_llama_docs:
         print(f"Updating existing index '{index_name}' with {len(documents_to_add_as_llama_docs)} new Document object(s)...")
-        new_nodes = node_parser_for_build.get_nodes_from_documents(documents_to_add_as_llama_docs)
-        index.insert_nodes(new_nodes, show_progress=True)
+        with phase("chunk"):
+            new_nodes_by_file = {
+                filename: node_parser_for_build.get_nodes_from_documents(docs)
+                for filename, docs in documents_by_file.items()
+            }
+        new_nodes = [node for nodes in new_nodes_by_file.values() for node in nodes]
+        with phase("embed"):
+            embedding_cache.embed_nodes(new_nodes, show_progress=True)
+        bm25_index = load_or_build_bm25_index(persist_dir, index.docstore) # Before insert, so a fresh build doesn't see the new nodes twice
+        for filename in new_nodes_by_file:
+            if filename in processed_files_metadata: # Modified file: replace its stale nodes
+                deleted_node_ids = _delete_file_from_index(index, filename, processed_files_metadata[filename], node_ids_by_source)
+                bm25_index.remove_node_ids(deleted_node_ids)
+                print(f"Removed {len(deleted_node_ids)} stale node(s) of modified file '{filename}'.")
+        with phase("build"):
+            index.insert_nodes(new_nodes, show_progress=True)
+            bm25_index.add_nodes(new_nodes)
+        for filename, nodes in new_nodes_by_file.items():
+            record_processed_file(filename, [doc.doc_id for doc in documents_by_file[filename]], [node.node_id for node in nodes])
         print(f"Persisting updated index '{index_name}' to {persist_dir}...")
-        index.storage_context.persist(persist_dir=persist_dir)
+        with phase("persist"):
+            index.storage_context.persist(persist_dir=persist_dir)
+            bm25_index.persist(persist_dir)
+        index_changed = True
         print("Index updates persisted.")
 
-    if processed_files_metadata:
+    if embedding_cache.hits or embedding_cache.misses:
+        print(f"Embedding cache for '{index_name}': {embedding_cache.hits} chunk(s) reused, {embedding_cache.misses} chunk(s) embedded.")
+        REGISTRY.inc("embedding_cache_hits_total", embedding_cache.hits, help="Chunks whose embedding was reused", index=index_name)
+        REGISTRY.inc("embedding_cache_misses_total", embedding_cache.misses, help="Chunks embedded by the model", index=index_name)
+    embedding_cache.close()
+
+    if processed_files_metadata or index_changed:
         print(f"Saving updated metadata for index '{index_name}' to {metadata_path}")
+        # 'last_updated' doubles as the index version (see get_index_version); only bump it when the index changed
+        last_updated = str(datetime.now()) if index_changed or not previous_last_updated else previous_last_updated
         with open(metadata_path, 'w') as f:
-            json.dump({"processed_files": processed_files_metadata, "last_updated": str(datetime.now())}, f, indent=4)
+            json.dump({"processed_files": processed_files_metadata, "last_updated": last_updated, "node_parser": chunking}, f, indent=4)
+
+    if index is not None and isinstance(index.vector_store, MmapVectorStore) and index.vector_store.needs_ann_build():
+        print(f"Building ANN index for '{index_name}'...")
+        with phase("ann_build"):
+            index.vector_store.persist(os.path.join(persist_dir, "default__vector_store.json"))
 
     if index:
         print(f"Index '{index_name}' is ready.")
     else:
         print(f"Failed to load or build index '{index_name}'.")
-    return index
\ No newline at end of file
+    return index
+
+def _dir_size_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def compact_index(persist_dir: str, embed_model = EMBED_MODEL, vector_index_config: dict = None) -> dict:
+    """
+    Rewrites a persisted index to reclaim space: drops docstore nodes and vectors no longer referenced
+    by the index, empty ref-doc entries, tombstoned BM25 postings, embedding-cache rows for text
+    that is no longer indexed and cached parses of files no longer in the data directory.
+    vector_index_config is the domain's (see load_storage_context); without it the persisted
+    vector index mode is kept, IVF included. Holds the persist dir lock throughout.
+    """
+    with persist_dir_lock(persist_dir): # Not while a server worker or hot reload ingests into it
+        size_before = _dir_size_bytes(persist_dir)
+        storage_context = load_storage_context(persist_dir, vector_index_config)
+        index = load_index_from_storage(storage_context, embed_model=embed_model)
+        docstore = index.docstore
+        live_node_ids = set(index.index_struct.nodes_dict.values())
+
+        docs = docstore.docs # Deserializes every node; taken once, as the property rebuilds the dict per access
+        orphan_node_ids = [node_id for node_id in docs if node_id not in live_node_ids]
+        kept_docs = {node_id: node for node_id, node in docs.items() if node_id in live_node_ids}
+        for node_id in orphan_node_ids:
+            docstore.delete_document(node_id, raise_error=False)
+        empty_ref_doc_ids = [ref_doc_id for ref_doc_id, info in (docstore.get_all_ref_doc_info() or {}).items() if not info.node_ids]
+        for ref_doc_id in empty_ref_doc_ids:
+            docstore.delete_ref_doc(ref_doc_id, raise_error=False)
+
+        orphan_vector_ids = []
+        vector_store = index.vector_store
+        vector_node_ids = vector_store.node_ids if isinstance(vector_store, MmapVectorStore) else getattr(getattr(vector_store, 'data', None), 'embedding_dict', None)
+        if vector_node_ids is not None:
+            orphan_vector_ids = [node_id for node_id in vector_node_ids if node_id not in live_node_ids]
+            if orphan_vector_ids:
+                vector_store.delete_nodes(orphan_vector_ids)
+        if isinstance(vector_store, MmapVectorStore):
+            vector_store.compact() # Rewrite the matrix without tombstoned rows
+
+        storage_context.persist(persist_dir=persist_dir)
+
+        bm25_index = load_or_build_bm25_index(persist_dir, docstore)
+        bm25_index.remove_node_ids([node_id for node_id in bm25_index.node_ids if node_id not in kept_docs])
+        bm25_index.compact()
+        bm25_index.persist(persist_dir)
+
+        embedding_cache = EmbeddingCache.for_persist_dir(persist_dir, embed_model)
+        pruned_embeddings = embedding_cache.prune(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in kept_docs.values()]
+        )
+        embedding_cache.close()
+
+        pruned_parses = 0
+        metadata_path = os.path.join(persist_dir, "index_metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as f:
+                processed_files = json.load(f).get("processed_files", {})
+            pruned_parses = ParseCache.for_persist_dir(persist_dir).prune(entry.get('hash') for entry in processed_files.values())
+
+        report = {
+            "orphan_nodes_removed": len(orphan_node_ids),
+            "empty_ref_docs_removed": len(empty_ref_doc_ids),
+            "orphan_vectors_removed": len(orphan_vector_ids),
+            "embedding_cache_rows_pruned": pruned_embeddings,
+            "parse_cache_entries_pruned": pruned_parses,
+            "bytes_before": size_before,
+            "bytes_after": _dir_size_bytes(persist_dir),
+        }
+    print(f"Compacted index at {persist_dir}: {report}")
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintenance commands for persisted indexes.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subcommands.add_parser("compact", help="Rewrite a persisted index, dropping orphaned nodes, vectors and cache rows.")
+    compact_parser.add_argument("domain", help="Domain whose index to compact, as named in domains.json, e.g. finance")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        domains = get_domains_config().domains
+        if args.domain.lower() not in domains:
+            parser.error(f"Unknown domain '{args.domain}'; configured domains: {', '.join(domains)}")
+        config = domains[args.domain.lower()]
+        compact_index(config.persist_dir, vector_index_config=config.vector_index_config)
@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# --- Index Watcher Configuration ---
+# New or changed documents are picked up without a restart: a background thread fingerprints each loaded
+# domain's data directory (stat() only, no reads) and asks the DomainLoader for a hot reload once a change
+# has settled. Ingestion and the engine rebuild run on the loader pool; requests keep using the old engine
+# until the new one is swapped in. POST /api/admin/reload triggers the same reload by hand.
+INDEX_WATCH_INTERVAL_SECONDS = float(os.getenv("INDEX_WATCH_INTERVAL_SECONDS", "30")) # 0 disables watching
+INDEX_WATCH_SETTLE_SECONDS = float(os.getenv("INDEX_WATCH_SETTLE_SECONDS", "10")) # A change must be unchanged this long (copies finished)
+
+
+class DataDirWatcher:
+    """
+    Polls the data directories of ready domains and schedules a reload for those whose files changed,
+    and those of empty domains, which are loaded once files have been added.
+    """
+    def __init__(self, domain_loader, interval_seconds: float = INDEX_WATCH_INTERVAL_SECONDS,
+                 settle_seconds: float = INDEX_WATCH_SETTLE_SECONDS):
+        self.domain_loader = domain_loader
+        self.interval_seconds = interval_seconds
+        self.settle_seconds = settle_seconds
+        self._candidates: Dict[str, Tuple[Optional[str], float]] = {} # domain -> (fingerprint, first seen)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch_forever, name="index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def after_fork(self):
+        """Called in a forked worker, where the parent's thread does not exist: starts watching anew."""
+        self._stop = threading.Event()
+        self._thread = None
+        self.start()
+
+    def check_once(self) -> List[str]:
+        """One polling pass; returns the domains a reload was scheduled for."""
+        from file_scanner import data_dir_has_files, fingerprint_data_dir # Imported lazily, like the services
+        from index_utils import INDEX_SCAN_RECURSIVE
+        scheduled = []
+        now = time.monotonic()
+        empty_domains = self.domain_loader.empty_domains()
+        for domain in self.domain_loader.domains:
+            service = self.domain_loader.get_if_ready(domain)
+            if service is not None and hasattr(service, 'reload'):
+                fingerprint = fingerprint_data_dir(service.config.data_dir, INDEX_SCAN_RECURSIVE)
+                changed = fingerprint != service.data_fingerprint
+            elif empty_domains.get(domain):
+                changed = data_dir_has_files(empty_domains[domain], INDEX_SCAN_RECURSIVE)
+                fingerprint = fingerprint_data_dir(empty_domains[domain], INDEX_SCAN_RECURSIVE) if changed else None
+            else:
+                self._candidates.pop(domain, None) # Domains load with the latest files anyway
+                continue
+            if not changed:
+                self._candidates.pop(domain, None)
+                continue
+            seen_fingerprint, first_seen = self._candidates.get(domain, (None, now))
+            if seen_fingerprint != fingerprint:
+                self._candidates[domain] = (fingerprint, now) # Still changing: wait for it to settle
+                first_seen = now
+            if now - first_seen >= self.settle_seconds:
+                if self.domain_loader.reload(domain, reason="watch") in ("scheduled", "queued"):
+                    scheduled.append(domain)
+                self._candidates.pop(domain, None)
+        return scheduled
+
+    def _watch_forever(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"Warning: Index watcher check failed: {e}")
@@ -0,0 +1,99 @@
+import os
+import math
+from typing import Optional
+
+import numpy as np
+
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", "5000")) # Below this, exact search is fast enough and IVF is not trained
+IVF_TRAIN_SAMPLE_PER_LIST = 64 # k-means trains on at most nlist * this many vectors
+IVF_TRAIN_ITERATIONS = 12
+IVF_RETRAIN_GROWTH = 2.0 # Retrain once the store has grown this much since the last training
+
+
+def default_nlist(num_vectors: int) -> int:
+    """Rule of thumb: about 4 * sqrt(N) lists."""
+    return max(1, int(4 * math.sqrt(num_vectors)))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over the rows of a vector matrix, in pure NumPy.
+    Spherical k-means partitions the vectors into `nlist` lists. A query scores the `nprobe` closest
+    centroids and then only the rows in those lists, trading recall for latency.
+    Stores only centroids and one list assignment per row; inverted lists are rebuilt on load.
+    """
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_on: int):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.trained_on = trained_on
+        self._build_lists()
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def _build_lists(self):
+        self._order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(self.assignments, minlength=self.nlist)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, nlist: int = 0, seed: int = 0) -> "IVFIndex":
+        num_vectors = matrix.shape[0]
+        nlist = min(nlist or default_nlist(num_vectors), num_vectors)
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_vectors, nlist * IVF_TRAIN_SAMPLE_PER_LIST)
+        sample = _normalize(matrix[np.sort(rng.choice(num_vectors, sample_size, replace=False))])
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))])
+            sorted_sample = sample[order]
+            sums = np.stack([sorted_sample[offsets[i]:offsets[i + 1]].sum(axis=0) for i in range(nlist)])
+            empty = offsets[1:] == offsets[:-1]
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))] # Re-seed empty lists
+            centroids = _normalize(sums)
+
+        index = cls(centroids, np.zeros(0, dtype=np.int32), trained_on=num_vectors)
+        index.assignments = index.assign(matrix)
+        index._build_lists()
+        return index
+
+    def assign(self, vectors: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            labels[start:start + block_rows] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def extended(self, vectors: np.ndarray) -> "IVFIndex":
+        """Index with appended rows assigned to their nearest existing list (no retraining)."""
+        return IVFIndex(self.centroids, np.concatenate([self.assignments, self.assign(vectors)]), self.trained_on)
+
+    def take(self, rows: np.ndarray) -> "IVFIndex":
+        """Index restricted to `rows` (in order), matching a compacted matrix."""
+        return IVFIndex(self.centroids, self.assignments[rows], self.trained_on)
+
+    def needs_retrain(self, num_vectors: int) -> bool:
+        return num_vectors > self.trained_on * IVF_RETRAIN_GROWTH
+
+    def candidate_rows(self, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query_vector
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self._order[self._offsets[i]:self._offsets[i + 1]] for i in lists])
+
+    @classmethod
+    def load(cls, centroids_path: str, assignments_path: str, trained_on: int) -> Optional["IVFIndex"]:
+        try:
+            return cls(np.load(centroids_path), np.load(assignments_path), trained_on)
+        except (IOError, ValueError):
+            return None
@@ -0,0 +1,339 @@
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+from rate_limit import TokenBucket
+
+# --- LLM Scheduler Configuration ---
+# Every agent LLM call goes through one shared scheduler: at most LLM_MAX_IN_FLIGHT calls run at once,
+# calls start no faster than the token bucket allows, 429s are retried with exponential backoff, and
+# waiting calls are admitted by priority lane. A lane whose queue is full sheds new calls immediately.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_RATE_LIMIT_PER_SECOND = float(os.getenv("LLM_RATE_LIMIT_PER_SECOND", "0")) # 0 = no client-side rate limit
+LLM_RATE_LIMIT_BURST = float(os.getenv("LLM_RATE_LIMIT_BURST", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4")) # Retries after a rate-limit error, not counting the first attempt
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+LLM_MAX_QUEUE_INTERACTIVE = int(os.getenv("LLM_MAX_QUEUE_INTERACTIVE", "64")) # Waiting interactive calls before shedding
+LLM_MAX_QUEUE_BATCH = int(os.getenv("LLM_MAX_QUEUE_BATCH", "16")) # Batch work is shed first under load
+LLM_OVERLOAD_RETRY_AFTER_SECONDS = 5 # Retry-After hint sent to clients whose call was shed
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_LANES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH) # Highest priority first
+
+_current_lane: contextvars.ContextVar = contextvars.ContextVar("llm_priority_lane", default=PRIORITY_INTERACTIVE)
+
+
+class LLMOverloadedError(Exception):
+    """Raised instead of queueing when the caller's priority lane already has a full queue."""
+    def __init__(self, lane: str, queued: int, retry_after: int = LLM_OVERLOAD_RETRY_AFTER_SECONDS):
+        super().__init__(f"LLM is overloaded ({queued} {lane} calls queued); please retry shortly.")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+@contextlib.contextmanager
+def llm_priority(lane: str):
+    """Runs the LLM calls made inside the block (and in contexts copied from it) in the given lane."""
+    if lane not in PRIORITY_LANES:
+        raise ValueError(f"Unknown LLM priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_priority() -> str:
+    return _current_lane.get()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for provider throttling (HTTP 429 / RESOURCE_EXHAUSTED, or 503 overload), which is worth retrying."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if code in (429, 503):
+        return True
+    text = str(error).lower()
+    return "429" in text or "resource_exhausted" in text or "rate limit" in text
+
+
+class _AsyncWaiter:
+    """An async caller waiting for a slot; the releasing thread resolves its future on the caller's loop."""
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+    def wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls: a priority-aware in-flight limit, a token-bucket start rate,
+    retries with exponential backoff and full jitter on rate-limit errors, and per-lane load shedding.
+    Works for sync, async and streaming calls. Sync callers wait on a condition variable; async callers
+    wait on a future of their own, resolved on their loop by the releasing thread, so no executor thread
+    is parked per waiter. A streamed call holds its slot until the LLM finishes streaming, however slowly
+    the consumer reads it.
+    """
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 retry_base_seconds: float = LLM_RETRY_BASE_SECONDS,
+                 retry_max_seconds: float = LLM_RETRY_MAX_SECONDS,
+                 max_queue_depth: Optional[Dict[str, int]] = None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = rate_limiter or TokenBucket(LLM_RATE_LIMIT_PER_SECOND, LLM_RATE_LIMIT_BURST)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_queue_depth = max_queue_depth or {PRIORITY_INTERACTIVE: LLM_MAX_QUEUE_INTERACTIVE, PRIORITY_BATCH: LLM_MAX_QUEUE_BATCH}
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = {lane: 0 for lane in PRIORITY_LANES} # Sync and async waiters
+        self._async_waiters = {lane: deque() for lane in PRIORITY_LANES}
+        self._stats = {"calls": 0, "completed": 0, "failed": 0, "retries": 0, "rate_limited": 0, "queue_wait_seconds": 0.0}
+        self._shed = {lane: 0 for lane in PRIORITY_LANES}
+
+    def _can_start_locked(self, lane: str) -> bool:
+        higher_lanes = PRIORITY_LANES[:PRIORITY_LANES.index(lane)]
+        return self._in_flight < self.max_in_flight and all(self._waiting[higher] == 0 for higher in higher_lanes)
+
+    def _shed_locked(self, lane: str):
+        if self._waiting[lane] >= self.max_queue_depth.get(lane, 0):
+            self._shed[lane] += 1
+            raise LLMOverloadedError(lane, self._waiting[lane])
+
+    def _acquire_slot(self, lane: str):
+        started = time.monotonic()
+        with self._cond:
+            if not self._can_start_locked(lane):
+                self._shed_locked(lane)
+                self._waiting[lane] += 1
+                try:
+                    while not self._can_start_locked(lane):
+                        self._cond.wait()
+                    self._in_flight += 1
+                finally:
+                    self._waiting[lane] -= 1
+                    self._wake_locked() # Fewer waiters in this lane may unblock a lower one
+            else:
+                self._in_flight += 1
+            self._stats["queue_wait_seconds"] += time.monotonic() - started
+
+    def _wake_locked(self):
+        """Hands free slots to async waiters in priority order, then lets sync waiters re-check."""
+        for lane in PRIORITY_LANES:
+            waiters = self._async_waiters[lane]
+            while waiters and self._can_start_locked(lane):
+                waiter = waiters.popleft()
+                self._waiting[lane] -= 1
+                try:
+                    waiter.loop.call_soon_threadsafe(waiter.wake)
+                except RuntimeError:
+                    continue # Its event loop is closed; nobody is left to use the slot
+                waiter.granted = True
+                self._in_flight += 1
+        self._cond.notify_all() # Waiters re-check priority; notify_all lets the right lane win
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._wake_locked()
+
+    async def _aacquire_slot(self, lane: str):
+        started = time.monotonic()
+        with self._cond:
+            if self._can_start_locked(lane):
+                self._in_flight += 1
+                return
+            self._shed_locked(lane)
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._async_waiters[lane].append(waiter)
+            self._waiting[lane] += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # The slot may have been handed over meanwhile: give it back, or leave the queue
+            with self._cond:
+                if waiter.granted:
+                    self._in_flight -= 1
+                else:
+                    self._async_waiters[lane].remove(waiter)
+                    self._waiting[lane] -= 1
+                self._wake_locked()
+            raise
+        with self._cond:
+            self._stats["queue_wait_seconds"] += time.monotonic() - started
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if not is_rate_limit_error(error):
+            return False
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            if attempt < self.max_retries:
+                self._stats["retries"] += 1
+                return True
+        return False
+
+    def _count(self, key: str):
+        with self._cond:
+            self._stats[key] += 1
+
+    def call(self, fn, *args, **kwargs):
+        lane = current_priority()
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot(lane)
+            try:
+                self.rate_limiter.acquire()
+                result = fn(*args, **kwargs)
+                self._count("completed")
+                return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    self._count("failed")
+                    raise
+            finally:
+                self._release_slot()
+            time.sleep(self._backoff_seconds(attempt))
+
+    async def acall(self, fn, *args, **kwargs):
+        lane = current_priority()
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire_slot(lane)
+            try:
+                await self.rate_limiter.aacquire()
+                result = await fn(*args, **kwargs)
+                self._count("completed")
+                return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    self._count("failed")
+                    raise
+            finally:
+                self._release_slot()
+            await asyncio.sleep(self._backoff_seconds(attempt))
+
+    def _pump_stream(self, chunks: queue.Queue, abandoned: threading.Event, fn, args, kwargs):
+        """Reads fn's stream into chunks on its own thread and releases the slot as soon as the LLM is done."""
+        outcome = ("end", None)
+        try:
+            for chunk in fn(*args, **kwargs):
+                if abandoned.is_set():
+                    break
+                chunks.put(("chunk", chunk))
+        except Exception as e:
+            outcome = ("error", e)
+        finally:
+            self._release_slot()
+            chunks.put(outcome)
+
+    def stream(self, fn, *args, **kwargs) -> Iterator:
+        """
+        Streams fn's chunks. The LLM stream is read by a thread holding one slot, so a slow consumer does not
+        keep the slot once the LLM is done; rate-limit errors are retried only before the first chunk.
+        """
+        lane = current_priority()
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot(lane)
+            try:
+                self.rate_limiter.acquire()
+            except BaseException:
+                self._release_slot()
+                raise
+            chunks, abandoned = queue.Queue(), threading.Event()
+            threading.Thread(target=contextvars.copy_context().run, args=(self._pump_stream, chunks, abandoned, fn, args, kwargs),
+                             name="llm-stream", daemon=True).start()
+            started_streaming = False
+            try:
+                while True:
+                    kind, value = chunks.get()
+                    if kind == "end":
+                        self._count("completed")
+                        return
+                    if kind == "error":
+                        raise value
+                    started_streaming = True
+                    yield value
+            except Exception as e:
+                if started_streaming or not self._should_retry(e, attempt):
+                    self._count("failed")
+                    raise
+            finally:
+                abandoned.set() # A consumer that stops early stops the pump at its next chunk
+            time.sleep(self._backoff_seconds(attempt))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                **self._stats,
+                "queue_wait_seconds": round(self._stats["queue_wait_seconds"], 3),
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": dict(self._waiting),
+                "shed": dict(self._shed),
+                "rate_limit_per_second": self.rate_limiter.rate,
+            }
+
+
+class ScheduledLLM:
+    """
+    Wraps a LlamaIndex LLM so complete/acomplete/stream_complete (and the chat variants) go through
+    an LLMScheduler. Other attributes are passed through to the wrapped LLM.
+    """
+    def __init__(self, llm, scheduler: Optional[LLMScheduler] = None):
+        self.llm = llm
+        self.scheduler = scheduler or get_default_scheduler()
+
+    def complete(self, prompt: str, **kwargs):
+        return self.scheduler.call(self.llm.complete, prompt, **kwargs)
+
+    async def acomplete(self, prompt: str, **kwargs):
+        return await self.scheduler.acall(self.llm.acomplete, prompt, **kwargs)
+
+    def stream_complete(self, prompt: str, **kwargs):
+        return self.scheduler.stream(self.llm.stream_complete, prompt, **kwargs)
+
+    def chat(self, messages, **kwargs):
+        return self.scheduler.call(self.llm.chat, messages, **kwargs)
+
+    async def achat(self, messages, **kwargs):
+        return await self.scheduler.acall(self.llm.achat, messages, **kwargs)
+
+    def stream_chat(self, messages, **kwargs):
+        return self.scheduler.stream(self.llm.stream_chat, messages, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+_default_scheduler: Optional[LLMScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> LLMScheduler:
+    """The process-wide scheduler, so limits hold across every ScheduledLLM."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = LLMScheduler()
+        return _default_scheduler
@@ -0,0 +1,181 @@
+import math
+import time
+import bisect
+import threading
+import contextlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from request_context import current_stats
+
+# --- Metrics ---
+# In-process counters and histograms rendered in the Prometheus text format at /api/metrics.
+# Stage spans also feed the per-request timing breakdown (request_context.RequestStats).
+METRICS_PREFIX = "rag"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0) # Seconds
+CHARS_PER_TOKEN_ESTIMATE = 4 # Used only when the LLM response carries no usage metadata
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, str, Dict[str, str], float] # (name, type, help, labels, value) from a collector
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(label_key: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{k}="{v}"'.replace("\n", " ") for k, v in ((k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in label_key)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "sum", "count")
+
+    def __init__(self, num_buckets: int):
+        self.bucket_counts = [0] * num_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe metrics registry: labelled counters and histograms, plus collectors that
+    report other components' stats (caches, LLM scheduler) at scrape time.
+    """
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Tuple[Tuple[float, ...], Dict[LabelKey, _Histogram]]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, help: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, help)
+            bucket_bounds, series = self._histograms.setdefault(name, (tuple(buckets), {}))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(len(bucket_bounds))
+            index = bisect.bisect_left(bucket_bounds, value)
+            if index < len(bucket_bounds):
+                histogram.bucket_counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Adds a callable returning (name, type, help, labels, value) samples, evaluated on every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines += [f"# HELP {full_name} {self._help.get(name) or name}", f"# TYPE {full_name} counter"]
+                lines += [f"{full_name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(series.items())]
+            for name, (bucket_bounds, series) in sorted(self._histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines += [f"# HELP {full_name} {self._help.get(name) or name}", f"# TYPE {full_name} histogram"]
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(bucket_bounds, histogram.bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+            collectors = list(self._collectors)
+
+        collected: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in collectors:
+            try:
+                for name, kind, help_text, labels, value in collector():
+                    if value is None:
+                        continue
+                    collected.setdefault(name, (kind, help_text, []))[2].append((labels, float(value)))
+            except Exception as e:
+                print(f"Warning: Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        for name, (kind, help_text, samples) in sorted(collected.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines += [f"# HELP {full_name} {help_text or name}", f"# TYPE {full_name} {kind}"]
+            lines += [f"{full_name}{_format_labels(_label_key(labels))} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+_SPAN_HELP = {
+    "stage_duration_seconds": "Duration of agent pipeline stages in seconds",
+    "request_duration_seconds": "End-to-end HTTP request duration in seconds",
+    "index_phase_duration_seconds": "Duration of manage_index phases in seconds",
+}
+
+
+@contextlib.contextmanager
+def span(stage: str, metric: str = "stage_duration_seconds", **labels):
+    """
+    Times the block: observed into the `metric` histogram (labelled by stage) and added to the
+    current request's timing breakdown, if a request is being tracked.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe(metric, elapsed, help=_SPAN_HELP.get(metric, metric), stage=stage, **labels)
+        stats = current_stats()
+        if stats is not None:
+            stats.add_timing(stage, elapsed)
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count estimate for text the provider has not counted."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN_ESTIMATE)
+
+
+def _usage_from_response(response) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt_tokens, completion_tokens) from the provider's usage metadata, when present."""
+    raw = getattr(response, 'raw', None)
+    usage = raw.get('usage_metadata') if isinstance(raw, dict) else getattr(raw, 'usage_metadata', None)
+    if usage is not None:
+        get = usage.get if isinstance(usage, dict) else (lambda field: getattr(usage, field, None))
+        return get('prompt_token_count'), get('candidates_token_count')
+    extra = getattr(response, 'additional_kwargs', None) or {}
+    return extra.get('prompt_tokens'), extra.get('completion_tokens')
+
+
+def record_token_usage(purpose: str, prompt: str, response=None, completion_text: Optional[str] = None):
+    """
+    Records prompt/completion tokens of one LLM call. Counts come from the response's usage
+    metadata; without it they are estimated from text length (source="estimated").
+    """
+    prompt_tokens, completion_tokens = _usage_from_response(response) if response is not None else (None, None)
+    source = "provider"
+    if prompt_tokens is None or completion_tokens is None:
+        source = "estimated"
+        if completion_text is None:
+            completion_text = getattr(response, 'text', None) or ""
+        prompt_tokens = prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt)
+        completion_tokens = completion_tokens if completion_tokens is not None else estimate_tokens(completion_text)
+    REGISTRY.inc("llm_prompt_tokens_total", prompt_tokens, help="Prompt tokens sent to the LLM", purpose=purpose, source=source)
+    REGISTRY.inc("llm_completion_tokens_total", completion_tokens, help="Completion tokens returned by the LLM", purpose=purpose, source=source)
+    REGISTRY.inc("llm_calls_total", help="LLM calls by purpose", purpose=purpose)
+    stats = current_stats()
+    if stats is not None:
+        stats.add_tokens(prompt_tokens, completion_tokens)
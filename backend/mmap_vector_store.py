@@ -0,0 +1,319 @@
+import os
+import json
+import uuid
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from ivf_index import IVF_MIN_VECTORS, IVFIndex
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+DEFAULT_NAMESPACE = "default"
+LEGACY_VECTOR_STORE_SUFFIX = "__vector_store.json"
+MIGRATED_SUFFIX = ".migrated" # Legacy JSON store is renamed, not deleted, after a successful migration
+SCORE_BLOCK_ROWS = 65536 # Rows scored per matrix-vector product; bounds the float32 temporary for float16 matrices
+
+
+def _store_paths(persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> Dict[str, str]:
+    prefix = os.path.join(persist_dir, f"{namespace}__vector_store")
+    return {
+        "matrix": f"{prefix}.npy", "norms": f"{prefix}.norms.npy", "ids": f"{prefix}.ids.json", "legacy": f"{prefix}.json",
+        "ivf_centroids": f"{prefix}.ivf_centroids.npy", "ivf_assignments": f"{prefix}.ivf_assignments.npy",
+    }
+
+
+def _atomic_save(path: str, write):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path) # Never truncates a file another reader has mapped
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping all embeddings in one contiguous float32 (or float16) matrix.
+    Persisted as <namespace>__vector_store.npy plus row norms and an ID table, and opened with
+    mmap: loading is near-instant and processes serving the same index share the page cache.
+    A query is one blocked matrix-vector product plus a partial sort, scored by cosine similarity
+    like SimpleVectorStore. Text lives in the docstore (stores_text=False).
+    Deletions tombstone rows; persist() writes only live rows.
+    index_mode='ivf' adds an approximate IVF index (see ivf_index) once the store holds IVF_MIN_VECTORS
+    vectors: queries then score only the rows in the `nprobe` nearest of `nlist` lists.
+    """
+    stores_text: bool = False
+    is_embedding_query: bool = True
+    dtype: str = "float32"
+    index_mode: str = "exact" # exact | ivf
+    nlist: int = 0 # IVF lists; 0 picks about 4 * sqrt(N) at training time
+    nprobe: int = 8 # IVF lists scanned per query: higher means better recall, slower queries
+
+    _matrix: Any = PrivateAttr(default=None)
+    _norms: Any = PrivateAttr(default=None)
+    _alive: Any = PrivateAttr(default=None)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    _row_by_id: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _dirty: bool = PrivateAttr(default=False)
+    _lock: Any = PrivateAttr(default=None)
+    _ivf: Any = PrivateAttr(default=None)
+
+    def __init__(self, dtype: str = "float32", **kwargs):
+        super().__init__(dtype=dtype, **kwargs)
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=np.dtype(dtype))
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def node_ids(self) -> List[str]:
+        with self._lock:
+            return [node_id for node_id, alive in zip(self._ids, self._alive) if alive]
+
+    @property
+    def num_vectors(self) -> int:
+        return int(self._alive.sum())
+
+    @classmethod
+    def exists(cls, persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        return os.path.exists(_store_paths(persist_dir, namespace)["ids"])
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, namespace: str = DEFAULT_NAMESPACE, dtype: str = "float32", **store_options) -> "MmapVectorStore":
+        """
+        Opens a persisted store with mmap. An index still using LlamaIndex's JSON vector store is
+        migrated on first open; with neither present an empty store is returned.
+        store_options (index_mode, nlist, nprobe) configure the store itself; without an index_mode, a
+        store persisted with an IVF index is opened in "ivf" mode, so persisting it again keeps the IVF.
+        """
+        paths = _store_paths(persist_dir, namespace)
+        if cls.exists(persist_dir, namespace):
+            with open(paths["ids"], 'r') as f:
+                table = json.load(f)
+            if "index_mode" not in store_options:
+                store_options = {**store_options, "index_mode": "ivf" if table.get("ivf_trained_on") else "exact"}
+            store = cls(dtype=dtype, **store_options)
+            store._load(paths, table)
+            return store
+        store = cls(dtype=dtype, **store_options)
+        if os.path.exists(paths["legacy"]):
+            print(f"Migrating JSON vector store {paths['legacy']} to a memory-mapped matrix...")
+            legacy = SimpleVectorStore.from_persist_path(paths["legacy"])
+            data = legacy.data
+            node_ids = list(data.embedding_dict.keys())
+            if node_ids:
+                store._append_rows(
+                    node_ids,
+                    [data.text_id_to_ref_doc_id.get(node_id) for node_id in node_ids],
+                    np.asarray([data.embedding_dict[node_id] for node_id in node_ids], dtype=np.float32),
+                )
+            store.persist(paths["legacy"])
+            os.replace(paths["legacy"], paths["legacy"] + MIGRATED_SUFFIX)
+            print(f"Migrated {len(node_ids)} vector(s); legacy store kept as {paths['legacy'] + MIGRATED_SUFFIX}.")
+        return store
+
+    def _load(self, paths: Dict[str, str], table: Optional[Dict] = None):
+        if table is None:
+            with open(paths["ids"], 'r') as f:
+                table = json.load(f)
+        matrix = np.load(paths["matrix"], mmap_mode="r")
+        norms = np.load(paths["norms"], mmap_mode="r")
+        if matrix.shape[0] != len(table["ids"]) or norms.shape[0] != len(table["ids"]):
+            raise ValueError(f"Vector store at {paths['matrix']} does not match its ID table; rebuild the index.")
+        ivf = None
+        if self.index_mode == "ivf" and table.get("ivf_trained_on"):
+            ivf = IVFIndex.load(paths["ivf_centroids"], paths["ivf_assignments"], table["ivf_trained_on"])
+            if ivf is not None and len(ivf.assignments) != matrix.shape[0]:
+                ivf = None # Stale IVF files: exact search until the next persist retrains
+        with self._lock:
+            self._ivf = ivf
+            self.dtype = str(matrix.dtype)
+            self._matrix = matrix
+            self._norms = norms
+            self._alive = np.ones(len(table["ids"]), dtype=bool)
+            self._ids = list(table["ids"])
+            self._ref_doc_ids = list(table["ref_doc_ids"])
+            self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids)}
+            self._dirty = False
+
+    def _append_rows(self, node_ids: List[str], ref_doc_ids: List[Optional[str]], vectors: np.ndarray):
+        with self._lock:
+            for node_id in node_ids: # Re-adding a node replaces its previous vector
+                row = self._row_by_id.get(node_id)
+                if row is not None:
+                    self._alive[row] = False
+            if self._matrix.shape[0] == 0:
+                matrix = vectors.astype(self.dtype)
+            else:
+                matrix = np.concatenate([self._matrix, vectors.astype(self.dtype)])
+            self._norms = np.concatenate([self._norms, np.linalg.norm(vectors, axis=1).astype(np.float32)])
+            self._alive = np.concatenate([self._alive, np.ones(len(node_ids), dtype=bool)])
+            start = len(self._ids)
+            self._ids.extend(node_ids)
+            self._ref_doc_ids.extend(ref_doc_ids)
+            self._row_by_id.update({node_id: start + offset for offset, node_id in enumerate(node_ids)})
+            if self._ivf is not None:
+                self._ivf = self._ivf.extended(vectors) # New rows join their nearest list; retraining waits for persist()
+            self._matrix = matrix
+            self._dirty = True
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        node_ids = [node.node_id for node in nodes]
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        self._append_rows(node_ids, [node.ref_doc_id for node in nodes], vectors)
+        return node_ids
+
+    def get(self, text_id: str) -> List[float]:
+        with self._lock:
+            row = self._row_by_id.get(text_id)
+            if row is None or not self._alive[row]:
+                raise ValueError(f"No vector stored for {text_id}")
+            return np.asarray(self._matrix[row], dtype=np.float32).tolist()
+
+    def _kill_rows(self, rows: List[int]):
+        if rows:
+            self._alive[rows] = False
+            self._dirty = True
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self._kill_rows([row for row, owner in enumerate(self._ref_doc_ids) if owner == ref_doc_id and self._alive[row]])
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None, **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise NotImplementedError("MmapVectorStore does not store metadata; delete by node ID or ref doc ID.")
+        with self._lock:
+            self._kill_rows([self._row_by_id[node_id] for node_id in (node_ids or []) if node_id in self._row_by_id])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._kill_rows(list(range(len(self._ids))))
+
+    def needs_ann_build(self) -> bool:
+        """True when index_mode='ivf' and the IVF index is missing or due for retraining."""
+        if self.index_mode != "ivf":
+            return False
+        live = self.num_vectors
+        if live < IVF_MIN_VECTORS:
+            return False
+        return self._ivf is None or self._ivf.needs_retrain(live) or bool(self.nlist and self._ivf.nlist != self.nlist)
+
+    def live_vectors(self, max_rows: int = 0, seed: int = 0) -> np.ndarray:
+        """Live rows as a float32 matrix; with max_rows, a uniform sample of at most that many rows."""
+        with self._lock:
+            matrix, live_rows = self._matrix, np.flatnonzero(self._alive)
+        if max_rows and len(live_rows) > max_rows:
+            live_rows = np.sort(np.random.default_rng(seed).choice(live_rows, max_rows, replace=False))
+        if len(live_rows) == 0:
+            return np.zeros((0, matrix.shape[1] if matrix.ndim == 2 else 0), dtype=np.float32)
+        return np.asarray(matrix[live_rows], dtype=np.float32)
+
+    def compact(self):
+        """Marks the store dirty so the next persist() rewrites it without tombstoned rows."""
+        with self._lock:
+            self._dirty = True
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise NotImplementedError("MmapVectorStore does not support metadata filters.")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise NotImplementedError(f"MmapVectorStore does not support query mode {query.mode}.")
+
+        with self._lock: # Snapshot: adds swap in new arrays rather than mutating these in place
+            matrix, norms, ids, ref_doc_ids = self._matrix, self._norms, self._ids, self._ref_doc_ids
+            mask = self._alive.copy()
+            ivf = self._ivf if self.index_mode == "ivf" else None
+        total_rows = len(mask)
+        if total_rows == 0 or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        if query.node_ids is not None:
+            wanted = set(query.node_ids)
+            mask &= np.fromiter((node_id in wanted for node_id in ids[:total_rows]), dtype=bool, count=total_rows)
+        if query.doc_ids is not None:
+            wanted = set(query.doc_ids)
+            mask &= np.fromiter((owner in wanted for owner in ref_doc_ids[:total_rows]), dtype=bool, count=total_rows)
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        top_k = min(query.similarity_top_k, candidates)
+        if ivf is not None and query.node_ids is None and query.doc_ids is None:
+            query_norm = np.linalg.norm(query_vector)
+            rows = ivf.candidate_rows(query_vector / (query_norm or 1.0), self.nprobe)
+            rows = np.sort(rows[mask[rows]])
+            if len(rows) >= top_k: # Otherwise the probed lists are too small: fall through to exact search
+                scores = np.asarray(matrix[rows] @ query_vector, dtype=np.float32)
+                denominators = np.asarray(norms[rows]) * query_norm
+                np.divide(scores, denominators, out=scores, where=denominators > 0)
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                best = best[np.argsort(-scores[best], kind="stable")]
+                return VectorStoreQueryResult(similarities=scores[best].tolist(), ids=[ids[row] for row in rows[best]])
+
+        scores = np.empty(total_rows, dtype=np.float32)
+        for start in range(0, total_rows, SCORE_BLOCK_ROWS):
+            scores[start:start + SCORE_BLOCK_ROWS] = matrix[start:start + SCORE_BLOCK_ROWS] @ query_vector
+        denominators = np.asarray(norms[:total_rows]) * np.linalg.norm(query_vector)
+        np.divide(scores, denominators, out=scores, where=denominators > 0)
+        scores[~mask] = -np.inf
+
+        top_rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_rows = top_rows[np.argsort(-scores[top_rows], kind="stable")]
+        return VectorStoreQueryResult(similarities=scores[top_rows].tolist(), ids=[ids[row] for row in top_rows])
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """
+        persist_path is the '<namespace>__vector_store.json' path StorageContext passes; the matrix,
+        norms and ID table are written beside it. Unchanged stores are not rewritten.
+        """
+        persist_dir = os.path.dirname(persist_path)
+        namespace = os.path.basename(persist_path)
+        namespace = namespace[:-len(LEGACY_VECTOR_STORE_SUFFIX)] if namespace.endswith(LEGACY_VECTOR_STORE_SUFFIX) else DEFAULT_NAMESPACE
+        paths = _store_paths(persist_dir, namespace)
+        with self._lock:
+            if not self._dirty and not self.needs_ann_build() and os.path.exists(paths["ids"]):
+                return
+            live_rows = np.flatnonzero(self._alive)
+            matrix = np.ascontiguousarray(self._matrix[live_rows]) if len(live_rows) else np.zeros((0, self._matrix.shape[1] if self._matrix.ndim == 2 else 0), dtype=self.dtype)
+            norms = np.asarray(self._norms[live_rows], dtype=np.float32)
+            table = {
+                "dtype": self.dtype,
+                "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                "ids": [self._ids[row] for row in live_rows],
+                "ref_doc_ids": [self._ref_doc_ids[row] for row in live_rows],
+            }
+            ivf = None
+            if self.index_mode == "ivf" and len(live_rows) >= IVF_MIN_VECTORS:
+                ivf = self._ivf.take(live_rows) if self._ivf is not None else None
+                if ivf is None or ivf.needs_retrain(len(live_rows)) or (self.nlist and ivf.nlist != self.nlist):
+                    print(f"Training IVF index over {len(live_rows)} vectors...")
+                    ivf = IVFIndex.train(matrix, nlist=self.nlist)
+                table["ivf_trained_on"] = ivf.trained_on
+            os.makedirs(persist_dir, exist_ok=True)
+            if ivf is not None:
+                _atomic_save(paths["ivf_centroids"], lambda f: np.save(f, ivf.centroids))
+                _atomic_save(paths["ivf_assignments"], lambda f: np.save(f, ivf.assignments))
+            _atomic_save(paths["matrix"], lambda f: np.save(f, matrix))
+            _atomic_save(paths["norms"], lambda f: np.save(f, norms))
+            _atomic_save(paths["ids"], lambda f: f.write(json.dumps(table).encode("utf-8"))) # Written last: its presence marks a complete store
+            self._load(paths) # Re-open the compacted files with mmap
@@ -0,0 +1,60 @@
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`;
+    acquire() blocks until enough tokens are available. A rate of 0 or less disables limiting.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _reserve(self, tokens: float) -> float:
+        """Takes tokens if available and returns 0, otherwise returns the seconds to wait before retrying."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        return not self.enabled or self._reserve(tokens) == 0.0
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Blocks until `tokens` are taken; returns the seconds spent waiting."""
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while True:
+            delay = self._reserve(tokens)
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        """acquire() for the event loop: waits with asyncio.sleep instead of blocking the thread."""
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while True:
+            delay = self._reserve(tokens)
+            if delay == 0.0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
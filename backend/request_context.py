@@ -0,0 +1,83 @@
+import contextlib
+import contextvars
+import threading
+from typing import Dict, Iterator, Optional
+
+
+class RequestStats:
+    """Per-request counters: LLM round trips and tokens, and time spent per pipeline stage."""
+    def __init__(self):
+        self.llm_calls = 0
+        self.llm_calls_by_purpose: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.timings: Dict[str, Dict[str, float]] = {} # stage -> {"seconds", "count"}
+        self.context_tokens: Dict[str, int] = {} # Retrieved vs. packed context tokens (context_packing)
+        self._lock = threading.Lock() # Batch requests and concurrent retrievers record from several threads
+
+    def add_timing(self, stage: str, seconds: float):
+        with self._lock:
+            timing = self.timings.setdefault(stage, {"seconds": 0.0, "count": 0})
+            timing["seconds"] += seconds
+            timing["count"] += 1
+
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def add_context_tokens(self, retrieved_tokens: int, packed_tokens: int):
+        with self._lock:
+            self.context_tokens["retrieved"] = self.context_tokens.get("retrieved", 0) + retrieved_tokens
+            self.context_tokens["packed"] = self.context_tokens.get("packed", 0) + packed_tokens
+            self.context_tokens["saved"] = self.context_tokens["retrieved"] - self.context_tokens["packed"]
+
+    def timing_breakdown(self) -> Dict:
+        """Seconds per stage, summed over calls; concurrent stages (e.g. vector + BM25) may add up to more than wall time."""
+        with self._lock:
+            breakdown = {
+                "stages": {stage: {"seconds": round(t["seconds"], 4), "count": int(t["count"])} for stage, t in self.timings.items()},
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+            if self.context_tokens:
+                breakdown["context_tokens"] = dict(self.context_tokens)
+            return breakdown
+
+    def to_dict(self) -> Dict:
+        return {"llm_calls": self.llm_calls, "llm_calls_by_purpose": dict(self.llm_calls_by_purpose), **self.timing_breakdown()}
+
+
+_current_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+
+@contextlib.contextmanager
+def track_request() -> Iterator[RequestStats]:
+    """
+    Collects stats for the code run inside the block (including asyncio tasks and
+    asyncio.to_thread calls started from it, which inherit the context).
+    """
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+
+def record_llm_call(purpose: str):
+    """Counts one LLM round trip against the current request, if one is being tracked."""
+    stats = _current_stats.get()
+    if stats is not None:
+        with stats._lock:
+            stats.llm_calls += 1
+            stats.llm_calls_by_purpose[purpose] = stats.llm_calls_by_purpose.get(purpose, 0) + 1
+
+
+def current_llm_calls() -> Optional[int]:
+    stats = _current_stats.get()
+    return stats.llm_calls if stats is not None else None
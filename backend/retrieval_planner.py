@@ -0,0 +1,126 @@
+import os
+import re
+import json
+from typing import List
+
+from llama_index.core.schema import QueryBundle
+
+from request_context import record_llm_call
+from metrics import span, record_token_usage
+
+# --- Retrieval Planning Configuration ---
+# llm:  one LLM call per request returns the refined query and the fusion variants together.
+# auto: like llm, but short keyword-like queries skip the LLM and are searched as typed.
+# none: never call the LLM for planning; search the user's question as typed.
+RETRIEVAL_PLANNER_MODE = os.getenv("RETRIEVAL_PLANNER_MODE", "llm")
+PLANNER_NUM_VARIANTS = int(os.getenv("PLANNER_NUM_VARIANTS", "3")) # Extra phrasings searched alongside the refined query
+PLANNER_ZERO_LLM_MAX_WORDS = int(os.getenv("PLANNER_ZERO_LLM_MAX_WORDS", "4")) # 'auto' mode: longest query treated as keywords
+
+_QUESTION_WORDS = {"what", "how", "why", "when", "where", "who", "which", "whom", "whose", "can", "could", "should", "is", "are", "do", "does", "did", "will", "would", "explain", "compare"}
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class RetrievalPlan:
+    """The queries one request sends to the retrievers: a refined query plus optional variants."""
+    def __init__(self, query: str, variants: List[str] = None, used_llm: bool = False):
+        self.query = query
+        self.variants = variants or []
+        self.used_llm = used_llm
+        self.query_embeddings = None # Embeddings for .queries when they were computed in bulk (batch chat)
+
+    @property
+    def queries(self) -> List[str]:
+        unique = []
+        for text in [self.query] + self.variants:
+            if text and text.lower() not in {q.lower() for q in unique}:
+                unique.append(text)
+        return unique
+
+    def retrieval_queries(self) -> list:
+        """The queries to hand to the retrievers, as QueryBundles carrying their embeddings when known."""
+        if self.query_embeddings is None:
+            return self.queries
+        return [QueryBundle(text, embedding=embedding) for text, embedding in zip(self.queries, self.query_embeddings)]
+
+
+def _as_variant_list(value) -> List[str]:
+    """The planner's "variants": a list of strings, or one string; anything else (a dict, a number) means none."""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [variant.strip() for variant in value if isinstance(variant, str) and variant.strip()]
+
+
+class RetrievalPlanner:
+    """
+    Replaces the separate query-refinement and fusion query-generation LLM calls with a single
+    structured call. The agent supplies the domain-specific guidance; the planner appends the
+    JSON output instructions, parses the reply and degrades to the raw text if it isn't JSON.
+    """
+    def __init__(self, llm, num_variants: int = PLANNER_NUM_VARIANTS, mode: str = RETRIEVAL_PLANNER_MODE,
+                 zero_llm_max_words: int = PLANNER_ZERO_LLM_MAX_WORDS, verbose: bool = False):
+        self.llm = llm
+        self.num_variants = num_variants
+        self.mode = mode
+        self.zero_llm_max_words = zero_llm_max_words
+        self.verbose = verbose
+
+    def format_instructions(self) -> str:
+        return (
+            f"Respond with a single JSON object and nothing else, in exactly this form:\n"
+            f"{{\"query\": \"<the single most effective search query>\", \"variants\": [\"<alternative query>\", ...]}}\n"
+            f"Give exactly {self.num_variants} variants: differently worded search queries for the same information "
+            f"(synonyms, related terms, more specific or more general phrasings), so both keyword and semantic search find the relevant passages."
+        )
+
+    def is_keyword_query(self, user_input: str) -> bool:
+        words = user_input.strip().split()
+        return (
+            0 < len(words) <= self.zero_llm_max_words
+            and "?" not in user_input
+            and words[0].lower().strip(",.:;") not in _QUESTION_WORDS
+        )
+
+    def should_skip_llm(self, user_input: str, has_history: bool = False) -> bool:
+        if self.mode == "none":
+            return True
+        # Follow-up questions need the LLM to fold in the conversation history
+        return self.mode == "auto" and not has_history and self.is_keyword_query(user_input)
+
+    def direct_plan(self, user_input: str) -> RetrievalPlan:
+        return RetrievalPlan(user_input.strip())
+
+    def parse(self, response_object, user_input: str) -> RetrievalPlan:
+        text = response_object.text if hasattr(response_object, 'text') else str(response_object or "")
+        text = (text or "").strip()
+        match = _JSON_OBJECT_RE.search(text)
+        if match:
+            try:
+                payload = json.loads(match.group(0))
+                query = str(payload.get("query") or "").strip() or user_input
+                variants = _as_variant_list(payload.get("variants"))
+                return RetrievalPlan(query, RetrievalPlan(query, variants).queries[1:self.num_variants + 1], used_llm=True)
+            except (ValueError, AttributeError):
+                pass
+        # Not JSON: treat the reply as a single refined query, as the old refinement prompt did
+        query = text.replace("Refined search query:", "").replace("Tool Query:", "").strip().strip('"') or user_input
+        return RetrievalPlan(query, used_llm=True)
+
+    def plan(self, user_input: str, prompt: str) -> RetrievalPlan:
+        record_llm_call("planning")
+        with span("planning"):
+            response_object = self.llm.complete(prompt)
+        record_token_usage("planning", prompt, response_object)
+        retrieval_plan = self.parse(response_object, user_input)
+        if self.verbose: print(f"Retrieval plan: query='{retrieval_plan.query}', variants={retrieval_plan.variants}")
+        return retrieval_plan
+
+    async def aplan(self, user_input: str, prompt: str) -> RetrievalPlan:
+        record_llm_call("planning")
+        with span("planning"):
+            response_object = await self.llm.acomplete(prompt)
+        record_token_usage("planning", prompt, response_object)
+        retrieval_plan = self.parse(response_object, user_input)
+        if self.verbose: print(f"Retrieval plan: query='{retrieval_plan.query}', variants={retrieval_plan.variants}")
+        return retrieval_plan
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Union
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from metrics import span
+
+FUSION_RRF_K = 60 # Reciprocal-rank-fusion constant, as in QueryFusionRetriever's reciprocal_rerank mode
+FUSION_MAX_WORKERS = int(os.getenv("FUSION_MAX_WORKERS", "8")) # Threads running (query, retriever) pairs for sync requests
+
+_fusion_executor = ThreadPoolExecutor(max_workers=FUSION_MAX_WORKERS, thread_name_prefix="fusion")
+
+QueryLike = Union[str, QueryBundle] # A QueryBundle may carry a precomputed embedding
+
+
+_RETRIEVER_STAGES = {"VectorIndexRetriever": "vector_retrieval", "SparseBM25Retriever": "bm25_retrieval"}
+
+
+def _as_bundle(query: QueryLike) -> QueryBundle:
+    return query if isinstance(query, QueryBundle) else QueryBundle(query)
+
+
+def _timed_retrieve(retriever: BaseRetriever, query_bundle: QueryBundle) -> List[NodeWithScore]:
+    with span(_RETRIEVER_STAGES.get(type(retriever).__name__, type(retriever).__name__)):
+        return retriever.retrieve(query_bundle)
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[NodeWithScore]], top_k: int, rrf_k: int = FUSION_RRF_K) -> List[NodeWithScore]:
+    """Fuses ranked lists: each node scores sum(1 / (rrf_k + rank)) over the lists it appears in."""
+    fused_scores: Dict[str, float] = {}
+    nodes_by_id: Dict[str, NodeWithScore] = {}
+    for results in result_lists:
+        ranked = sorted(results, key=lambda node_with_score: node_with_score.score or 0.0, reverse=True)
+        for rank, node_with_score in enumerate(ranked):
+            node_id = node_with_score.node.node_id
+            nodes_by_id.setdefault(node_id, node_with_score)
+            fused_scores[node_id] = fused_scores.get(node_id, 0.0) + 1.0 / (rank + rrf_k)
+    best_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes_by_id[node_id].node, score=fused_scores[node_id]) for node_id in best_ids]
+
+
+class MultiQueryFusionRetriever(BaseRetriever):
+    """
+    Runs every query of a retrieval plan against every retriever (e.g. vector + BM25) concurrently
+    and fuses the ranked lists with reciprocal rank fusion. Unlike QueryFusionRetriever it never
+    calls an LLM: query variants come from the RetrievalPlanner's single planning call.
+    """
+    def __init__(self, retrievers: List[BaseRetriever], similarity_top_k: int, rrf_k: int = FUSION_RRF_K,
+                 embed_model=None, **kwargs):
+        super().__init__(**kwargs)
+        self._retrievers = retrievers
+        self.similarity_top_k = similarity_top_k
+        self.rrf_k = rrf_k
+        self.embed_model = embed_model # Optional; lets callers embed a query once and reuse it (see speculative_retrieval)
+
+    @property
+    def retrievers(self) -> List[BaseRetriever]:
+        return self._retrievers
+
+    def fuse(self, result_lists: Sequence[List[NodeWithScore]]) -> List[NodeWithScore]:
+        with span("fusion"):
+            return reciprocal_rank_fusion(result_lists, self.similarity_top_k, self.rrf_k)
+
+    def retrieve_lists(self, queries: List[QueryLike]) -> List[List[NodeWithScore]]:
+        """One ranked list per (query, retriever) pair, before fusion."""
+        # Copied contexts keep the workers' spans on the calling request's timing breakdown
+        futures = [
+            _fusion_executor.submit(contextvars.copy_context().run, _timed_retrieve, retriever, _as_bundle(query))
+            for query in queries for retriever in self._retrievers
+        ]
+        return [future.result() for future in futures]
+
+    async def aretrieve_lists(self, queries: List[QueryLike]) -> List[List[NodeWithScore]]:
+        # Retrievers do blocking CPU work (query embedding, scoring), so each pair runs in a worker thread
+        return list(await asyncio.gather(*[
+            asyncio.to_thread(_timed_retrieve, retriever, _as_bundle(query))
+            for query in queries for retriever in self._retrievers
+        ]))
+
+    def retrieve_many(self, queries: List[QueryLike]) -> List[NodeWithScore]:
+        return self.fuse(self.retrieve_lists(queries))
+
+    async def aretrieve_many(self, queries: List[QueryLike]) -> List[NodeWithScore]:
+        return self.fuse(await self.aretrieve_lists(queries))
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.retrieve_many([query_bundle])
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return await self.aretrieve_many([query_bundle])
+
+
+def retrieve_for_queries(query_engine, queries: List[QueryLike]) -> List[NodeWithScore]:
+    """Retrieves for all planned queries when the engine fuses them, else for the first (refined) query."""
+    retriever = getattr(query_engine, 'retriever', None)
+    if isinstance(retriever, MultiQueryFusionRetriever):
+        return retriever.retrieve_many(queries)
+    return query_engine.retrieve(_as_bundle(queries[0]))
+
+
+async def aretrieve_for_queries(query_engine, queries: List[QueryLike]) -> List[NodeWithScore]:
+    retriever = getattr(query_engine, 'retriever', None)
+    if isinstance(retriever, MultiQueryFusionRetriever):
+        return await retriever.aretrieve_many(queries)
+    return await query_engine.aretrieve(_as_bundle(queries[0]))
+
+
+def retrieve_across(query_engines: Sequence, queries: List[QueryLike]) -> List[List[NodeWithScore]]:
+    """
+    retrieve_for_queries() against several engines at once (cross-domain fan-out): every (engine, query,
+    retriever) triple is submitted to the fusion pool together, then each engine's lists are fused on their own.
+    """
+    pending = []
+    for query_engine in query_engines:
+        retriever = getattr(query_engine, 'retriever', None)
+        if isinstance(retriever, MultiQueryFusionRetriever):
+            futures = [
+                _fusion_executor.submit(contextvars.copy_context().run, _timed_retrieve, sub_retriever, _as_bundle(query))
+                for query in queries for sub_retriever in retriever.retrievers
+            ]
+        else:
+            futures = [_fusion_executor.submit(contextvars.copy_context().run, query_engine.retrieve, _as_bundle(queries[0]))]
+        pending.append((retriever, futures))
+    results = []
+    for retriever, futures in pending:
+        lists = [future.result() for future in futures]
+        results.append(retriever.fuse(lists) if isinstance(retriever, MultiQueryFusionRetriever) else lists[0])
+    return results
+
+
+async def aretrieve_across(query_engines: Sequence, queries: List[QueryLike]) -> List[List[NodeWithScore]]:
+    return list(await asyncio.gather(*[aretrieve_for_queries(query_engine, queries) for query_engine in query_engines]))
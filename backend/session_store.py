@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from llm_scheduler import LLMOverloadedError, PRIORITY_BATCH, llm_priority
+from metrics import REGISTRY, estimate_tokens, record_token_usage
+
+# --- Session Configuration ---
+# Conversations live on the server, so clients send only the new message with a session_id.
+# Once a session's history exceeds SESSION_HISTORY_TOKEN_BUDGET, its older messages are folded into
+# a rolling summary by one LLM call, run off the request path. Prompts then carry the summary plus
+# the latest messages and stay roughly the same size however long the conversation gets.
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000")) # Sessions held in memory; least recently used are evicted
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400")) # Sessions idle this long expire
+SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "1200")) # Older messages are summarized once summary + messages exceed this (estimated tokens)
+SESSION_KEEP_RECENT_MESSAGES = int(os.getenv("SESSION_KEEP_RECENT_MESSAGES", "4")) # Latest messages always kept verbatim
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300")) # Rolling summary length asked of the LLM (and enforced)
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "") # Optional SQLite file: sessions then survive restarts and memory eviction
+SESSION_SUMMARY_WORKERS = 2 # Background threads compacting histories
+
+SUMMARY_ROLE = "summary" # Rendered by the agents as "Summary: ..." ahead of the remaining messages
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a document assistant.\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages to fold into the summary:\n{messages}\n\n"
+    "Write the updated summary in at most {max_words} words. Keep the user's goals, the entities, figures, "
+    "dates and policy names discussed, and any answers the user may refer back to. Drop pleasantries.\n"
+    "Updated summary:"
+)
+
+
+def _render_messages(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in messages)
+
+
+class Session:
+    """One conversation: the rolling summary of older messages and the messages after it."""
+    def __init__(self, session_id: str, domain: str, messages: List[Dict[str, str]] = None, summary: str = "",
+                 summarized_messages: int = 0, turns: int = 0, created_at: float = None, updated_at: float = None):
+        self.session_id = session_id
+        self.domain = domain
+        self.messages = list(messages or [])
+        self.summary = summary
+        self.summarized_messages = summarized_messages
+        self.turns = turns
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    def prompt_history(self) -> List[Dict[str, str]]:
+        """The history handed to the agent: the summary (if any) followed by the unsummarized messages."""
+        history = [{"role": SUMMARY_ROLE, "content": self.summary}] if self.summary else []
+        return history + [dict(message) for message in self.messages]
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(_render_messages(self.prompt_history()))
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "domain": self.domain,
+            "turns": self.turns,
+            "summary": self.summary,
+            "summarized_messages": self.summarized_messages,
+            "messages": [dict(message) for message in self.messages],
+            "history_tokens": self.history_tokens(),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class HistoryCompactor:
+    """Folds a session's older messages into its rolling summary with one LLM call."""
+    def __init__(self, llm=None, token_budget: int = SESSION_HISTORY_TOKEN_BUDGET,
+                 keep_recent_messages: int = SESSION_KEEP_RECENT_MESSAGES, summary_max_tokens: int = SESSION_SUMMARY_MAX_TOKENS):
+        self._llm = llm
+        self.token_budget = token_budget
+        self.keep_recent_messages = max(0, keep_recent_messages)
+        self.summary_max_tokens = summary_max_tokens
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from common_settings import LLM # Imported lazily: loads the shared models
+            self._llm = LLM
+        return self._llm
+
+    def needs_compaction(self, session: Session) -> bool:
+        return session.history_tokens() > self.token_budget and len(session.messages) > self.keep_recent_messages
+
+    def summarize(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        prompt = SUMMARY_PROMPT.format(
+            summary=summary or "(empty)", messages=_render_messages(messages),
+            max_words=int(self.summary_max_tokens * 0.75), # Roughly 0.75 words per token
+        )
+        response = self.llm.complete(prompt)
+        record_token_usage("session_summary", prompt, response)
+        text = (getattr(response, 'text', None) or str(response)).strip()
+        return self._truncate(text)
+
+    def fallback_summary(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """Used when the LLM cannot be reached: the newest text that fits, so the budget still holds."""
+        return self._truncate(f"{summary}\n{_render_messages(messages)}".strip(), keep_end=True)
+
+    def _truncate(self, text: str, keep_end: bool = False) -> str:
+        max_chars = self.summary_max_tokens * 4
+        if len(text) <= max_chars:
+            return text
+        return "..." + text[-max_chars:] if keep_end else text[:max_chars] + "..."
+
+
+class SessionStore:
+    """
+    Bounded in-memory conversation store: least recently used sessions are evicted past max_sessions
+    and idle sessions expire after ttl_seconds. With db_path, every change is written through to SQLite,
+    so evicted sessions are reloaded on access and sessions survive a restart. Server workers that share
+    the database read every session from it (read_through), so a conversation may hop between workers.
+    """
+    def __init__(self, compactor: Optional[HistoryCompactor] = None, max_sessions: int = SESSION_MAX_SESSIONS,
+                 ttl_seconds: float = SESSION_TTL_SECONDS, db_path: str = SESSION_DB_PATH):
+        self.compactor = compactor or HistoryCompactor()
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._compacting = set() # Ids of sessions with a compaction in flight in this process
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=SESSION_SUMMARY_WORKERS, thread_name_prefix="session-summary")
+        self._stats = {"created": 0, "evicted": 0, "expired": 0, "compactions": 0, "compaction_failures": 0}
+        self.db_path = db_path
+        self.read_through = False # Set in forked workers sharing db_path: the database, not memory, is authoritative
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = self._connect()
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+
+    def after_fork(self, shared: bool = True):
+        """
+        Called in a forked worker: the SQLite connection and summary threads cannot be shared across fork,
+        so both are reopened. With shared=True (several workers), sessions are read from the database on
+        every access, since another worker may have answered the previous turn.
+        """
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=SESSION_SUMMARY_WORKERS, thread_name_prefix="session-summary")
+        self._compacting = set()
+        if self._conn is not None:
+            self._conn = self._connect()
+            self.read_through = shared
+
+    @contextlib.contextmanager
+    def _transaction_locked(self):
+        # Workers sharing the database make each read-modify-write of a session atomic across processes
+        if not self.read_through:
+            yield
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        finally:
+            if self._conn.in_transaction:
+                self._conn.commit()
+
+    def _is_expired(self, session: Session, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - session.updated_at > self.ttl_seconds
+
+    def _save_locked(self, session: Session):
+        if self._conn is None:
+            return
+        data = {key: value for key, value in session.to_dict().items() if key != "history_tokens"}
+        self._conn.execute("INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                           (session.session_id, json.dumps(data), session.updated_at))
+        self._conn.commit()
+
+    def _load_locked(self, session_id: str) -> Optional[Session]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return Session(data["session_id"], data["domain"], data["messages"], data["summary"],
+                       data["summarized_messages"], data["turns"], data["created_at"], data["updated_at"])
+
+    def _remove_locked(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def _cache_locked(self, session: Session):
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        now = time.time()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if self._is_expired(oldest, now):
+                self._remove_locked(oldest.session_id)
+                self._stats["expired"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._sessions.pop(oldest.session_id) # Still on disk when SQLite backs the store
+                self._stats["evicted"] += 1
+            else:
+                break
+
+    def create(self, domain: str) -> Session:
+        session = Session(uuid.uuid4().hex, domain)
+        with self._lock:
+            if self._conn is not None and self.ttl_seconds > 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            self._cache_locked(session)
+            self._save_locked(session)
+            self._stats["created"] += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            if self.read_through:
+                session = self._load_locked(session_id)
+            else:
+                session = self._sessions.get(session_id) or self._load_locked(session_id)
+            if session is None:
+                return None
+            if self._is_expired(session, time.time()):
+                self._remove_locked(session_id)
+                self._stats["expired"] += 1
+                return None
+            if not self.read_through:
+                self._cache_locked(session)
+            return session
+
+    def history(self, session_id: str) -> Optional[List[Dict[str, str]]]:
+        """A copy of the session's prompt history (summary plus recent messages), or None for unknown sessions."""
+        with self._lock:
+            session = self.get(session_id)
+            return session.prompt_history() if session is not None else None
+
+    def append_turn(self, session_id: str, user_message: str, assistant_message: str) -> Optional[Session]:
+        """Records one exchange; schedules compaction when the history is over budget."""
+        with self._lock, self._transaction_locked():
+            session = self.get(session_id)
+            if session is None:
+                return None
+            session.messages.append({"role": "user", "content": user_message})
+            session.messages.append({"role": "assistant", "content": assistant_message})
+            session.turns += 1
+            session.updated_at = time.time()
+            self._save_locked(session)
+            if session.session_id not in self._compacting and self.compactor.needs_compaction(session):
+                self._compacting.add(session.session_id)
+                self._executor.submit(self._compact, session)
+        return session
+
+    def _compact(self, session: Session):
+        with self._lock:
+            keep = self.compactor.keep_recent_messages
+            folded = session.messages[:len(session.messages) - keep] if keep else list(session.messages)
+            summary = session.summary
+        try:
+            with llm_priority(PRIORITY_BATCH): # Yields LLM slots to interactive requests
+                new_summary = self.compactor.summarize(summary, folded)
+        except LLMOverloadedError:
+            with self._lock:
+                self._compacting.discard(session.session_id) # Retried after the next turn
+            return
+        except Exception as e:
+            print(f"Warning: Could not summarize session {session.session_id}: {e}. Truncating its history instead.")
+            new_summary = self.compactor.fallback_summary(summary, folded)
+            self._stats["compaction_failures"] += 1
+        with self._lock, self._transaction_locked():
+            self._compacting.discard(session.session_id)
+            # Re-read: the session may have been deleted, evicted and reloaded, or (with workers sharing the
+            # database) updated by another worker meanwhile
+            current = self._load_locked(session.session_id) if self.read_through else self._sessions.get(session.session_id)
+            if current is None or current.summary != summary or current.messages[:len(folded)] != folded:
+                return # Deleted or already compacted: compaction runs again after its next turn if still needed
+            # Messages appended while the LLM was summarizing stay after the folded ones
+            current.messages = current.messages[len(folded):]
+            current.summary = new_summary
+            current.summarized_messages += len(folded)
+            self._stats["compactions"] += 1
+            self._save_locked(current)
+        REGISTRY.inc("session_messages_summarized_total", len(folded), help="Conversation messages folded into rolling summaries")
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            existed = session_id in self._sessions or self._load_locked(session_id) is not None
+            self._remove_locked(session_id)
+            return existed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"sessions_in_memory": len(self._sessions), **self._stats}
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from retrievers import MultiQueryFusionRetriever
+from retrieval_planner import RetrievalPlan
+
+# --- Speculative Retrieval Configuration ---
+# Opt-in: retrieve on the user's raw input while the planning LLM call is still running.
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+SPECULATION_REUSE_SIMILARITY = float(os.getenv("SPECULATION_REUSE_SIMILARITY", "0.95")) # Cosine at or above which the refined query reuses the raw results
+SPECULATION_MAX_WORKERS = int(os.getenv("SPECULATION_MAX_WORKERS", "4")) # Separate from the fusion pool, which speculative tasks wait on
+
+_speculation_executor = ThreadPoolExecutor(max_workers=SPECULATION_MAX_WORKERS, thread_name_prefix="speculation")
+
+
+def _cosine(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> float:
+    if a is None or b is None:
+        return 0.0
+    denominator = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / denominator) if denominator > 0 else 0.0
+
+
+class Speculation:
+    """Retrieval for the raw user input, running (thread future or asyncio task) while the plan is generated."""
+    def __init__(self, user_input: str, pending):
+        self.user_input = user_input
+        self._pending = pending
+
+    def result(self) -> Tuple[Optional[np.ndarray], List[List[NodeWithScore]]]:
+        return self._pending.result()
+
+    async def aresult(self) -> Tuple[Optional[np.ndarray], List[List[NodeWithScore]]]:
+        return await self._pending
+
+    def cancel(self):
+        self._pending.cancel()
+
+
+class SpeculativeRetriever:
+    """
+    Overlaps retrieval with the planning LLM call. start() retrieves on the raw user input in the
+    background; finish() takes the retrieval plan and either reuses those results (refined query
+    near-identical by embedding cosine) or retrieves the refined query too and fuses both candidate
+    sets by reciprocal rank. Plan variants are always retrieved and fused in.
+    """
+    def __init__(self, fusion_retriever: MultiQueryFusionRetriever, reuse_similarity: float = SPECULATION_REUSE_SIMILARITY):
+        self.fusion_retriever = fusion_retriever
+        self.reuse_similarity = reuse_similarity
+        self._lock = threading.Lock()
+        self._stats = {"speculations": 0, "reused": 0, "merged": 0, "failed": 0}
+
+    @classmethod
+    def for_query_engine(cls, query_engine, enabled: bool = SPECULATIVE_RETRIEVAL) -> Optional["SpeculativeRetriever"]:
+        """A speculative retriever for engines backed by MultiQueryFusionRetriever, or None when disabled/unsupported."""
+        retriever = getattr(query_engine, 'retriever', None)
+        if not enabled or not isinstance(retriever, MultiQueryFusionRetriever):
+            return None
+        return cls(retriever)
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        embed_model = self.fusion_retriever.embed_model
+        if embed_model is None:
+            return None
+        return np.asarray(embed_model.get_query_embedding(text), dtype=np.float32)
+
+    def _bundle(self, text: str, embedding: Optional[np.ndarray]) -> QueryBundle:
+        return QueryBundle(text, embedding=embedding.tolist() if embedding is not None else None)
+
+    def _speculate(self, user_input: str) -> Tuple[Optional[np.ndarray], List[List[NodeWithScore]]]:
+        embedding = self._embed(user_input)
+        return embedding, self.fusion_retriever.retrieve_lists([self._bundle(user_input, embedding)])
+
+    async def _aspeculate(self, user_input: str) -> Tuple[Optional[np.ndarray], List[List[NodeWithScore]]]:
+        embedding = await asyncio.to_thread(self._embed, user_input)
+        return embedding, await self.fusion_retriever.aretrieve_lists([self._bundle(user_input, embedding)])
+
+    def start(self, user_input: str) -> Speculation:
+        self._count("speculations")
+        return Speculation(user_input, _speculation_executor.submit(self._speculate, user_input))
+
+    def astart(self, user_input: str) -> Speculation:
+        self._count("speculations")
+        return Speculation(user_input, asyncio.ensure_future(self._aspeculate(user_input)))
+
+    def _remaining_queries(self, speculation: Speculation, raw_embedding: Optional[np.ndarray], retrieval_plan: RetrievalPlan) -> list:
+        """Plan queries still to retrieve: variants only when the refined query matches the raw input."""
+        if retrieval_plan.query.strip().lower() == speculation.user_input.strip().lower():
+            similarity = 1.0
+            refined_embedding = raw_embedding
+        else:
+            refined_embedding = self._embed(retrieval_plan.query)
+            similarity = _cosine(raw_embedding, refined_embedding)
+        if similarity >= self.reuse_similarity:
+            self._count("reused")
+            return retrieval_plan.queries[1:]
+        self._count("merged")
+        return [self._bundle(retrieval_plan.query, refined_embedding)] + retrieval_plan.queries[1:]
+
+    def finish(self, speculation: Speculation, retrieval_plan: RetrievalPlan) -> List[NodeWithScore]:
+        try:
+            raw_embedding, speculative_lists = speculation.result()
+        except Exception as e:
+            print(f"Warning: Speculative retrieval failed, retrieving the plan only: {e}")
+            self._count("failed")
+            return self.fusion_retriever.retrieve_many(retrieval_plan.queries)
+        remaining = self._remaining_queries(speculation, raw_embedding, retrieval_plan)
+        return self.fusion_retriever.fuse(speculative_lists + (self.fusion_retriever.retrieve_lists(remaining) if remaining else []))
+
+    async def afinish(self, speculation: Speculation, retrieval_plan: RetrievalPlan) -> List[NodeWithScore]:
+        try:
+            raw_embedding, speculative_lists = await speculation.aresult()
+        except Exception as e:
+            print(f"Warning: Speculative retrieval failed, retrieving the plan only: {e}")
+            self._count("failed")
+            return await self.fusion_retriever.aretrieve_many(retrieval_plan.queries)
+        remaining = await asyncio.to_thread(self._remaining_queries, speculation, raw_embedding, retrieval_plan)
+        return self.fusion_retriever.fuse(speculative_lists + (await self.fusion_retriever.aretrieve_lists(remaining) if remaining else []))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            decided = self._stats["reused"] + self._stats["merged"]
+            return {
+                **self._stats,
+                "reuse_rate": round(self._stats["reused"] / decided, 4) if decided else 0.0,
+                "reuse_similarity": self.reuse_similarity,
+            }
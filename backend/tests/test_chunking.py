@@ -0,0 +1,57 @@
+"""
+Regression tests for the markdown block parser in chunking.py. Run from backend/:
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from chunking import BLOCK_HEADING, BLOCK_LIST, BLOCK_PARAGRAPH, parse_markdown_blocks
+
+PARSE_TIMEOUT_SECONDS = 5
+
+
+def parse_with_timeout(text):
+    # The parser used to loop forever on some inputs; fail the test instead of hanging the run
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(blocks=parse_markdown_blocks(text)), daemon=True)
+    worker.start()
+    worker.join(PARSE_TIMEOUT_SECONDS)
+    assert "blocks" in result, f"parse_markdown_blocks did not finish on {text!r}"
+    return result["blocks"]
+
+
+@pytest.mark.parametrize("marker", ["-", "*", "+", "1.", "1)", "#"])
+@pytest.mark.parametrize("template", ["Revenue\n{marker}\nNext line\n", "Revenue\r\n{marker}\r\nNext line\r\n", "Revenue\n{marker}"])
+def test_bare_marker_line_is_paragraph_text(marker, template):
+    text = template.format(marker=marker)
+    blocks = parse_with_timeout(text)
+    assert [block.kind for block in blocks] == [BLOCK_PARAGRAPH]
+    assert text[blocks[0].start:blocks[0].end] == text
+
+
+@pytest.mark.parametrize("marker", ["-", "*", "1.", "#"])
+def test_bare_marker_line_opens_document(marker):
+    blocks = parse_with_timeout(f"{marker}\nNext line\n")
+    assert [block.kind for block in blocks] == [BLOCK_PARAGRAPH]
+
+
+def test_bare_marker_after_list_and_heading():
+    text = "# Results\n- first item\n-\n## Notes\n#\ntext\n"
+    blocks = parse_with_timeout(text)
+    assert [block.kind for block in blocks] == [BLOCK_HEADING, BLOCK_LIST, BLOCK_HEADING, BLOCK_PARAGRAPH]
+    assert blocks[1].lines == ["- first item\n-"]
+    assert blocks[-1].path == ("Results", "Notes")
+
+
+def test_blocks_cover_document_in_order():
+    text = "# Title\nIntro\n-\n| a | b |\n|---|---|\n| 1 | 2 |\n1.\n* item\n"
+    blocks = parse_with_timeout(text)
+    for previous, block in zip(blocks, blocks[1:]):
+        assert previous.end <= block.start
+    assert blocks[-1].end == len(text)
@@ -0,0 +1,58 @@
+import os
+import gc
+import sys
+
+import app # Loads the preloaded domains in this (parent) process; see prepare_for_fork()
+
+# Production WSGI entry point: run it with gunicorn and gunicorn.conf.py (from backend/):
+#     gunicorn -c gunicorn.conf.py
+# With preload_app, the parent imports this module once: the embedding model, reranker, docstores and
+# BM25 corpora of every preloaded domain are built there, then WEB_WORKERS workers are forked and share
+# those pages copy-on-write (the mmap vector stores are shared through the page cache in any case).
+# Each worker serves WEB_THREADS requests at a time.
+#
+# What stays per worker: the answer cache, /metrics and /api/stats counters, LLM concurrency limits
+# (LLM_MAX_IN_FLIGHT applies per worker), domains loaded lazily or hot-reloaded after the fork, and
+# sessions unless SESSION_DB_PATH is set (gunicorn.conf.py defaults it when there are several workers).
+
+application = app.app
+
+PRELOAD_TIMEOUT_SECONDS = float(os.getenv("WEB_PRELOAD_TIMEOUT_SECONDS", "1800")) # Longest the parent waits for preloaded domains
+WEB_TORCH_THREADS = int(os.getenv("WEB_TORCH_THREADS", "0")) # Torch threads per worker; 0 = CPU cores / workers
+
+
+def prepare_for_fork():
+    """
+    Runs in the parent once the app is imported, before any worker is forked. Waits for the preloaded
+    domains, so workers inherit them instead of each building its own, and stops the parent's background
+    threads: a fork copies only the forking thread, and a lock held by another thread stays held forever
+    in the child. The parent serves no requests, so the module-level fusion and speculation pools never
+    start threads in it.
+    """
+    state = app.domain_loader.wait_for_preload(timeout=PRELOAD_TIMEOUT_SECONDS)
+    print(f"Preloaded domains are {state}; forking workers.")
+    app.index_watcher.stop()
+    app.domain_loader.stop_background()
+    common_settings = sys.modules.get("common_settings")
+    embed_model = getattr(common_settings, "EMBED_MODEL", None)
+    if hasattr(embed_model, 'close_pool'):
+        embed_model.close_pool() # Ingestion's embedding processes are not usable from the workers
+    # Objects allocated so far are moved out of the collector's reach: collections in the workers would
+    # otherwise write to every object header and un-share the pages holding them
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork(workers: int, preloaded: bool = True):
+    """
+    Runs in each worker right after the fork: restarts the background threads the fork did not copy.
+    Without preloading, the worker imports the app itself and its threads are its own already.
+    """
+    if preloaded:
+        app.domain_loader.after_fork()
+        app.index_watcher.after_fork()
+    app.session_store.after_fork(shared=workers > 1)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        threads = WEB_TORCH_THREADS or max(1, (os.cpu_count() or 1) // max(1, workers))
+        torch.set_num_threads(threads) # Workers would otherwise each use every core and oversubscribe the CPU
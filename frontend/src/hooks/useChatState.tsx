@@ -1,5 +1,5 @@
 import { useState } from 'react';
-import { chatService } from '@/lib/api';
+import { chatService, ChatRequest, ChatStage } from '@/lib/api';
 
 // Define types for our state
 export type Message = {
@@ -131,6 +131,23 @@ export const useChatState = () => {
     setShowBackButton(true);
   };
   
+  // Streams the bot's answer into the thinking message as stages and tokens arrive
+  const streamBotResponse = (request: ChatRequest) => {
+    const stageMessages: Record<ChatStage, string> = {
+      refining: 'Understanding your question...',
+      retrieving: 'Searching documents...',
+      answering: 'Writing answer...',
+    };
+    const updateThinkingMessage = (text: string) => {
+      setMessages(prev => prev.map(msg => msg.id === 'thinking-message' ? { ...msg, text } : msg));
+      setShouldScrollToBottom(true);
+    };
+    return chatService.streamMessage(request, {
+      onStage: stage => updateThinkingMessage(stageMessages[stage]),
+      onToken: (_token, textSoFar) => updateThinkingMessage(textSoFar),
+    });
+  };
+
   // Handle send message with transition
   const handleSendMessage = async (text: string) => {
     if (!text.trim()) return;
@@ -176,7 +193,7 @@ export const useChatState = () => {
 
       try {
         // Call the API with the user's query and context
-        const response = await chatService.sendMessage({
+        const response = await streamBotResponse({
           query: `${selectedOptionText}: ${text}`, // Include context in query
           domain: currentSection === 'financials' ? 'finance' : 'hr'
         });
@@ -224,7 +241,7 @@ export const useChatState = () => {
       
       try {
         // Call the API
-        const response = await chatService.sendMessage({
+        const response = await streamBotResponse({
           query: text,
           domain: currentSection === 'financials' ? 'finance' : 'hr'
         });
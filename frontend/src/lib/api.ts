@@ -10,6 +10,41 @@ export interface ChatRequest {
     domain: 'hr' | 'finance';
 }
 
+export type ChatStage = 'refining' | 'retrieving' | 'answering';
+
+export interface ChatStreamHandlers {
+    onStage?: (stage: ChatStage) => void;
+    onSources?: (count: number) => void;
+    onToken?: (token: string, textSoFar: string) => void;
+}
+
+interface ChatStreamEvent {
+    event: 'stage' | 'sources' | 'token' | 'done' | 'error';
+    stage?: ChatStage;
+    count?: number;
+    text?: string;
+    response?: string;
+    error?: string;
+}
+
+// Splits a Server-Sent Events buffer into complete events, returning any trailing partial event.
+const parseSSEBuffer = (buffer: string): { events: ChatStreamEvent[]; rest: string } => {
+    const blocks = buffer.split('\n\n');
+    const rest = blocks.pop() ?? '';
+    const events: ChatStreamEvent[] = [];
+    for (const block of blocks) {
+        const data = block
+            .split('\n')
+            .filter(line => line.startsWith('data:'))
+            .map(line => line.slice(5).trim())
+            .join('\n');
+        if (data) {
+            events.push(JSON.parse(data));
+        }
+    }
+    return { events, rest };
+};
+
 export const chatService = {
     async sendMessage(request: ChatRequest): Promise<ChatResponse> {
         try {
@@ -32,6 +67,56 @@ export const chatService = {
         }
     },
 
+    async streamMessage(request: ChatRequest, handlers: ChatStreamHandlers = {}): Promise<ChatResponse> {
+        try {
+            const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                },
+                body: JSON.stringify(request),
+            });
+
+            if (!response.ok || !response.body) {
+                throw new Error('Network response was not ok');
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let textSoFar = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const parsed = parseSSEBuffer(buffer);
+                buffer = parsed.rest;
+
+                for (const event of parsed.events) {
+                    if (event.event === 'stage' && event.stage) {
+                        handlers.onStage?.(event.stage);
+                    } else if (event.event === 'sources') {
+                        handlers.onSources?.(event.count ?? 0);
+                    } else if (event.event === 'token' && event.text) {
+                        textSoFar += event.text;
+                        handlers.onToken?.(event.text, textSoFar);
+                    } else if (event.event === 'done') {
+                        return { response: event.response ?? textSoFar, domain: request.domain };
+                    } else if (event.event === 'error') {
+                        throw new Error(event.error || 'Streaming request failed');
+                    }
+                }
+            }
+
+            return { response: textSoFar, domain: request.domain };
+        } catch (error) {
+            console.error('Error streaming message:', error);
+            throw error;
+        }
+    },
+
     async checkHealth(): Promise<boolean> {
         try {
             const response = await fetch(`${API_BASE_URL}/health`);
@@ -41,4 +126,4 @@ export const chatService = {
             return false;
         }
     }
-}; 
\ No newline at end of file
+};